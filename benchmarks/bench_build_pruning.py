@@ -0,0 +1,61 @@
+"""Cost of analyzing a whole build with :py:meth:`RuleSet.iter_contexts`
+compared with creating an
+:py:class:`~drone_ci_butler.drone_api.models.AnalysisContext` for every
+step of the build, as the ``get_build_info`` worker used to do.
+
+Usage::
+
+   python benchmarks/bench_build_pruning.py --stages 1 --steps 10 --lines 20
+"""
+import time
+import click
+
+from drone_ci_butler.drone_api.models import AnalysisContext
+from drone_ci_butler.rule_engine import default_rules
+
+from fixtures import make_build
+
+
+def every_step(build):
+    for stage in build.stages or []:
+        for step in stage.steps or []:
+            yield AnalysisContext(build=build, stage=stage, step=step)
+
+
+def analyze(ruleset, contexts) -> float:
+    started = time.perf_counter()
+    for context in contexts:
+        ruleset.apply(context)
+
+    return time.perf_counter() - started
+
+
+@click.command()
+@click.option("-g", "--stages", default=1, type=int)
+@click.option("-s", "--steps", default=10, type=int)
+@click.option("-l", "--lines", default=20, type=int)
+@click.option("-f", "--failure-ratio", default=0.05, type=float)
+def main(stages, steps, lines, failure_ratio):
+    ruleset = default_rules.wf_project_vi
+    ruleset.compile()
+    builds = {
+        "matching build": make_build(stages, steps, lines, failure_ratio),
+        "other project": make_build(
+            stages,
+            steps,
+            lines,
+            failure_ratio,
+            link="https://github.com/nytm/other-project/pull/1",
+        ),
+    }
+    print(f"{stages} stages x {steps} steps x {lines} lines")
+    for name, build in builds.items():
+        every = analyze(ruleset, every_step(build))
+        pruned = analyze(ruleset, ruleset.iter_contexts(build))
+        print(
+            f"{name:>16}: every step {every * 1e3:10.1f}ms, pruned {pruned * 1e3:10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Per-step cost of the ``matches_regex`` conditions of the default
+ruleset, comparing the regex compiled once at construction against
+recompiling it on every evaluation (the behavior prior to
+:py:meth:`Condition.compile_regex`).
+
+Usage::
+
+   python benchmarks/bench_condition_regex.py --steps 300 --lines 200
+"""
+import re
+import time
+import click
+
+from drone_ci_butler.rule_engine import default_rules
+from drone_ci_butler.rule_engine.exceptions import InvalidCondition
+from drone_ci_butler.rule_engine.models import Condition
+
+from fixtures import make_contexts
+
+
+class RecompilingPattern(object):
+    """emulates the former ``Condition.apply`` which called
+    :py:func:`re.compile` before every search"""
+
+    def __init__(self, pattern: str, flags: int, purge: bool = False):
+        self.pattern = pattern
+        self.flags = flags
+        self.purge = purge
+
+    def search(self, value: str):
+        if self.purge:
+            re.purge()
+        return re.compile(self.pattern, self.flags).search(value)
+
+
+def regex_conditions():
+    for rule in default_rules.wf_project_vi.rules:
+        for condition in rule.conditions:
+            if condition.matches_regex:
+                yield rule.name, condition
+
+
+def evaluate(conditions, contexts) -> float:
+    started = time.perf_counter()
+    for context in contexts:
+        for condition in conditions:
+            try:
+                condition.apply(context)
+            except InvalidCondition:
+                pass
+
+    return time.perf_counter() - started
+
+
+def with_regex(condition: Condition, regex) -> Condition:
+    copy = Condition(condition)
+    copy.regex = regex
+    return copy
+
+
+@click.command()
+@click.option("-s", "--steps", default=300, type=int)
+@click.option("-l", "--lines", default=200, type=int)
+@click.option("-r", "--rounds", default=5, type=int)
+def main(steps, lines, rounds):
+    contexts = make_contexts(
+        stage_count=1, steps_per_stage=steps, lines_per_step=lines
+    )
+    compiled = [c for _, c in regex_conditions()]
+    variants = {
+        "compiled once": compiled,
+        "recompiled (warm re cache)": [
+            with_regex(c, RecompilingPattern(c.matches_regex, c.regex_options))
+            for c in compiled
+        ],
+        "recompiled (cold re cache)": [
+            with_regex(
+                c, RecompilingPattern(c.matches_regex, c.regex_options, purge=True)
+            )
+            for c in compiled
+        ],
+    }
+    print(
+        f"{len(compiled)} regex conditions x {len(contexts)} steps x {lines} lines, best of {rounds}"
+    )
+    for name, conditions in variants.items():
+        best = min(evaluate(conditions, contexts) for _ in range(rounds))
+        per_step = best / len(contexts) * 1e6
+        print(f"{name:>28}: {per_step:10.1f}µs per step")
+
+
+if __name__ == "__main__":
+    main()
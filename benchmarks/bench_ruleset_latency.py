@@ -0,0 +1,54 @@
+"""Per-call latency of :py:meth:`RuleSet.apply` over a long run.
+
+A worker applies the same ruleset to every step it ever analyzes, so
+the cost of a call must not depend on how many calls came before it.
+This benchmark applies the default ruleset to a rotating set of step
+contexts and prints the median latency of each window of calls along
+with the ratio between the last and the first window, which should
+stay close to ``1.0``.
+
+Usage::
+
+   python benchmarks/bench_ruleset_latency.py --evaluations 100000 --window 5000
+"""
+import statistics
+import time
+import click
+
+from drone_ci_butler.rule_engine import default_rules
+
+from fixtures import make_contexts
+
+
+@click.command()
+@click.option("-n", "--evaluations", default=100000, type=int)
+@click.option("-w", "--window", default=5000, type=int)
+@click.option("-s", "--steps", default=50, type=int)
+@click.option("-l", "--lines", default=5, type=int)
+def main(evaluations, window, steps, lines):
+    ruleset = default_rules.wf_project_vi
+    contexts = make_contexts(
+        stage_count=1, steps_per_stage=steps, lines_per_step=lines
+    )
+    ruleset.compile()
+
+    print(f"{evaluations} evaluations of {ruleset} over {len(contexts)} steps")
+    windows = []
+    latencies = []
+    for number in range(evaluations):
+        context = contexts[number % len(contexts)]
+        started = time.perf_counter()
+        ruleset.apply(context)
+        latencies.append(time.perf_counter() - started)
+
+        if len(latencies) == window or number == evaluations - 1:
+            median = statistics.median(latencies) * 1e6
+            windows.append(median)
+            print(f"{number + 1:>10} evaluations: {median:10.1f}µs median per call")
+            latencies = []
+
+    print(f"last/first window: {windows[-1] / windows[0]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Fixtures of the rule engine benchmark suite.
+
+The size of the synthetic build can be changed from the command-line,
+e.g.::
+
+   pytest benchmarks --benchmark-only --bench-steps 100 --bench-lines 200
+"""
+import pytest
+
+from fixtures import make_build, iter_contexts
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("drone-ci-butler benchmarks")
+    group.addoption("--bench-stages", type=int, default=2)
+    group.addoption("--bench-steps", type=int, default=10)
+    group.addoption("--bench-lines", type=int, default=50)
+    group.addoption("--bench-failure-ratio", type=float, default=0.2)
+
+
+@pytest.fixture(scope="session")
+def build(request):
+    option = request.config.getoption
+    return make_build(
+        stage_count=option("--bench-stages"),
+        steps_per_stage=option("--bench-steps"),
+        lines_per_step=option("--bench-lines"),
+        failure_ratio=option("--bench-failure-ratio"),
+    )
+
+
+@pytest.fixture(scope="session")
+def contexts(build):
+    return list(iter_contexts(build))
+
+
+@pytest.fixture(scope="session")
+def failed_contexts(contexts):
+    return [c for c in contexts if c.step.status == "failure"]
+
+
+@pytest.fixture
+def throughput(benchmark):
+    """records the amount of analyzed steps and log lines of each round
+    in the ``extra_info`` of the JSON results"""
+
+    def record(contexts, lines_per_step):
+        benchmark.extra_info["steps_per_round"] = len(contexts)
+        benchmark.extra_info["lines_per_round"] = len(contexts) * lines_per_step
+
+    return record
@@ -0,0 +1,149 @@
+"""Synthetic Drone builds used by the rule engine benchmarks.
+
+The generated trees mimic the shape of the builds of a big monorepo:
+a few stages with many steps each, mostly successful, with step logs
+made of ANSI-colored lines similar to what Drone returns from
+``/api/repos/{owner}/{repo}/builds/{build}/logs/{stage}/{step}``.
+"""
+import random
+from typing import Iterator, List, Optional
+
+from drone_ci_butler.drone_api.models import (
+    AnalysisContext,
+    Build,
+    Output,
+    OutputLine,
+    Stage,
+    Step,
+)
+from drone_ci_butler.rule_engine.exceptions import ConditionRequired
+
+
+STAGE_NAMES = ["build", "test", "deploy", "integration", "notify"]
+STEP_NAMES = [
+    "clone",
+    "node_modules",
+    "lint",
+    "prettier",
+    "test-unit",
+    "test-e2e",
+    "build-assets",
+    "docker-build",
+    "deploy-gke",
+    "slack-notify",
+]
+FILLER_LINES = [
+    "\x1b[2m$ yarn install --frozen-lockfile\x1b[0m\n",
+    "[1/4] Resolving packages...\n",
+    "[2/4] Fetching packages...\n",
+    "info fsevents@2.3.2: The platform \"linux\" is incompatible with this module.\n",
+    "\x1b[32m PASS \x1b[39m src/components/Header/index.test.js (5.2 s)\n",
+    "Step 4/12 : COPY package.json yarn.lock ./\n",
+    " ---> Using cache\n",
+    "+ git fetch origin +refs/pull/13624/head:\n",
+    "webpack compiled with 2 warnings in 48213 ms\n",
+    "Done in 92.41s.\n",
+]
+FAILURE_LINES = [
+    'error Couldn\'t find any versions for "react" that matches "2021"\n',
+    "Automatic merge failed; fix conflicts and then commit the result.\n",
+    "a DNS-1123 label must consist of lower case alphanumeric characters\n",
+    "FetchError: request to http://samizdat:3000 failed, reason: connect ECONNREFUSED\n",
+    "[warn] Code style issues found. Forgot to run `yarn prettier:docs`?\n",
+]
+
+
+def make_output(
+    line_count: int, failure: Optional[str] = None, rand: random.Random = random
+) -> Output:
+    lines = [rand.choice(FILLER_LINES) for _ in range(line_count)]
+    if failure:
+        lines.insert(rand.randrange(len(lines) + 1), failure)
+
+    return Output(
+        lines=[
+            OutputLine(time=pos // 10, pos=pos, out=out)
+            for pos, out in enumerate(lines)
+        ]
+    )
+
+
+def make_build(
+    stage_count: int = 3,
+    steps_per_stage: int = 100,
+    lines_per_step: int = 200,
+    failure_ratio: float = 0.05,
+    link: str = "https://github.com/nytm/wf-project-vi/pull/13624",
+    seed: int = 1337,
+) -> Build:
+    """returns a :py:class:`~drone_ci_butler.drone_api.models.Build`
+    with ``stage_count * steps_per_stage`` steps where roughly
+    ``failure_ratio`` of them failed with one of :py:data:`FAILURE_LINES`.
+    """
+    rand = random.Random(seed)
+    stages = []
+    for stage_number in range(1, stage_count + 1):
+        steps = []
+        for step_number in range(1, steps_per_stage + 1):
+            failed = rand.random() < failure_ratio
+            failure = failed and rand.choice(FAILURE_LINES) or None
+            steps.append(
+                Step(
+                    id=stage_number * 1000 + step_number,
+                    number=step_number,
+                    name=STEP_NAMES[step_number % len(STEP_NAMES)],
+                    status=failed and "failure" or "success",
+                    exit_code=failed and 1 or 0,
+                    output=make_output(lines_per_step, failure, rand),
+                )
+            )
+
+        stages.append(
+            Stage(
+                id=stage_number,
+                number=stage_number,
+                name=STAGE_NAMES[(stage_number - 1) % len(STAGE_NAMES)],
+                status="failure",
+                steps=steps,
+            )
+        )
+
+    return Build(
+        number=13624,
+        link=link,
+        status="failure",
+        ref="refs/pull/13624/head",
+        author_login="drone-ci-monitor",
+        stages=stages,
+    )
+
+
+def without(model, attribute: str) -> dict:
+    data = model.to_dict()
+    data.pop(attribute, None)
+    return data
+
+
+def iter_contexts(build: Build) -> Iterator[AnalysisContext]:
+    """yields one context per step.
+
+    :py:class:`~uiclasses.Model` fields are copied on assignment, so
+    the build and stage are stripped of their children to keep the
+    fixture setup from copying every log once per step.
+    """
+    build_info = Build(without(build, "stages"))
+    for stage in build.stages or []:
+        stage_info = Stage(without(stage, "steps"))
+        for step in stage.steps or []:
+            yield AnalysisContext(build=build_info, stage=stage_info, step=step)
+
+
+def make_contexts(*args, **kw) -> List[AnalysisContext]:
+    return list(iter_contexts(make_build(*args, **kw)))
+
+
+def apply_ignoring_required(condition, context):
+    try:
+        return condition.apply(context)
+    except ConditionRequired:
+        return []
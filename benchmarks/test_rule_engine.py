@@ -0,0 +1,74 @@
+"""Throughput of the hot path of the rule engine against synthetic
+Drone builds, see :py:mod:`fixtures`.
+
+Run with ``make benchmarks`` to store machine-readable results in
+``.benchmarks/`` or with ``pytest benchmarks --benchmark-json=PATH``.
+"""
+from drone_ci_butler.rule_engine import default_rules
+from drone_ci_butler.rule_engine.models import ConditionSet
+
+from fixtures import apply_ignoring_required
+
+
+def lines_per_step(request) -> int:
+    return request.config.getoption("--bench-lines")
+
+
+def test_condition_apply_matches_regex(benchmark, throughput, request, contexts):
+    condition = default_rules.GitMergeConflict.conditions.conditions[0]
+    throughput(contexts, lines_per_step(request))
+
+    benchmark(
+        lambda: [apply_ignoring_required(condition, c) for c in contexts]
+    )
+
+
+def test_condition_apply_contains_string(benchmark, throughput, request, contexts):
+    condition = default_rules.SamizdatConnectionError.conditions.conditions[0]
+    throughput(contexts, lines_per_step(request))
+
+    benchmark(
+        lambda: [apply_ignoring_required(condition, c) for c in contexts]
+    )
+
+
+def test_condition_set_apply(benchmark, throughput, request, contexts):
+    ruleset = default_rules.wf_project_vi
+    conditions = ConditionSet(ruleset.required_conditions)
+    conditions.extend(ruleset.default_conditions)
+    throughput(contexts, lines_per_step(request))
+
+    benchmark(lambda: [conditions.apply(c) for c in contexts])
+
+
+def test_rule_match(benchmark, throughput, request, failed_contexts):
+    rule = default_rules.YarnDependencyNotResolved
+    throughput(failed_contexts, lines_per_step(request))
+
+    benchmark(lambda: [rule.match(c) for c in failed_contexts])
+
+
+def test_ruleset_apply(benchmark, throughput, request, contexts):
+    ruleset = default_rules.wf_project_vi
+    ruleset.compile()
+    throughput(contexts, lines_per_step(request))
+
+    benchmark(lambda: [ruleset.apply(c) for c in contexts])
+
+
+def test_ruleset_apply_whole_build(benchmark, throughput, request, build, contexts):
+    ruleset = default_rules.wf_project_vi
+    ruleset.compile()
+    throughput(contexts, lines_per_step(request))
+
+    benchmark(
+        lambda: [ruleset.apply(c) for c in ruleset.iter_contexts(build)]
+    )
+
+
+def test_ruleset_apply_many(benchmark, throughput, request, build, contexts):
+    ruleset = default_rules.wf_project_vi
+    ruleset.compile()
+    throughput(contexts, lines_per_step(request))
+
+    benchmark(lambda: ruleset.apply_many([build]))
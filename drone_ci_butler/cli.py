@@ -32,12 +32,23 @@ from drone_ci_butler.drone_api.models import Build, OutputLine, Step, Stage, Out
 from drone_ci_butler.web import webapp
 from drone_ci_butler.config import config
 
+from drone_ci_butler.rule_engine.artifact import (
+    RuleSetLoader,
+    compile_rules,
+    configured_ruleset,
+)
+from drone_ci_butler.rule_engine.exceptions import InvalidRuleSet
+from drone_ci_butler.rule_engine.models import RuleSet
+from drone_ci_butler.rule_engine.profiling import SORT_KEYS
 from drone_ci_butler.sql.models.slack import SlackMessage
 from drone_ci_butler.sql.models.drone import DroneBuild
 from drone_ci_butler.workers import GetBuildInfoWorker
 from drone_ci_butler.workers import QueueServer, QueueClient, ClientSocketType
-from drone_ci_butler.exceptions import ConfigMissing
+from drone_ci_butler.workers import RulesSubscriber, publish_artifact
+from drone_ci_butler.workers import BuildSyncer
+from drone_ci_butler.exceptions import ConfigMissing, UserFriendlyException
 from drone_ci_butler.networking import connect_to_elasticsearch
+from drone_ci_butler.networking import connect_to_redis, get_redis_pool
 
 from drone_ci_butler.networking import check_database_dns, check_db_connection
 
@@ -159,10 +170,13 @@ def web(ctx, host, port, debug, migrate, wait):
 @click.option("-r", "--queue-rep-address", default=config.worker_queue_rep_address)
 @click.option("-p", "--queue-pull-address", default=config.worker_queue_pull_address)
 @click.option("-m", "--max-workers", default=config.max_workers_per_process, type=int)
+@click.option("-R", "--rules-address", default=config.worker_rules_address)
 @click.option("-w", "--wait", default=0, type=int)
 @click.option("--migrate", is_flag=True)
 @click.pass_context
-def workers(ctx, queue_rep_address, queue_pull_address, max_workers, migrate, wait):
+def workers(
+    ctx, queue_rep_address, queue_pull_address, rules_address, max_workers, migrate, wait
+):
     sql.setup_db(config)
     if wait:
         logger.warning(f"waiting {wait} seconds because the option --wait was provided")
@@ -176,7 +190,9 @@ def workers(ctx, queue_rep_address, queue_pull_address, max_workers, migrate, wa
 
     pool_size = max_workers
 
-    pool = Pool(pool_size)
+    pool = Pool(pool_size + 1)
+    pool.spawn(RulesSubscriber(rules_address).run)
+
     queue_server = QueueServer(
         queue_rep_address, queue_pull_address, "inproc://build-info"
     )
@@ -201,9 +217,11 @@ def workers(ctx, queue_rep_address, queue_pull_address, max_workers, migrate, wa
 
 @main.command("worker:get_build_info")
 @click.option("-c", "--pull-connect-address", default=config.worker_push_address)
+@click.option("-R", "--rules-address", default=config.worker_rules_address)
 @click.pass_context
-def worker_get_build_info(ctx, pull_connect_address):
+def worker_get_build_info(ctx, pull_connect_address, rules_address):
     sql.setup_db(config)
+    gevent.spawn(RulesSubscriber(rules_address).run)
     worker = GetBuildInfoWorker(pull_connect_address)
     worker.run()
 
@@ -234,9 +252,16 @@ def worker_queue(
 @click.option("-m", "--max-builds", default=config.drone_api_max_builds, type=int)
 @click.option("-c", "--connect-address", default=config.worker_queue_pull_address)
 @click.option("-I", "--ignore-filters", is_flag=True, default=True)
+@click.option("-k", "--prefetch-pages", default=config.drone_api_prefetch_pages, type=int)
 @click.pass_context
 def get_builds(
-    ctx, initial_page, connect_address, max_builds, max_pages, ignore_filters
+    ctx,
+    initial_page,
+    connect_address,
+    max_builds,
+    max_pages,
+    ignore_filters,
+    prefetch_pages,
 ):
     sql.setup_db(config)
     client = DroneAPIClient(
@@ -250,7 +275,10 @@ def get_builds(
     worker.connect()
 
     for builds, page, total_pages in client.iter_builds_by_page(
-        owner=ctx.obj["github_owner"], repo=ctx.obj["github_repo"], page=initial_page
+        owner=ctx.obj["github_owner"],
+        repo=ctx.obj["github_repo"],
+        page=initial_page,
+        prefetch=prefetch_pages,
     ):
         try:
             # count = len(builds)
@@ -281,6 +309,34 @@ def get_builds(
     worker.close()
 
 
+@main.command("sync-builds")
+@click.option("-c", "--connect-address", default=config.worker_queue_pull_address)
+@click.option("-i", "--interval", default=config.drone_api_sync_interval, type=int)
+@click.option("--once", is_flag=True, help="exits after a single pass")
+@click.pass_context
+def sync_builds(ctx, connect_address, interval, once):
+    "enqueues the builds that are new or were updated since the last sync, continuously"
+
+    sql.setup_db(config)
+    client = DroneAPIClient.from_config(config)
+    queue = QueueClient(connect_address, socket_type=ClientSocketType.PUSH)
+    queue.connect()
+    syncer = BuildSyncer(
+        client,
+        queue,
+        owner=ctx.obj["github_owner"],
+        repo=ctx.obj["github_repo"],
+        interval=interval,
+    )
+    try:
+        if once:
+            syncer.sync_once()
+        else:
+            syncer.run()
+    finally:
+        queue.close()
+
+
 @main.command("env")
 @click.option("-d", "--docker", is_flag=True)
 @click.pass_context
@@ -328,6 +384,128 @@ def index_builds_elasticsearch():
         )
 
 
+def load_ruleset_or_exit(rules_path: Optional[str]) -> RuleSet:
+    """the ruleset applied by the workers or, when given, the one of
+    another rules file, loaded the same way"""
+    try:
+        if not rules_path:
+            return configured_ruleset(
+                config.rule_engine_rules_path or None,
+                config.rule_engine_cache_dir,
+                config.rule_engine_ruleset,
+            )
+
+        loader = RuleSetLoader.get_shared(
+            Path(rules_path), config.rule_engine_cache_dir
+        )
+        if not loader.rulesets:
+            raise InvalidRuleSet(f"failed to load the rulesets of {rules_path}")
+        return loader.get(config.rule_engine_ruleset)
+    except UserFriendlyException as e:
+        print_error(f"{e}")
+        raise SystemExit(1)
+
+
+@main.command("profile-rules")
+@click.option("-n", "--max-builds", default=100, type=int)
+@click.option(
+    "-s", "--sort-by", default="total_seconds", type=click.Choice(SORT_KEYS)
+)
+@click.option("-j", "--json", "as_json", is_flag=True)
+@click.option(
+    "-r",
+    "--rules",
+    "rules_path",
+    type=click.Path(exists=True, dir_okay=False),
+    help="profiles the rulesets of this file rather than the ones of the workers",
+)
+def profile_rules(max_builds, sort_by, as_json, rules_path):
+    "replays stored builds through the ruleset and prints the cost of each rule and condition"
+
+    ruleset = load_ruleset_or_exit(rules_path)
+    sql.setup_db(config)
+    profiler = ruleset.enable_profiling()
+    for stored in DroneBuild.all(limit_by=max_builds):
+        if not stored.drone_api_data:
+            continue
+
+        build = stored.to_drone_api_model()
+        for context in ruleset.iter_contexts(build):
+            ruleset.apply(context)
+
+    if as_json:
+        print(json.dumps(profiler.to_dict(sort_by=sort_by), indent=2))
+    else:
+        print(profiler.to_table(sort_by=sort_by))
+
+
+@main.command("explain-rules")
+@click.argument("build_number", type=int)
+@click.option("-s", "--step-name", help="only explain the steps with this name")
+@click.option("-j", "--json", "as_json", is_flag=True)
+@click.option(
+    "-r",
+    "--rules",
+    "rules_path",
+    type=click.Path(exists=True, dir_okay=False),
+    help="explains the rulesets of this file rather than the ones of the workers",
+)
+def explain_rules(build_number, step_name, as_json, rules_path):
+    "prints why each rule was reported or not for every step of a stored build"
+
+    ruleset = load_ruleset_or_exit(rules_path)
+    sql.setup_db(config)
+    stored = DroneBuild.find_one_by(
+        owner=config.drone_github_owner,
+        repo=config.drone_github_repo,
+        number=build_number,
+    )
+    if not stored or not stored.drone_api_data:
+        print_error(f"build {build_number} was not stored yet")
+        raise SystemExit(1)
+
+    build = stored.to_drone_api_model()
+    for context in ruleset.iter_contexts(build):
+        if step_name and context.step.name != step_name:
+            continue
+
+        trace = ruleset.explain(context)
+        if as_json:
+            print(json.dumps(trace.to_dict(), indent=2))
+        else:
+            print(trace.to_description())
+
+
+@main.command("compile-rules")
+@click.argument("rules_path", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-o",
+    "--cache-dir",
+    default=lambda: str(config.rule_engine_cache_dir),
+    type=click.Path(file_okay=False),
+)
+@click.option(
+    "--publish",
+    is_flag=True,
+    help="broadcasts the artifact to the running workers",
+)
+@click.option("-R", "--rules-address", default=config.worker_rules_address)
+def compile_rules_artifact(rules_path, cache_dir, publish, rules_address):
+    "validates the rulesets of a YAML file and writes their cached artifact"
+
+    try:
+        path, digest = compile_rules(Path(rules_path), Path(cache_dir))
+    except UserFriendlyException as e:
+        print_error(f"{rules_path}: {e}")
+        raise SystemExit(1)
+
+    print(f"compiled {rules_path} ({digest}) into {path}")
+    if publish:
+        redis = connect_to_redis(get_redis_pool())
+        sent = publish_artifact(rules_address, path, redis=redis)
+        print(f"published {path.name} to {rules_address} {sent} times")
+
+
 @main.command("purge")
 @click.option("--elasticsearch", is_flag=True)
 @click.option("--http-cache", is_flag=True)
@@ -286,6 +286,21 @@ class Config(DataBag, metaclass=MetaConfig):
         default_value="tcp://127.0.0.1:5002",
     )
 
+    worker_rules_address = ConfigProperty(
+        "workers",
+        "rules_address",
+        env="DRONE_CI_BUTLER_RULES_ADDRESS",
+        default_value="tcp://127.0.0.1:5003",
+    )
+
+    worker_rules_check_interval = ConfigProperty(
+        "workers",
+        "rules_check_interval",
+        env="DRONE_CI_BUTLER_RULES_CHECK_INTERVAL",
+        default_value=30,
+        deserialize=int,
+    )
+
     web_host = ConfigProperty(
         "web",
         "hostname",
@@ -345,6 +360,38 @@ class Config(DataBag, metaclass=MetaConfig):
         default_value=250000,
         deserialize=int,
     )
+    drone_api_max_requests_per_host = ConfigProperty(
+        "drone",
+        "api",
+        "max_requests_per_host",
+        env="DRONE_API_MAX_REQUESTS_PER_HOST",
+        default_value=8,
+        deserialize=int,
+    )
+    drone_api_max_requests_in_flight = ConfigProperty(
+        "drone",
+        "api",
+        "max_requests_in_flight",
+        env="DRONE_API_MAX_REQUESTS_IN_FLIGHT",
+        default_value=32,
+        deserialize=int,
+    )
+    drone_api_prefetch_pages = ConfigProperty(
+        "drone",
+        "api",
+        "prefetch_pages",
+        env="DRONE_API_PREFETCH_PAGES",
+        default_value=4,
+        deserialize=int,
+    )
+    drone_api_sync_interval = ConfigProperty(
+        "drone",
+        "api",
+        "sync_interval",
+        env="DRONE_API_SYNC_INTERVAL",
+        default_value=60,
+        deserialize=int,
+    )
     elasticsearch_host = ConfigProperty(
         "elasticsearch",
         "host",
@@ -373,6 +420,44 @@ class Config(DataBag, metaclass=MetaConfig):
         default_value="drone_ci_butler_logs",
     )
 
+    rule_engine_processes = ConfigProperty(
+        "rule_engine",
+        "processes",
+        env="DRONE_CI_BUTLER_RULE_ENGINE_PROCESSES",
+        default_value=0,
+        deserialize=int,
+    )
+    rule_engine_rules_path = ConfigProperty(
+        "rule_engine",
+        "rules_path",
+        env="DRONE_CI_BUTLER_RULES_PATH",
+    )
+    rule_engine_ruleset = ConfigProperty(
+        "rule_engine",
+        "ruleset",
+        env="DRONE_CI_BUTLER_RULESET",
+    )
+    rule_engine_result_cache_size = ConfigProperty(
+        "rule_engine",
+        "result_cache_size",
+        env="DRONE_CI_BUTLER_RULE_RESULT_CACHE_SIZE",
+        default_value=1024,
+        deserialize=int,
+    )
+    rule_engine_result_cache_redis_ttl = ConfigProperty(
+        "rule_engine",
+        "result_cache_redis_ttl",
+        env="DRONE_CI_BUTLER_RULE_RESULT_CACHE_REDIS_TTL",
+        default_value=0,
+        deserialize=int,
+    )
+    rule_engine_cache_path = ConfigProperty(
+        "rule_engine",
+        "cache_path",
+        env="DRONE_CI_BUTLER_RULES_CACHE_PATH",
+        default_value=".rule_engine/cache",
+    )
+
     logging_level_default = ConfigProperty(
         "logging",
         "default_level",
@@ -424,6 +509,12 @@ class Config(DataBag, metaclass=MetaConfig):
         p.mkdir(exist_ok=True, parents=True)
         return p
 
+    @property
+    def rule_engine_cache_dir(self) -> Path:
+        p = Path(self.rule_engine_cache_path).expanduser().absolute()
+        p.mkdir(exist_ok=True, parents=True)
+        return p
+
     @property
     def slack_state_store_path(self) -> Path:
         p = Path(self.slack_state_path).expanduser().absolute()
@@ -1,5 +1,6 @@
 from drone_ci_butler.events import http_cache_hit
 from drone_ci_butler.events import http_cache_miss
+from drone_ci_butler.events import http_cache_revalidated
 from drone_ci_butler.events import get_build_step_output
 from drone_ci_butler.events import get_build_info
 from drone_ci_butler.events import get_builds
@@ -74,6 +75,11 @@ def log_cache_hit(cache, request: Request, response: Response):
     logger.debug(f"cache hit: {request} {response}")
 
 
+@http_cache_revalidated.connect
+def log_cache_revalidated(cache, request: Request, response: Response):
+    logger.debug(f"cache revalidated: {request} {response}")
+
+
 @get_builds.connect
 @iter_builds_by_page.connect
 def log_get_builds(
@@ -0,0 +1,299 @@
+"""asyncio counterpart of :py:class:`~drone_ci_butler.drone_api.client.DroneAPIClient`.
+
+:py:class:`AsyncDroneAPIClient` is built on :py:mod:`aiohttp`, whose
+connector keeps the connections to the drone server alive and bounds
+how many requests are in flight, overall and per host. It does not
+need gevent's monkey patching, so it can run thousands of concurrent
+requests without patching the sockets of SQLAlchemy and ZMQ::
+
+    from drone_ci_butler.drone_api.async_client import AsyncDroneAPIClient
+
+    async with AsyncDroneAPIClient.from_config(config) as client:
+        async for builds, page, max_pages in client.iter_builds_by_page(owner, repo):
+            ...
+
+aiohttp speaks HTTP/1.1 only, concurrency comes from the pool of
+keep-alive connections. Responses are not stored in the
+:py:class:`~drone_ci_butler.drone_api.cache.HttpCache`, whose database
+calls would block the event loop. The module is not imported by
+:py:mod:`drone_ci_butler.drone_api`, so only its users need aiohttp.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import urljoin
+
+import aiohttp
+
+from drone_ci_butler import events
+from drone_ci_butler.config import Config, config
+from drone_ci_butler.logs import get_logger
+from drone_ci_butler.version import version
+from drone_ci_butler.drone_api.models import Build, Output
+from drone_ci_butler.drone_api.exceptions import invalid_response, ClientError, NotFound
+
+logger = get_logger(__name__)
+
+
+class AsyncResponse(object):
+    """the status, headers and body of an aiohttp response, which are
+    read before its connection goes back to the pool. Mimics the parts
+    of :py:class:`requests.Response` used by the client exceptions."""
+
+    def __init__(self, method: str, url: str, status_code: int, headers, text: str):
+        self.request = SimpleNamespace(method=method, url=url)
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    def __repr__(self):
+        return f"<AsyncResponse {self.request.method} {self.request.url} [{self.status_code}]>"
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncDroneAPIClient(object):
+    def __init__(
+        self,
+        url: str = config.drone_url,
+        access_token: str = config.drone_access_token,
+        max_pages: int = config.drone_api_max_pages,
+        max_builds: int = config.drone_api_max_builds,
+        owner: str = config.drone_github_owner,
+        repo: str = config.drone_github_repo,
+        max_requests_per_host: int = config.drone_api_max_requests_per_host,
+        max_requests_in_flight: int = config.drone_api_max_requests_in_flight,
+    ):
+        self.api_url = url
+        self.access_token = access_token
+        self.headers = {
+            "Authorization": f"Bearer {access_token}",
+            "User-Agent": f"DroneCI Butler v{version}",
+        }
+        self.max_pages = max_pages
+        self.max_builds = max_builds
+        self.owner = owner
+        self.repo = repo
+        self.max_requests_per_host = max_requests_per_host
+        self.max_requests_in_flight = max_requests_in_flight
+        self.http: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def from_config(cls, config: Config) -> "AsyncDroneAPIClient":
+        return cls(
+            config.drone_url,
+            config.drone_access_token,
+            max_builds=config.drone_api_max_builds,
+            max_pages=config.drone_api_max_pages,
+            owner=config.drone_api_owner,
+            repo=config.drone_api_repo,
+            max_requests_per_host=config.drone_api_max_requests_per_host,
+            max_requests_in_flight=config.drone_api_max_requests_in_flight,
+        )
+
+    async def __aenter__(self) -> "AsyncDroneAPIClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def make_url(self, path) -> str:
+        return urljoin(self.api_url, path)
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # created lazily so that it belongs to the running event loop
+        if self.http is None or self.http.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_requests_in_flight,
+                limit_per_host=self.max_requests_per_host,
+            )
+            self.http = aiohttp.ClientSession(
+                connector=connector, headers=self.headers
+            )
+        return self.http
+
+    async def request(
+        self, method: str, path: str, params: dict = None, **kwargs
+    ) -> AsyncResponse:
+        url = self.make_url(path)
+        async with self.get_session().request(
+            method, url, params=params, **kwargs
+        ) as response:
+            result = AsyncResponse(
+                method,
+                str(response.url),
+                response.status,
+                response.headers,
+                await response.text(),
+            )
+
+        if result.status_code != 200:
+            raise invalid_response(result)
+
+        return result
+
+    async def iter_builds_by_page(
+        self,
+        owner: str = None,
+        repo: str = None,
+        limit=10000,
+        page=0,
+        max_pages: int = None,
+    ) -> AsyncIterator[Tuple[Build.List, int, int]]:
+        owner = owner or self.owner
+        repo = repo or self.repo
+        max_pages = max_pages or self.max_pages + page
+        total_builds = 0
+        while True:
+            result = await self.request(
+                "GET",
+                f"/api/repos/{owner}/{repo}/builds",
+                params={"page": page, "limit": limit},
+            )
+            all_builds = Build.List(result.json())
+            builds = Build.List(
+                map(lambda build: build.with_headers(result.headers), all_builds)
+            )
+            yield builds, page, max_pages
+            events.iter_builds_by_page.send(
+                self,
+                owner=owner,
+                repo=repo,
+                limit=limit,
+                page=page,
+                builds=all_builds,
+                max_builds=self.max_builds,
+                max_pages=max_pages,
+            )
+
+            total_builds += len(builds)
+            logger.debug(
+                f"Retrieved {total_builds} builds for {owner}/{repo} page {page}"
+            )
+            # the pages past the last build are empty
+            if not builds or total_builds >= self.max_builds or page >= max_pages:
+                return
+
+            page += 1
+
+    async def get_builds(
+        self,
+        owner: str = None,
+        repo: str = None,
+        limit=10000,
+        page=0,
+        max_pages: int = None,
+    ) -> Build.List:
+        owner = owner or self.owner
+        repo = repo or self.repo
+        builds = Build.List([])
+        async for found, page, max_pages in self.iter_builds_by_page(
+            owner, repo, limit, page, max_pages=max_pages
+        ):
+            builds.extend(found)
+
+        all_builds = Build.List(
+            builds.sorted(key=lambda b: b.finished or b.updated, reverse=True)
+        )
+        for build in all_builds:
+            events.get_build_info.send(
+                self, owner=owner, repo=repo, build_number=build.number, build=build
+            )
+        return all_builds
+
+    async def get_build_info(self, owner: str, repo: str, build_number: str) -> Build:
+        owner = owner or self.owner
+        repo = repo or self.repo
+        result = await self.request(
+            "GET", f"/api/repos/{owner}/{repo}/builds/{build_number}"
+        )
+        build = Build(result.json()).with_headers(result.headers)
+        events.get_build_info.send(
+            self, owner=owner, repo=repo, build_number=build_number, build=build
+        )
+        return build
+
+    async def get_build_step_output(
+        self,
+        owner: str,
+        repo: str,
+        build_number: int,
+        stage_number: int,
+        step_number: int,
+    ) -> Optional[Output]:
+        owner = owner or self.owner
+        repo = repo or self.repo
+        try:
+            result = await self.request(
+                "GET",
+                f"/api/repos/{owner}/{repo}/builds/{build_number}/logs/{stage_number}/{step_number}",
+            )
+        except NotFound as e:
+            logger.error(
+                f"failed to retrieve drone step output of build {build_number}: {e}"
+            )
+            return
+
+        data = result.json()
+        if isinstance(data, dict):
+            output = Output(data).with_headers(result.headers)
+        elif isinstance(data, list):
+            output = Output({"lines": data}).with_headers(result.headers)
+        else:
+            raise ClientError(
+                result, f"unexpected step log output type: {type(data)}"
+            )
+
+        events.get_build_step_output.send(
+            self,
+            owner=owner,
+            repo=repo,
+            build_number=build_number,
+            stage_number=stage_number,
+            step_number=step_number,
+            output=output,
+        )
+        return output
+
+    async def inject_logs_into_build(self, owner: str, repo: str, build: Build) -> Build:
+        """retrieves the output of every step that was not skipped
+        concurrently, within the limits of the connection pool"""
+        steps = []
+        for stage in build.stages or []:
+            stage = stage.with_build(build)
+            for step in stage.steps or []:
+                step = step.with_stage(stage)
+                if step.status != "skipped":
+                    steps.append((stage.number, step))
+
+        async def fetch(stage_number, step):
+            try:
+                return await self.get_build_step_output(
+                    owner=owner,
+                    repo=repo,
+                    build_number=build.number,
+                    stage_number=stage_number,
+                    step_number=step.number,
+                )
+            except ClientError as e:
+                logger.error(
+                    f"failed to retrieve logs for {owner}/{repo}/logs/{build.number}/{stage_number}/{step.number}: {e}"
+                )
+                return step.output
+
+        outputs = await asyncio.gather(*(fetch(*item) for item in steps))
+        for (stage_number, step), output in zip(steps, outputs):
+            step.with_output(output)
+
+        return build
+
+    async def get_build_with_logs(self, owner: str, repo: str, build_id: str) -> Build:
+        info = await self.get_build_info(owner, repo, build_id)
+        return await self.inject_logs_into_build(owner, repo, info)
+
+    async def close(self):
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
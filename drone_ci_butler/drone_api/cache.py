@@ -48,15 +48,28 @@ def generate_cache_key(
 
 
 class HttpCache(object):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def __repr__(self):
+        return f"<HttpCache hits={self.hits} misses={self.misses} revalidations={self.revalidations}>"
+
     def get(self, request: requests.Request) -> HttpInteraction:
         found = HttpInteraction.get_by_requests_request(request)
         if found:
-            events.http_cache_hit.send(
-                self, request=found.request(), response=found.response()
-            )
+            self.hit(found)
 
         return found
 
+    def hit(self, interaction: HttpInteraction):
+        """counts a cached response served without contacting the server"""
+        self.hits += 1
+        events.http_cache_hit.send(
+            self, request=interaction.request(), response=interaction.response()
+        )
+
     def get_by_url_and_method(self, url: str, method: str):
         return HttpInteraction.get_by_url_and_method(url=url, method=method)
 
@@ -65,12 +78,25 @@ class HttpCache(object):
             return
 
         interaction = HttpInteraction.upsert(request, response)
+        self.misses += 1
         events.http_cache_miss.send(
             self, request=interaction.request(), response=interaction.response()
         )
 
         return interaction
 
+    def revalidate(
+        self, interaction: HttpInteraction, response: requests.Response
+    ) -> HttpInteraction:
+        """counts a cached response that the server confirmed with a
+        304 Not Modified"""
+        interaction = interaction.revalidate(response)
+        self.revalidations += 1
+        events.http_cache_revalidated.send(
+            self, request=interaction.request(), response=interaction.response()
+        )
+        return interaction
+
     @classmethod
     def purge(cls):
         for row in HttpInteraction.all():
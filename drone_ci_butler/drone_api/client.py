@@ -1,16 +1,21 @@
 import logging
+from collections import deque
+from gevent import Greenlet
+from gevent.lock import BoundedSemaphore
+from gevent.pool import Pool
 from redis import Redis
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 from pathlib import Path
-from typing import NoReturn, Optional, Type, TypeVar
+from typing import Callable, Deque, Dict, Iterator, List, NoReturn, Optional, Tuple, Type, TypeVar, Union
 
 from datetime import datetime, timedelta
-from requests import Response, Session
+from email.utils import parsedate_to_datetime
+from requests import Request, Response, Session
 from drone_ci_butler import events
 from drone_ci_butler.logs import get_logger
 from drone_ci_butler.config import Config, config
 from drone_ci_butler.version import version
-from drone_ci_butler.drone_api.models import Build, OutputLine, Output
+from drone_ci_butler.drone_api.models import Build, OutputLine, Output, Step
 from drone_ci_butler.drone_api.cache import HttpCache
 
 from drone_ci_butler.drone_api.exceptions import invalid_response, ClientError, NotFound
@@ -36,7 +41,25 @@ logger = get_logger(__name__)
 DroneAPIClient = TypeVar("DroneAPIClient")
 
 
+def fetched_before(timestamp: Optional[int]) -> Callable[[Response], bool]:
+    """whether a cached response may predate ``timestamp``, e.g.: the
+    log of a step that was still running when it was cached"""
+
+    def check(response: Response) -> bool:
+        date = response.headers.get("Date")
+        if not timestamp or not date:
+            return True
+        return parsedate_to_datetime(date).timestamp() <= timestamp
+
+    return check
+
+
 class DroneAPIClient(object):
+    # bound the concurrent requests of every client of the process,
+    # per drone host and overall
+    host_semaphores: Dict[str, BoundedSemaphore] = {}
+    in_flight = BoundedSemaphore(max(config.drone_api_max_requests_in_flight, 1))
+
     def __init__(
         self,
         url: str = config.drone_url,
@@ -45,6 +68,8 @@ class DroneAPIClient(object):
         max_builds: int = config.drone_api_max_builds,
         owner: str = config.drone_github_owner,
         repo: str = config.drone_github_repo,
+        max_requests_per_host: int = config.drone_api_max_requests_per_host,
+        prefetch_pages: int = config.drone_api_prefetch_pages,
     ):
         self.api_url = url
         self.access_token = access_token
@@ -59,6 +84,8 @@ class DroneAPIClient(object):
         self.max_builds = max_builds
         self.cache = HttpCache()
         self.redis = Redis
+        self.max_requests_per_host = max(max_requests_per_host, 1)
+        self.prefetch_pages = prefetch_pages
 
     @classmethod
     def from_config(cls: DroneAPIClient, config: Config) -> DroneAPIClient:
@@ -69,8 +96,20 @@ class DroneAPIClient(object):
             max_pages=config.drone_api_max_pages,
             owner=config.drone_api_owner,
             repo=config.drone_api_repo,
+            max_requests_per_host=config.drone_api_max_requests_per_host,
+            prefetch_pages=config.drone_api_prefetch_pages,
         )
 
+    @property
+    def host_semaphore(self) -> BoundedSemaphore:
+        host = urlparse(self.api_url).netloc
+        semaphore = self.host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self.host_semaphores[host] = BoundedSemaphore(
+                self.max_requests_per_host
+            )
+        return semaphore
+
     def make_url(self, path) -> str:
         return urljoin(self.api_url, path)
 
@@ -81,17 +120,36 @@ class DroneAPIClient(object):
         data=None,
         headers=None,
         skip_cache: bool = False,
+        revalidate: Union[bool, Callable[[Response], bool]] = False,
         **kwargs,
     ):
+        """:param skip_cache: neither reads nor stores the response in the cache
+        :param revalidate: True, or a function of the cached response
+          returning True, to serve the cached response only after the
+          server answers ``304 Not Modified`` to a conditional request
+        """
         url = self.make_url(path)
         headers = headers or {}
+        interaction = None
         if not skip_cache:
-            interaction = self.cache.get_by_url_and_method(method=method, url=url)
-            if interaction and interaction.response:
-                # print(f'\033[1;34mcache hit \033[2m{method} {path}\033[0m')
-                return interaction.response()
+            cache_url = Request(method, url, params=kwargs.get("params")).prepare().url
+            interaction = self.cache.get_by_url_and_method(method=method, url=cache_url)
+            if interaction and interaction.response_body is not None:
+                cached = interaction.response()
+                if callable(revalidate):
+                    revalidate = revalidate(cached)
+                if not revalidate:
+                    self.cache.hit(interaction)
+                    return cached
+
+                headers = dict(interaction.conditional_headers(), **headers)
+            else:
+                interaction = None
 
         response = self.http.request(method, url, data=data, headers=headers, **kwargs)
+        if response.status_code == 304 and interaction:
+            return self.cache.revalidate(interaction, response).response()
+
         if response.status_code != 200:
             raise invalid_response(response)
 
@@ -101,6 +159,86 @@ class DroneAPIClient(object):
         interaction = self.cache.set(response.request, response)
         return interaction.response()
 
+    def fetch_builds_page(self, owner: str, repo: str, limit: int, page: int) -> Build.List:
+        with self.host_semaphore, self.in_flight:
+            result = self.request(
+                "GET",
+                f"/api/repos/{owner}/{repo}/builds",
+                params={"page": page, "limit": limit},
+                revalidate=True,
+            )
+        return Build.List(
+            map(
+                lambda build: build.with_headers(result.headers),
+                Build.List(result.json()),
+            )
+        )
+
+    def iter_pages(
+        self,
+        owner: str,
+        repo: str,
+        limit=10000,
+        page=0,
+        count=0,
+        max_pages: int = None,
+        prefetch: int = None,
+        watermark: int = None,
+        until: Callable[[Build.List], bool] = None,
+    ) -> Iterator[Tuple[Build.List, int, int]]:
+        """yields the builds of each page along with its number and the
+        last page number, requesting up to ``prefetch`` pages ahead.
+
+        Stops after ``max_builds`` builds, ``max_pages`` pages, the
+        first empty page, the first page for which ``until(builds)``
+        returns True or the first page with builds whose number is not
+        greater than ``watermark``, which are left out. Only the pages
+        that were not consumed yet are kept in memory.
+        """
+        owner = owner or self.owner
+        repo = repo or self.repo
+        max_pages = max_pages or self.max_pages + page
+        prefetch = max(prefetch or self.prefetch_pages, 1)
+        pool = Pool(prefetch)
+        pending: Deque[Greenlet] = deque()
+        next_page = page
+        total_builds = count
+        try:
+            while True:
+                while len(pending) < prefetch and next_page <= max_pages:
+                    pending.append(
+                        pool.spawn(self.fetch_builds_page, owner, repo, limit, next_page)
+                    )
+                    next_page += 1
+
+                if not pending:
+                    return
+
+                builds = pending.popleft().get()
+                last_page = until is not None and until(builds)
+                if watermark is not None:
+                    newer = Build.List([b for b in builds if b.number > watermark])
+                    last_page = last_page or len(newer) < len(builds)
+                    builds = newer
+
+                yield builds, page, max_pages
+
+                total_builds += len(builds)
+                logger.debug(
+                    f"Retrieved {total_builds} builds for {owner}/{repo} page {page}"
+                )
+                if (
+                    not builds
+                    or last_page
+                    or total_builds >= self.max_builds
+                    or page >= max_pages
+                ):
+                    return
+
+                page += 1
+        finally:
+            pool.kill()
+
     def get_builds(
         self,
         owner: str = None,
@@ -109,43 +247,35 @@ class DroneAPIClient(object):
         page=0,
         count=0,
         max_pages: int = None,
+        prefetch: int = None,
+        watermark: int = None,
+        until: Callable[[Build.List], bool] = None,
     ) -> Build.List:
         owner = owner or self.owner
         repo = repo or self.repo
-
-        result = self.request(
-            "GET",
-            f"/api/repos/{owner}/{repo}/builds",
-            params={"page": page, "limit": limit},
-            skip_cache=True,
-        )
-        all_builds = Build.List(result.json())
-        max_pages = max_pages or self.max_pages + page
-        builds = Build.List(
-            map(
-                lambda build: build.with_headers(result.headers),
-                all_builds,
+        builds = Build.List([])
+        for found, page, max_pages in self.iter_pages(
+            owner,
+            repo,
+            limit,
+            page,
+            count,
+            max_pages,
+            prefetch,
+            watermark,
+            until,
+        ):
+            events.get_builds.send(
+                self,
+                owner=owner,
+                repo=repo,
+                limit=limit,
+                page=page,
+                builds=found,
+                max_builds=self.max_builds,
+                max_pages=max_pages,
             )
-        )
-        events.get_builds.send(
-            self,
-            owner=owner,
-            repo=repo,
-            limit=limit,
-            page=page,
-            builds=all_builds,
-            max_builds=self.max_builds,
-            max_pages=max_pages,
-        )
-
-        total_builds = len(builds) + count
-        logger.debug(f"Retrieved {total_builds} builds for {owner}/{repo} page {page}")
-        if total_builds < self.max_builds and page < max_pages:
-            next_page = self.get_builds(
-                owner, repo, limit, page + 1, count=total_builds, max_pages=max_pages
-            )
-            if next_page:
-                builds.extend(next_page)
+            builds.extend(found)
 
         all_builds = Build.List(
             builds.sorted(key=lambda b: b.finished or b.updated, reverse=True)
@@ -165,46 +295,46 @@ class DroneAPIClient(object):
         page=0,
         count=0,
         max_pages=None,
-    ) -> Build.List:
-        owner = owner or self.owner
-        repo = repo or self.repo
-        result = self.request(
-            "GET",
-            f"/api/repos/{owner}/{repo}/builds",
-            params={"page": page, "limit": limit},
-            skip_cache=True,
-        )
-        all_builds = Build.List(result.json())
-        max_pages = max_pages or self.max_pages + page
-        builds = Build.List(
-            map(
-                lambda build: build.with_headers(result.headers),
-                all_builds,
+        prefetch: int = None,
+        watermark: int = None,
+        until: Callable[[Build.List], bool] = None,
+    ) -> Iterator[Tuple[Build.List, int, int]]:
+        for builds, page, max_pages in self.iter_pages(
+            owner,
+            repo,
+            limit,
+            page,
+            count,
+            max_pages,
+            prefetch,
+            watermark,
+            until,
+        ):
+            yield builds, page, max_pages
+            events.iter_builds_by_page.send(
+                self,
+                owner=owner,
+                repo=repo,
+                limit=limit,
+                page=page,
+                builds=builds,
+                max_builds=self.max_builds,
+                max_pages=max_pages,
             )
-        )
-        yield builds, page, max_pages
-        events.iter_builds_by_page.send(
-            self,
-            owner=owner,
-            repo=repo,
-            limit=limit,
-            page=page,
-            builds=all_builds,
-            max_builds=self.max_builds,
-            max_pages=max_pages,
-        )
 
-        total_builds = len(builds) + count
-        logger.debug(f"Retrieved {total_builds} builds for {owner}/{repo} page {page}")
-        if total_builds < self.max_builds and page < max_pages:
-            yield from self.iter_builds_by_page(
-                owner, repo, limit, page + 1, count=total_builds, max_pages=max_pages
-            )
+    def iter_builds(self, owner: str, repo: str, **kwargs) -> Iterator[Build]:
+        """yields builds one at a time, see :py:meth:`iter_pages`"""
+        for builds, page, max_pages in self.iter_builds_by_page(owner, repo, **kwargs):
+            yield from builds
 
     def get_build_info(self, owner: str, repo: str, build_number: str) -> Build:
         owner = owner or self.owner
         repo = repo or self.repo
-        result = self.request("GET", f"/api/repos/{owner}/{repo}/builds/{build_number}")
+        result = self.request(
+            "GET",
+            f"/api/repos/{owner}/{repo}/builds/{build_number}",
+            revalidate=True,
+        )
         build = Build(result.json()).with_headers(result.headers)
         events.get_build_info.send(
             self, owner=owner, repo=repo, build_number=build_number, build=build
@@ -218,6 +348,7 @@ class DroneAPIClient(object):
         build_number: int,
         stage_number: int,
         step_number: int,
+        revalidate: Union[bool, Callable[[Response], bool]] = True,
     ) -> Optional[Output]:
         owner = owner or self.owner
         repo = repo or self.repo
@@ -225,6 +356,7 @@ class DroneAPIClient(object):
             result = self.request(
                 "GET",
                 f"/api/repos/{owner}/{repo}/builds/{build_number}/logs/{stage_number}/{step_number}",
+                revalidate=revalidate,
             )
         except NotFound as e:
             logger.error(
@@ -258,7 +390,10 @@ class DroneAPIClient(object):
         owner = owner or self.owner
         repo = repo or self.repo
         result = self.request(
-            "GET", f"/api/repos/{owner}/{repo}/builds/latest", params={"branch": branch}
+            "GET",
+            f"/api/repos/{owner}/{repo}/builds/latest",
+            params={"branch": branch},
+            revalidate=True,
         )
         build = Build(result.json()).with_headers(result.headers)
         events.get_build_info.send(
@@ -267,34 +402,63 @@ class DroneAPIClient(object):
         build = self.inject_logs_into_build(owner, repo, build)
         return build
 
-    def inject_logs_into_build(self, owner: str, repo: str, build: Build):
-        def inject_logs(build):
-            for stage in build.stages or []:
-                stage = stage.with_build(build)
-                for step in stage.steps or []:
-                    step = step.with_stage(stage)
-                    if step.status == "skipped":
-                        continue
-                    try:
-                        output = self.get_build_step_output(
-                            owner=owner,
-                            repo=repo,
-                            build_number=build.number,
-                            stage_number=stage.number,
-                            step_number=step.number,
-                        )
-                    except ClientError as e:
-                        logger.error(
-                            f"failed to retrieve logs for {owner}/{repo}/logs/{build.number}/{stage}/{step}",
-                            e,
-                        )
-                        continue
-
-                    step = step.with_output(output)
-                stage = stage.with_build(build)
-            return build
-
-        return inject_logs(build)
+    def iter_steps_to_fetch(self, build: Build) -> List[Tuple[int, int, Step]]:
+        """the stage and step number of every step whose output can be
+        retrieved, in the order of the stages and steps of the build"""
+        steps = []
+        for stage in build.stages or []:
+            stage = stage.with_build(build)
+            for step in stage.steps or []:
+                step = step.with_stage(stage)
+                if step.status == "skipped":
+                    continue
+                steps.append((stage.number, step.number, step))
+        return steps
+
+    def fetch_step_output(
+        self, owner: str, repo: str, build: Build, stage_number: int, step: Step
+    ) -> Optional[Output]:
+        try:
+            with self.host_semaphore, self.in_flight:
+                return self.get_build_step_output(
+                    owner=owner,
+                    repo=repo,
+                    build_number=build.number,
+                    stage_number=stage_number,
+                    step_number=step.number,
+                    # the log of a step that stopped is final once cached
+                    revalidate=fetched_before(step.stopped),
+                )
+        except ClientError as e:
+            logger.error(
+                f"failed to retrieve logs for {owner}/{repo}/logs/{build.number}/{stage_number}/{step.number}: {e}"
+            )
+            return step.output
+
+    def inject_logs_into_build(
+        self, owner: str, repo: str, build: Build, concurrency: int = None
+    ):
+        """retrieves the output of every step that was not skipped,
+        ``concurrency`` requests at a time, up to
+        ``max_requests_per_host`` by default. Outputs are attached once
+        every request finished so that a failed request leaves the
+        build untouched."""
+        concurrency = concurrency or self.max_requests_per_host
+        steps = self.iter_steps_to_fetch(build)
+
+        def fetch(item):
+            stage_number, step_number, step = item
+            return self.fetch_step_output(owner, repo, build, stage_number, step)
+
+        if concurrency > 1 and len(steps) > 1:
+            outputs = Pool(concurrency).map(fetch, steps)
+        else:
+            outputs = [fetch(item) for item in steps]
+
+        for (stage_number, step_number, step), output in zip(steps, outputs):
+            step.with_output(output)
+
+        return build
 
     def get_build_with_logs(self, owner: str, repo: str, build_id: str) -> Build.List:
         info = self.get_build_info(owner, repo, build_id)
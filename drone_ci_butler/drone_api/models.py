@@ -1,5 +1,6 @@
+from bisect import bisect_right
 from typing import Union, Optional, Iterator
-from itertools import chain
+from itertools import accumulate, chain
 from uiclasses import Model
 from uiclasses.typing import Property
 from term2md.term2md import convert as ansi_to_markdown
@@ -31,6 +32,24 @@ class OutputLines(OutputLine.List):
     def __str__(self):
         return "\n".join([str(l.out or "") for l in self])
 
+    def index_at(self, offset: int) -> Optional[int]:
+        """returns the index of the line containing the character at
+        ``offset`` of ``str(self)``, e.g.: the start of a regex match"""
+        if offset < 0 or not len(self):
+            return None
+
+        # each line ends one character after its text, with the "\n"
+        ends = list(accumulate(len(str(l.out or "")) + 1 for l in self))
+        index = bisect_right(ends, offset)
+        return index if index < len(self) else None
+
+    def around(self, index: int, before: int = 3, after: int = 3) -> "OutputLines":
+        """the lines within ``before`` and ``after`` lines of ``index``"""
+        return OutputLines(self[max(index - before, 0) : index + after + 1])
+
+    def to_markdown(self) -> str:
+        return "\n".join(ansi_to_markdown(l.out or "") for l in self)
+
 
 class Output(Model):
     __id_attributes__ = ["lines", "message"]
@@ -4,6 +4,7 @@ from drone_ci_butler.logs import get_logger
 
 http_cache_hit = signal("http-cache-hit")
 http_cache_miss = signal("http-cache-miss")
+http_cache_revalidated = signal("http-cache-revalidated")
 get_build_step_output = signal("get-build-step-output")
 get_build_info = signal("get-build-info")
 get_builds = signal("get-builds")
@@ -0,0 +1,27 @@
+"""ruleset_version
+
+Revision ID: 5b1e07c2a9d4
+Revises: 0463d7bb1907
+Create Date: 2026-10-17 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as db
+
+
+# revision identifiers, used by Alembic.
+revision = "5b1e07c2a9d4"
+down_revision = "0463d7bb1907"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "drone_build",
+        db.Column("ruleset_version", db.Unicode(255)),
+    )
+
+
+def downgrade():
+    op.drop_column("drone_build", "ruleset_version")
@@ -0,0 +1,33 @@
+"""drone_sync_state
+
+Revision ID: 8f3a1d6c2b70
+Revises: 5b1e07c2a9d4
+Create Date: 2026-10-17 22:31:07.512944
+
+"""
+from alembic import op
+import sqlalchemy as db
+
+
+# revision identifiers, used by Alembic.
+revision = "8f3a1d6c2b70"
+down_revision = "5b1e07c2a9d4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "drone_sync_state",
+        db.Column("id", db.Integer, primary_key=True),
+        db.Column("owner", db.Unicode(255), nullable=False),
+        db.Column("repo", db.Unicode(255), nullable=False),
+        db.Column("last_build_number", db.Integer),
+        db.Column("last_build_updated", db.Integer),
+        db.Column("synced_at", db.DateTime),
+        db.UniqueConstraint("owner", "repo", name="uq_drone_sync_state_owner_repo"),
+    )
+
+
+def downgrade():
+    op.drop_table("drone_sync_state")
@@ -14,7 +14,7 @@ def get_elasticsearch_hostname():
 
 
 def get_redis_hostname():
-    return resolve_hostname(config.redis_host)
+    return resolve_hostname(config.REDIS_HOST)
 
 
 def resolve_hostname(hostname) -> str:
@@ -58,8 +58,8 @@ def connect_to_elasticsearch() -> Elasticsearch:
 def get_redis_params() -> dict:
     return {
         "host": get_redis_hostname(),
-        "port": config.redis_port,
-        "db": config.redis_db,
+        "port": config.REDIS_PORT,
+        "db": config.REDIS_DB,
     }
 
 
@@ -0,0 +1,368 @@
+"""Rulesets declared in YAML, compiled once into a cached artifact.
+
+The ``compile-rules`` command validates every ruleset of a YAML file
+(see :py:meth:`~drone_ci_butler.rule_engine.models.RuleSet.from_config`)
+and writes the normalized declaration of each condition and rule to a
+pickle file named after the sha256 of the YAML contents and the
+artifact format, e.g.: ``rules-<sha256>.v1.pickle``.
+
+:py:class:`RuleSetLoader` is used by the workers: it loads the artifact
+matching the current contents of the YAML file (compiling it when
+missing) and, every ``check_interval`` seconds, checks whether the file
+changed in order to swap in the new rulesets without a restart.
+
+Regular expressions and literal automata are rebuilt by
+:py:meth:`RuleSet.compile` when the artifact is loaded because
+compiled patterns are pickled as their source anyway.
+"""
+import hashlib
+import io
+import logging
+import os
+import pickle
+import time
+from pathlib import Path
+from re import Pattern, RegexFlag
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+
+from drone_ci_butler.version import version
+from drone_ci_butler.rule_engine.default_rules import wf_project_vi
+from drone_ci_butler.rule_engine.exceptions import InvalidRuleSet
+from drone_ci_butler.rule_engine.models import (
+    Condition,
+    ConditionSet,
+    Rule,
+    RuleAction,
+    RuleSet,
+    ValueList,
+    nothing,
+)
+
+
+ARTIFACT_FORMAT = 1
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def artifact_path(cache_dir: Path, digest: str) -> Path:
+    return Path(cache_dir).joinpath(f"rules-{digest}.v{ARTIFACT_FORMAT}.pickle")
+
+
+def rulesets_from_yaml(data: bytes) -> Dict[str, RuleSet]:
+    """parses and validates every ruleset under the ``rulesets`` key
+
+    :raises InvalidRuleSet: when the YAML or a ruleset is malformed
+    :raises InvalidCondition: when a condition is invalid
+    """
+    try:
+        parsed = yaml.load(data, Loader=yaml.FullLoader) or {}
+    except yaml.YAMLError as e:
+        raise InvalidRuleSet(f"invalid YAML: {e}")
+
+    declared = isinstance(parsed, dict) and parsed.get("rulesets")
+    if not isinstance(declared, dict) or not declared:
+        raise InvalidRuleSet("expected a mapping of rulesets under the `rulesets` key")
+
+    rulesets = {}
+    for name, declaration in declared.items():
+        ruleset = RuleSet.from_config(name, declaration)
+        ruleset.compile()
+        rulesets[name] = ruleset
+
+    return rulesets
+
+
+def condition_to_data(condition: Condition) -> dict:
+    data = {}
+    for key, value in condition.__data__.items():
+        if value is None or value is nothing:
+            continue
+        if isinstance(value, ValueList):
+            value = list(value)
+        elif isinstance(value, Pattern):
+            value = value.pattern
+        elif isinstance(value, RegexFlag):
+            value = int(value)
+        data[key] = value
+
+    return data
+
+
+def conditions_to_data(conditions: Optional[ConditionSet]) -> list:
+    return [condition_to_data(c) for c in conditions or []]
+
+
+def ruleset_to_data(ruleset: RuleSet) -> dict:
+    return {
+        "name": ruleset.name,
+        "default_action": ruleset.default_action and ruleset.default_action.value,
+        "default_notify": ruleset.default_notify,
+        "required_conditions": conditions_to_data(ruleset.required_conditions),
+        "default_conditions": conditions_to_data(ruleset.default_conditions),
+        "rules": [
+            {
+                "name": rule.name,
+                "action": rule.action and rule.action.value,
+                "notify": rule.notify and list(rule.notify),
+                "conditions": conditions_to_data(rule.conditions),
+            }
+            for rule in ruleset.rules or []
+        ],
+    }
+
+
+def ruleset_from_data(data: dict) -> RuleSet:
+    def conditions(items: list) -> ConditionSet:
+        return ConditionSet([Condition(**item) for item in items])
+
+    rules = []
+    for rule in data["rules"]:
+        params = {"name": rule["name"], "conditions": conditions(rule["conditions"])}
+        if rule["action"]:
+            params["action"] = RuleAction(rule["action"])
+        if rule["notify"]:
+            params["notify"] = ValueList(rule["notify"])
+        rules.append(Rule(**params))
+
+    params = {"name": data["name"], "rules": rules}
+    for key in ("required_conditions", "default_conditions"):
+        if data[key]:
+            params[key] = conditions(data[key])
+    if data["default_action"]:
+        params["default_action"] = RuleAction(data["default_action"])
+    if data["default_notify"]:
+        params["default_notify"] = data["default_notify"]
+
+    return RuleSet(**params)
+
+
+def write_bytes_atomically(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.{os.getpid()}")
+    temporary.write_bytes(data)
+
+    # workers of other processes never see a partially written file
+    os.replace(temporary, path)
+
+
+def write_artifact(path: Path, digest: str, source: str, rulesets: Dict[str, RuleSet]):
+    artifact = {
+        "format": ARTIFACT_FORMAT,
+        "version": version,
+        "content_hash": digest,
+        "source": source,
+        "rulesets": {name: ruleset_to_data(r) for name, r in rulesets.items()},
+    }
+    data = pickle.dumps(artifact, protocol=pickle.HIGHEST_PROTOCOL)
+    write_bytes_atomically(path, data)
+
+
+def compile_rules(rules_path: Path, cache_dir: Path) -> Tuple[Path, str]:
+    """validates the rulesets of a YAML file and writes their artifact
+
+    :returns: the path of the artifact and the hash of the YAML file
+    """
+    rules_path = Path(rules_path).expanduser().absolute()
+    data = rules_path.read_bytes()
+    digest = content_hash(data)
+    path = artifact_path(Path(cache_dir).expanduser(), digest)
+    write_artifact(path, digest, str(rules_path), rulesets_from_yaml(data))
+    return path, digest
+
+
+def stamp_rulesets(rulesets: Dict[str, RuleSet], digest: str) -> Dict[str, RuleSet]:
+    for name, ruleset in rulesets.items():
+        ruleset.with_version(f"{name}@{digest[:12]}")
+    return rulesets
+
+
+class PlainDataUnpickler(pickle.Unpickler):
+    """artifacts only contain builtin types, refusing to import any
+    global keeps a published artifact from running arbitrary code"""
+
+    def find_class(self, module: str, name: str):
+        raise pickle.UnpicklingError(f"forbidden global {module}.{name}")
+
+
+def parse_artifact(data: bytes) -> dict:
+    """:raises InvalidRuleSet: when the artifact is not a plain data
+    pickle written by the same format and version of drone-ci-butler"""
+    try:
+        artifact = PlainDataUnpickler(io.BytesIO(data)).load()
+    except Exception as e:
+        raise InvalidRuleSet(f"invalid ruleset artifact: {e}")
+
+    found = isinstance(artifact, dict) and (
+        artifact.get("format"),
+        artifact.get("version"),
+    )
+    if found != (ARTIFACT_FORMAT, version):
+        raise InvalidRuleSet(
+            f"artifact has format {found}, expected {(ARTIFACT_FORMAT, version)}"
+        )
+    return artifact
+
+
+def rulesets_from_artifact(artifact: dict) -> Dict[str, RuleSet]:
+    rulesets = {
+        name: ruleset_from_data(data) for name, data in artifact["rulesets"].items()
+    }
+    return stamp_rulesets(rulesets, artifact["content_hash"])
+
+
+def load_artifact(path: Path) -> Dict[str, RuleSet]:
+    return rulesets_from_artifact(parse_artifact(Path(path).read_bytes()))
+
+
+class RuleSetLoader(object):
+    """the rulesets of a YAML file, reloaded when its contents change,
+    or installed from artifacts published to the running workers (see
+    :py:mod:`drone_ci_butler.workers.rules`)"""
+
+    shared: Dict[Tuple[Optional[str], str], "RuleSetLoader"] = {}
+
+    def __init__(
+        self,
+        rules_path: Optional[Path],
+        cache_dir: Path,
+        check_interval: float = 5.0,
+    ):
+        self.rules_path = rules_path and Path(rules_path).expanduser().absolute()
+        self.cache_dir = Path(cache_dir).expanduser().absolute()
+        self.check_interval = check_interval
+        self.digest: Optional[str] = None
+        self.rulesets: Dict[str, RuleSet] = {}
+        self.checked_at = 0.0
+        self.stat: Any = None
+        try:
+            self.reload()
+        except Exception as e:
+            # the workers apply the built-in rulesets until the file
+            # is fixed, see :py:meth:`reload_if_changed`
+            logger.exception(f"failed to load {self.rules_path}: {e}")
+
+    def __repr__(self):
+        return f"<RuleSetLoader {self.rules_path} {self.digest and self.digest[:12]}>"
+
+    @classmethod
+    def get_shared(
+        cls, rules_path: Optional[Path], cache_dir: Path
+    ) -> "RuleSetLoader":
+        key = (rules_path and str(rules_path), str(cache_dir))
+        if key not in cls.shared:
+            cls.shared[key] = cls(rules_path, cache_dir)
+        return cls.shared[key]
+
+    @property
+    def artifact_path(self) -> Optional[Path]:
+        return self.digest and artifact_path(self.cache_dir, self.digest)
+
+    def reload(self) -> bool:
+        """loads the artifact of the current contents of the YAML
+        file, compiling it first if needed.
+
+        :returns: True when the rulesets changed
+        """
+        if self.rules_path is None:
+            return False
+
+        data = self.rules_path.read_bytes()
+        digest = content_hash(data)
+        if digest == self.digest:
+            return False
+
+        path = artifact_path(self.cache_dir, digest)
+        rulesets = None
+        if path.exists():
+            try:
+                rulesets = load_artifact(path)
+            except Exception as e:
+                logger.warning(f"recompiling {self.rules_path}: {e}")
+
+        if rulesets is None:
+            rulesets = stamp_rulesets(rulesets_from_yaml(data), digest)
+            write_artifact(path, digest, str(self.rules_path), rulesets)
+
+        self.swap(digest, rulesets)
+        logger.info(f"loaded rulesets {list(rulesets)} from {path}")
+        return True
+
+    def install(self, data: bytes) -> bool:
+        """installs the contents of an artifact, keeping a copy in the
+        cache directory for the process pool
+
+        :returns: True when the rulesets changed
+        :raises InvalidRuleSet: when the artifact is incompatible
+        """
+        artifact = parse_artifact(data)
+        digest = artifact["content_hash"]
+        if digest == self.digest:
+            return False
+
+        rulesets = rulesets_from_artifact(artifact)
+        write_bytes_atomically(artifact_path(self.cache_dir, digest), data)
+        self.swap(digest, rulesets)
+        logger.info(f"installed rulesets {list(rulesets)} from artifact {digest}")
+        return True
+
+    def swap(self, digest: str, rulesets: Dict[str, RuleSet]):
+        # callers keep the ruleset they got from :py:meth:`get` until
+        # they are done with a job, so the swap happens between jobs
+        self.rulesets, self.digest = rulesets, digest
+
+    def reload_if_changed(self) -> bool:
+        """checks the YAML file at most once every ``check_interval``
+        seconds, keeping the current rulesets if the new ones are invalid"""
+        now = time.monotonic()
+        if self.rules_path is None or now - self.checked_at < self.check_interval:
+            return False
+
+        self.checked_at = now
+        try:
+            stat = self.rules_path.stat()
+            signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+            if signature == self.stat:
+                return False
+
+            self.stat = signature
+            return self.reload()
+        except Exception as e:
+            logger.exception(f"failed to reload {self.rules_path}: {e}")
+            return False
+
+    def get(self, name: Optional[str] = None) -> RuleSet:
+        """returns the ruleset with the given name or the first ruleset
+
+        :raises InvalidRuleSet: when no ruleset was loaded yet
+        """
+        self.reload_if_changed()
+        if not self.rulesets:
+            raise InvalidRuleSet("no rulesets were loaded or published yet")
+
+        if name is None:
+            return next(iter(self.rulesets.values()))
+
+        if name not in self.rulesets:
+            raise InvalidRuleSet(
+                f"{self.rules_path} does not declare the ruleset {name!r}: {list(self.rulesets)}"
+            )
+        return self.rulesets[name]
+
+
+def configured_ruleset(
+    rules_path: Optional[Path], cache_dir: Path, name: Optional[str] = None
+) -> RuleSet:
+    """the ruleset the workers apply: ``name`` from the rules file or
+    the published artifacts, the built-in ruleset until either was
+    loaded"""
+    loader = RuleSetLoader.get_shared(rules_path, cache_dir)
+    if not loader.rulesets:
+        return wf_project_vi
+
+    return loader.get(name)
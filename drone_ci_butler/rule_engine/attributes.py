@@ -0,0 +1,74 @@
+"""Per-context memoization of the attributes targeted by conditions.
+
+Every :py:class:`~drone_ci_butler.rule_engine.models.Condition` walks
+its ``target_attribute`` path with ``getattr`` and its matchers turn
+the value into text, which for ``step.output.lines`` joins every line
+of the output of the step. An :py:class:`AttributeCache` resolves each
+distinct target once per
+:py:class:`~drone_ci_butler.drone_api.models.AnalysisContext` and
+materializes its text at most once, shared by every condition that
+targets it.
+"""
+from typing import Any, Dict, List, Tuple
+
+from drone_ci_butler.drone_api.models import AnalysisContext
+from drone_ci_butler.rule_engine.models import Condition, list_of_strings
+
+
+TargetKey = Tuple[str, Tuple[str, ...]]
+
+
+def target_key(condition: Condition) -> TargetKey:
+    return condition.context_element, tuple(condition.target_attribute)
+
+
+class AttributeCache(object):
+    def __init__(self, context: AnalysisContext):
+        self.context = context
+        self.resolved: Dict[TargetKey, tuple] = {}
+        self.texts: Dict[TargetKey, Tuple[Any, str]] = {}
+        self.strings: Dict[TargetKey, Tuple[Any, List[str]]] = {}
+        self.joined: Dict[TargetKey, Tuple[Any, str]] = {}
+
+    def __repr__(self):
+        return f"<AttributeCache {list(self.resolved)}>"
+
+    def resolve(self, condition: Condition) -> tuple:
+        """memoized :py:meth:`Condition.process_context`, failures are
+        not cached so that each condition raises its own exception"""
+        key = target_key(condition)
+        resolved = self.resolved.get(key)
+        if resolved is None:
+            resolved = self.resolved[key] = condition.process_context(self.context)
+        return resolved
+
+    def memoize(self, cache: dict, condition: Condition, value: Any, convert):
+        # values that did not come from :py:meth:`resolve` are
+        # converted without being cached
+        key = target_key(condition)
+        cached = cache.get(key)
+        if cached is not None and cached[0] is value:
+            return cached[1]
+
+        result = convert(value)
+        resolved = self.resolved.get(key)
+        if resolved is not None and resolved[-1] is value:
+            cache[key] = (value, result)
+        return result
+
+    def text(self, condition: Condition, value: Any) -> str:
+        """``str(value)`` as searched by ``matches_regex``"""
+        return self.memoize(self.texts, condition, value, str)
+
+    def list_of_strings(self, condition: Condition, value: Any) -> List[str]:
+        """the strings compared by ``contains_string``"""
+        return self.memoize(self.strings, condition, value, list_of_strings)
+
+    def lines(self, condition: Condition, value: Any) -> str:
+        """the strings compared by ``contains_string`` joined by line breaks"""
+        return self.memoize(
+            self.joined,
+            condition,
+            value,
+            lambda v: "\n".join(self.list_of_strings(condition, v)),
+        )
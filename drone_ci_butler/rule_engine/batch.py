@@ -0,0 +1,263 @@
+"""Columnar results of a ruleset applied to many contexts at once.
+
+:py:meth:`RuleSet.apply_many <drone_ci_butler.rule_engine.models.RuleSet.apply_many>`
+evaluates the steps of whole builds in one call, e.g.: to reprocess
+the stored builds of the last months. Rather than a
+:py:class:`~drone_ci_butler.rule_engine.results.RuleMatch` per
+reported rule and a
+:py:class:`~drone_ci_butler.rule_engine.results.ConditionMatch` per
+match type, the results are appended to :py:class:`MatchColumns`, a
+handful of integer :py:class:`array.array` columns:
+
+* ``rule_context``, ``rule_index``: one row per reported rule, with the
+  position of its context and of the rule in the compiled ruleset
+* ``match_row``, ``match_slot``, ``match_type``: one row per match type
+  of a matched condition, pointing to the row of its rule
+* ``match_start``, ``match_end``: the span of ``MATCHES_REGEX`` matches
+  in the text of the value, ``-1`` for the other match types
+* ``error_row``, ``errors``: one row per invalid condition
+
+Rules are appended in the order of their contexts and matches and
+errors in the order of their rules, so ``context_rows``,
+``row_matches`` and ``row_errors`` hold the offset of the first row of
+each context and of the first match and error of each rule.
+
+The outcomes of the conditions that only look at the build or the
+stage are shared by the contexts of the same build and stage, as
+identified by their ``__id_attributes__``, so each of them is evaluated
+once per build or stage rather than once per step. Only the outcomes of
+the current build are kept, builds are expected to be contiguous as
+they are when passing :py:class:`~drone_ci_butler.drone_api.models.Build`
+instances.
+"""
+from array import array
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from drone_ci_butler.drone_api.models import AnalysisContext, Build
+from drone_ci_butler.rule_engine.exceptions import ConditionRequired
+from drone_ci_butler.rule_engine.evaluation import Evaluation, Outcome
+from drone_ci_butler.rule_engine.models import ConditionMatchType, RegexMatch
+from drone_ci_butler.rule_engine.results import ConditionMatch, RuleMatch
+
+
+MATCH_TYPES: Tuple[ConditionMatchType, ...] = tuple(ConditionMatchType)
+MATCH_TYPE_CODES: Dict[ConditionMatchType, int] = {
+    match_type: code for code, match_type in enumerate(MATCH_TYPES)
+}
+
+
+def element_key(element) -> Optional[tuple]:
+    """the ``__id_attributes__`` of a build or stage, None when it has
+    none of them and thus cannot be told apart from other elements"""
+    if element is None:
+        return None
+    key = tuple(element.__data__.get(name) for name in element.__id_attributes__)
+    return key if any(v is not None for v in key) else None
+
+
+class MatchRow(NamedTuple):
+    context: AnalysisContext
+    rule: str
+    condition: str
+    match_type: ConditionMatchType
+
+
+class MatchColumns(object):
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.contexts: List[AnalysisContext] = []
+        self.rule_context = array("l")
+        self.rule_index = array("l")
+        self.match_row = array("l")
+        self.match_slot = array("l")
+        self.match_type = array("b")
+        self.match_start = array("l")
+        self.match_end = array("l")
+        self.regex_matches: Dict[int, RegexMatch] = {}
+        self.error_row = array("l")
+        self.errors: list = []
+        self.context_rows = array("l")
+        self.row_matches = array("l")
+        self.row_errors = array("l")
+
+    def __repr__(self):
+        return f"<MatchColumns contexts={len(self.contexts)} rules={len(self)} matches={len(self.match_row)}>"
+
+    def __len__(self) -> int:
+        return len(self.rule_index)
+
+    def append(self, evaluation: Evaluation):
+        """appends the rules reported for the context of an evaluation"""
+        compiled = self.compiled
+        position = len(self.contexts)
+        self.contexts.append(evaluation.context)
+        self.context_rows.append(len(self.rule_index))
+        for index, errors in compiled.select(evaluation):
+            row = len(self.rule_index)
+            self.rule_context.append(position)
+            self.rule_index.append(index)
+            self.row_matches.append(len(self.match_row))
+            self.row_errors.append(len(self.error_row))
+            for slot in compiled.slots_at(index):
+                outcome = evaluation.outcome(slot)
+                if outcome.error is not None:
+                    self.add_error(row, outcome.error)
+                elif outcome.rejected:
+                    self.add_error(
+                        row,
+                        ConditionRequired(
+                            condition=outcome.condition, context=evaluation.context
+                        ),
+                    )
+                else:
+                    match_types = outcome.found[-1]
+                    regex_match = getattr(match_types, "regex_match", None)
+                    for match_type in match_types:
+                        if match_type != ConditionMatchType.MATCHES_REGEX:
+                            self.add_match(row, slot, match_type)
+                        else:
+                            self.add_match(row, slot, match_type, regex_match)
+
+            for error in errors:
+                self.add_error(row, error)
+
+    def add_match(
+        self,
+        row: int,
+        slot: int,
+        match_type: ConditionMatchType,
+        regex_match: Optional[RegexMatch] = None,
+    ):
+        if regex_match is not None:
+            self.regex_matches[len(self.match_row)] = regex_match
+        self.match_row.append(row)
+        self.match_slot.append(slot)
+        self.match_type.append(MATCH_TYPE_CODES[match_type])
+        self.match_start.append(regex_match.start if regex_match else -1)
+        self.match_end.append(regex_match.end if regex_match else -1)
+
+    def add_error(self, row: int, error: Exception):
+        self.error_row.append(row)
+        self.errors.append(error)
+
+    def span(self, offsets: array, position: int, total: int) -> range:
+        end = offsets[position + 1] if position + 1 < len(offsets) else total
+        return range(offsets[position], end)
+
+    def rule_name(self, row: int) -> str:
+        return self.compiled.rule_at(self.rule_index[row]).name
+
+    def iter_matches(self) -> Iterator[MatchRow]:
+        conditions = self.compiled.condition_names
+        for row, slot, code in zip(self.match_row, self.match_slot, self.match_type):
+            yield MatchRow(
+                context=self.contexts[self.rule_context[row]],
+                rule=self.rule_name(row),
+                condition=conditions[slot],
+                match_type=MATCH_TYPES[code],
+            )
+
+    def count_by_rule(self) -> Dict[str, int]:
+        """how many contexts reported each rule"""
+        counts: Dict[str, int] = {}
+        for row in range(len(self)):
+            name = self.rule_name(row)
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def matched_rules(self, position: int) -> List[RuleMatch]:
+        """the matches of ``contexts[position]``, as returned by
+        :py:meth:`RuleSet.apply`"""
+        context = self.contexts[position]
+        matched_rules = []
+        for row in self.span(self.context_rows, position, len(self)):
+            matched_conditions = []
+            for match in self.span(self.row_matches, row, len(self.match_row)):
+                slot = self.match_slot[match]
+                condition = self.compiled.conditions[slot]
+                element, _, attribute, location, value = condition.process_context(
+                    context
+                )
+                matched_conditions.append(
+                    ConditionMatch(
+                        condition,
+                        slot,
+                        context,
+                        element,
+                        attribute,
+                        location,
+                        value,
+                        MATCH_TYPES[self.match_type[match]],
+                        self.regex_matches.get(match),
+                    )
+                )
+
+            index = self.rule_index[row]
+            matched_rules.append(
+                RuleMatch(
+                    rule=self.compiled.rule_at(index),
+                    index=index,
+                    context=context,
+                    matched_conditions=matched_conditions,
+                    invalid_conditions=[
+                        self.errors[error]
+                        for error in self.span(self.row_errors, row, len(self.errors))
+                    ],
+                )
+            )
+
+        return matched_rules
+
+
+def iter_contexts(compiled, items: Iterable) -> Iterator[AnalysisContext]:
+    for item in items:
+        if isinstance(item, Build):
+            yield from compiled.iter_contexts(item)
+        else:
+            yield item
+
+
+def apply_many(compiled, items: Iterable) -> MatchColumns:
+    """evaluates a :py:class:`~drone_ci_butler.rule_engine.compiler.CompiledRuleSet`
+    against every context, or every step of the given builds, sharing
+    the outcomes of build and stage conditions across consecutive
+    contexts of the same build and stage"""
+    columns = MatchColumns(compiled)
+    shared_slots = {
+        level: [
+            slot
+            for slot, condition in enumerate(compiled.conditions)
+            if condition.context_element == level
+        ]
+        for level in ("build", "stage")
+    }
+    current_build = None
+    shared: Dict[tuple, Dict[int, Outcome]] = {}
+    for context in iter_contexts(compiled, items):
+        evaluation = compiled.evaluate(context)
+        build = element_key(context.build)
+        if build != current_build:
+            current_build, shared = build, {}
+
+        keys = {}
+        if build is not None:
+            keys["build"] = ("build",)
+            stage = element_key(context.stage)
+            if stage is not None:
+                keys["stage"] = ("stage", stage)
+
+        for key in keys.values():
+            for slot, outcome in shared.get(key, {}).items():
+                evaluation.outcomes[slot] = outcome
+
+        columns.append(evaluation)
+
+        for level, key in keys.items():
+            outcomes = shared.setdefault(key, {})
+            for slot in shared_slots[level]:
+                outcome = evaluation.outcomes[slot]
+                # errors mention the context they were raised for
+                if outcome is not None and outcome.error is None:
+                    outcomes[slot] = outcome
+
+    return columns
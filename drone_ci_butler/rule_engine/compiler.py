@@ -0,0 +1,337 @@
+"""Immutable, precomputed form of a
+:py:class:`~drone_ci_butler.rule_engine.models.RuleSet`.
+
+:py:meth:`RuleSet.compile` merges the ``default_conditions`` and
+``required_conditions`` into the effective conditions of each rule
+once, leaving the original rules untouched, so that
+:py:meth:`CompiledRuleSet.apply` does the same amount of work no
+matter how many contexts it already analyzed.
+"""
+import logging
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from drone_ci_butler.drone_api.models import AnalysisContext, Build, Stage, Step
+from drone_ci_butler.rule_engine.exceptions import CancelationRequested
+from drone_ci_butler.rule_engine.models import (
+    Condition,
+    ConditionSet,
+    Rule,
+    RuleAction,
+    RuleSet,
+)
+from drone_ci_butler.rule_engine.evaluation import Evaluation, PartialContext
+from drone_ci_butler.rule_engine.index import RuleIndex
+from drone_ci_butler.rule_engine.profiling import clock
+from drone_ci_butler.rule_engine.results import RuleMatch
+from drone_ci_butler.rule_engine.scanner import ScanPlan
+
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_LEVELS = ("build", "stage", "step")
+
+# the index of the rule reported when the required conditions have an
+# ABRUPT_INTERRUPTION or REQUEST_CANCELATION default action
+REQUIRED_RULE = -1
+
+
+def ruleset_signature(ruleset: RuleSet) -> tuple:
+    """identifies the objects a :py:class:`CompiledRuleSet` was built
+    from, reading the raw model data to keep the check cheap enough to
+    run on every :py:meth:`RuleSet.apply` call.
+    """
+    data = ruleset.__data__
+    rules = data.get("rules") or []
+    return (
+        data.get("name"),
+        data.get("default_action"),
+        id(data.get("default_conditions")),
+        id(data.get("required_conditions")),
+        id(rules),
+        tuple(
+            (id(rule), id(rule.__data__.get("conditions")), rule.__data__.get("action"))
+            for rule in rules
+        ),
+    )
+
+
+def without_children(model, attribute: str):
+    data = {
+        name: value
+        for name, value in model.__data__.items()
+        if name != attribute and value is not None
+    }
+    return model.__class__(**data)
+
+
+class CompiledRule(NamedTuple):
+    name: str
+    action: Optional[RuleAction]
+    conditions: Tuple[Condition, ...]
+    slots: Tuple[int, ...]
+    rule: Rule
+
+
+class CompiledRuleSet(object):
+    def __init__(self, ruleset: RuleSet):
+        self.signature = ruleset_signature(ruleset)
+        # keeps the compiled models alive so that the ids in the
+        # signature cannot be reused by other objects
+        self.source = (
+            ruleset.default_conditions,
+            ruleset.required_conditions,
+            ruleset.rules,
+        )
+        self.name = ruleset.name
+        self.default_action = ruleset.default_action
+        self.conditions: List[Condition] = []
+        self.slots: Dict[tuple, int] = {}
+        self.required_conditions = ruleset.required_conditions or ConditionSet([])
+        self.required = tuple(self.required_conditions)
+        self.required_slots = self.allocate(self.required)
+        # every rule starts with these, so when one of them is
+        # required and does not match no rule can match either
+        self.precondition_slots = tuple(
+            slot
+            for slot in self.allocate(
+                chain(ruleset.default_conditions or [], self.required)
+            )
+            if self.conditions[slot].required
+        )
+        self.level_slots = {
+            level: tuple(
+                slot
+                for slot in self.precondition_slots
+                if self.conditions[slot].context_element == level
+            )
+            for level in CONTEXT_LEVELS
+        }
+        # the required rule of these actions is reported even when the
+        # preconditions fail, so their steps cannot be pruned
+        self.prunable = not self.required or self.default_action not in (
+            RuleAction.ABRUPT_INTERRUPTION,
+            RuleAction.REQUEST_CANCELATION,
+        )
+        self.required_rule = None
+        if self.default_action is not None:
+            self.required_rule = Rule(
+                name=f"{self.name}.required_conditions",
+                conditions=self.required_conditions,
+                action=self.default_action,
+            )
+        self.rules = tuple(
+            self.compile_rule(rule, ruleset.default_conditions)
+            for rule in ruleset.rules or []
+        )
+        self.rule_index = RuleIndex(
+            self.conditions,
+            [rule.slots for rule in self.rules],
+            skip_slots=self.precondition_slots,
+        )
+        self.scan_plan = ScanPlan(ruleset.iter_conditions())
+        self.profiler = None
+        self.condition_names = [c.to_description() for c in self.conditions]
+
+    def __repr__(self):
+        return f"<CompiledRuleSet {self.name} rules={len(self.rules)}>"
+
+    def allocate(self, conditions: Iterable[Condition]) -> Tuple[int, ...]:
+        """returns the slot of each condition, conditions that are equal
+        across rules share the same slot so that they are evaluated once
+        per context"""
+        slots = []
+        for condition in conditions:
+            key = (condition, condition.regex_options)
+            if key not in self.slots:
+                self.slots[key] = len(self.conditions)
+                self.conditions.append(condition)
+            slots.append(self.slots[key])
+
+        return tuple(slots)
+
+    def compile_rule(
+        self, rule: Rule, default_conditions: Optional[ConditionSet]
+    ) -> CompiledRule:
+        """returns the equivalent of ``rule.with_preconditions(required)
+        .with_preconditions(default).with_default_action(action)``
+        applied to a copy of the rule"""
+        data = {
+            name: value
+            for name, value in rule.__data__.items()
+            if value is not None and name != "conditions"
+        }
+        effective = Rule(conditions=rule.conditions or ConditionSet([]), **data)
+        effective = (
+            effective.with_preconditions(pre_conditions=self.required_conditions)
+            .with_preconditions(pre_conditions=default_conditions)
+            .with_default_action(self.default_action)
+        )
+        conditions = tuple(effective.conditions)
+        return CompiledRule(
+            name=effective.name,
+            action=effective.action,
+            conditions=conditions,
+            slots=self.allocate(conditions),
+            rule=effective,
+        )
+
+    def evaluate(self, context: AnalysisContext) -> Evaluation:
+        return Evaluation(
+            self.conditions,
+            context,
+            self.scan_plan.scan(context),
+            profiler=self.profiler,
+            names=self.condition_names,
+        )
+
+    def rejects(self, level: str, **elements) -> bool:
+        """returns True when a precondition that only depends on the
+        given context ``level`` does not match the given elements"""
+        slots = self.level_slots[level]
+        if not self.prunable or not slots:
+            return False
+
+        evaluation = Evaluation(self.conditions, PartialContext(**elements))
+        return evaluation.rejects(slots)
+
+    def iter_contexts(self, build: Build) -> Iterator[AnalysisContext]:
+        """yields an :py:class:`~drone_ci_butler.drone_api.models.AnalysisContext`
+        for each step of the build, skipping whole builds, stages and
+        steps whose preconditions already fail at their own level.
+
+        The build and stage of each context do not carry their stages
+        and steps, which would otherwise be copied into every context.
+        """
+        if self.rejects("build", build=build):
+            return
+
+        build_info = without_children(build, "stages")
+        for stage in build.stages or []:
+            if self.rejects("stage", build=build, stage=stage):
+                continue
+
+            stage_info = without_children(stage, "steps")
+            for step in stage.steps or []:
+                if self.rejects("step", build=build, stage=stage, step=step):
+                    continue
+
+                yield AnalysisContext(build=build_info, stage=stage_info, step=step)
+
+    def select_rule(self, rule: CompiledRule, evaluation: Evaluation) -> bool:
+        if self.profiler is None:
+            return self.reports_rule(rule, evaluation)
+
+        started = clock()
+        reported = self.reports_rule(rule, evaluation)
+        counter = self.profiler.counter(self.profiler.rules, rule.name)
+        counter.record(clock() - started, reported)
+        return reported
+
+    def reports_rule(self, rule: CompiledRule, evaluation: Evaluation) -> bool:
+        if evaluation.rejects(rule.slots):
+            return False
+
+        return evaluation.reports(rule.slots)
+
+    def stream(self, build: Build, stage: Stage, step: Step, window: int = 200):
+        """returns a :py:class:`~drone_ci_butler.rule_engine.streaming.StreamingMatcher`
+        for the output of a step that is still running"""
+        from .streaming import StreamingMatcher
+
+        return StreamingMatcher(self, build, stage, step, window=window)
+
+    def apply(self, context: AnalysisContext) -> List[RuleMatch]:
+        if self.profiler is None:
+            return self.apply_evaluation(self.evaluate(context))
+
+        started = clock()
+        matched_rules = self.apply_evaluation(self.evaluate(context))
+        counter = self.profiler.counter(self.profiler.rulesets, self.name)
+        counter.record(clock() - started, matched_rules)
+        return matched_rules
+
+    def explain(self, context: AnalysisContext):
+        """applies the ruleset to the context recording the decisions
+        that led to its matches
+
+        :returns: a :py:class:`~drone_ci_butler.rule_engine.trace.Trace`
+        """
+        from .trace import Trace, TracedEvaluation
+
+        evaluation = TracedEvaluation(
+            self.conditions,
+            context,
+            self.scan_plan.scan(context),
+            names=self.condition_names,
+        )
+        matches = self.apply_evaluation(evaluation)
+        return Trace.from_evaluation(self, evaluation, matches)
+
+    def select(self, evaluation: Evaluation) -> Iterator[Tuple[int, list]]:
+        """yields the index of each rule reported for the context of the
+        evaluation, or :py:data:`REQUIRED_RULE` for the rule of the
+        required conditions, along with the errors that come from the
+        ruleset itself rather than from its conditions. Conditions are
+        evaluated but never materialized."""
+        if self.required:
+            if self.default_action is None or self.default_action in (
+                RuleAction.OMIT_FAILED,
+                RuleAction.NEXT_RULE,
+            ):
+                pass
+            elif self.default_action == RuleAction.SKIP_ANALYSIS:
+                return
+            elif self.default_action == RuleAction.ABRUPT_INTERRUPTION:
+                yield REQUIRED_RULE, []
+                return
+            elif self.default_action == RuleAction.REQUEST_CANCELATION:
+                yield REQUIRED_RULE, [CancelationRequested(evaluation.context)]
+            else:
+                raise RuntimeError(f"unhandled action {self.default_action}")
+
+        if evaluation.rejects(self.precondition_slots):
+            return
+
+        for index in self.rule_index.lookup(evaluation.context):
+            rule = self.rules[index]
+            if not self.select_rule(rule, evaluation):
+                continue
+
+            if rule.action is None or rule.action != RuleAction.OMIT_FAILED:
+                yield index, []
+            else:
+                logger.error(f"rule {rule.rule} has invalid action: {rule.action}")
+
+    def rule_at(self, index: int) -> Rule:
+        if index == REQUIRED_RULE:
+            return self.required_rule
+        return self.rules[index].rule
+
+    def slots_at(self, index: int) -> Tuple[int, ...]:
+        if index == REQUIRED_RULE:
+            return self.required_slots
+        return self.rules[index].slots
+
+    def apply_many(self, items: Iterable):
+        from .batch import apply_many
+
+        return apply_many(self, items)
+
+    def apply_evaluation(self, evaluation: Evaluation) -> List[RuleMatch]:
+        matched_rules = []
+        for index, errors in self.select(evaluation):
+            matched_conditions, invalid_conditions = evaluation.apply(
+                self.slots_at(index)
+            )
+            matched_rules.append(
+                RuleMatch(
+                    rule=self.rule_at(index),
+                    index=index,
+                    context=evaluation.context,
+                    matched_conditions=matched_conditions,
+                    invalid_conditions=invalid_conditions + errors,
+                )
+            )
+
+        return matched_rules
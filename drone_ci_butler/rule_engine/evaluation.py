@@ -0,0 +1,171 @@
+"""Per-context memoization of condition results.
+
+A :py:class:`~drone_ci_butler.rule_engine.compiler.CompiledRuleSet`
+gives each distinct condition of the ruleset an integer slot. An
+:py:class:`Evaluation` evaluates each slot at most once per
+:py:class:`~drone_ci_butler.drone_api.models.AnalysisContext`, so the
+required and default conditions shared by every rule cost one check
+per step rather than one per rule.
+
+The outcome of a condition is kept as the raw values it was matched
+against, :py:class:`~drone_ci_butler.rule_engine.results.ConditionMatch`
+and :py:class:`~drone_ci_butler.rule_engine.exceptions.ConditionRequired`
+instances are only built for the rules that can still match, which
+keeps the rejection of successful steps cheap. Nothing is raised on
+the path of a condition that does not match, its
+:py:attr:`Outcome.status` tells why.
+"""
+from enum import Enum
+from typing import Any, List, Sequence, Tuple
+
+from drone_ci_butler.drone_api.models import AnalysisContext
+from drone_ci_butler.rule_engine.exceptions import (
+    ConditionRequired,
+    InvalidCondition,
+)
+from drone_ci_butler.rule_engine.models import Condition
+from drone_ci_butler.rule_engine.profiling import clock, size_of
+from drone_ci_butler.rule_engine.results import ConditionMatch, condition_matches
+
+
+class OutcomeStatus(Enum):
+    MATCHED = "matched"
+    NOT_MATCHED = "not_matched"
+    REJECTED = "rejected"
+    INVALID = "invalid"
+
+
+class Outcome(object):
+    """the memoized result of a single condition"""
+
+    __slots__ = ("condition", "slot", "found", "error", "matches", "_materialized")
+
+    def __init__(
+        self, condition: Condition, found: tuple = (), error=None, slot: int = None
+    ):
+        self.condition = condition
+        self.slot = slot
+        self.found = found
+        self.error = error
+        self.matches = None
+        self._materialized = False
+
+    @property
+    def rejected(self) -> bool:
+        """True when the condition is required and did not match, in
+        which case :py:meth:`Condition.apply` raises ConditionRequired"""
+        return self.error is None and self.condition.required and not self.found[-1]
+
+    @property
+    def status(self) -> OutcomeStatus:
+        if self.error is not None and not isinstance(self.error, ConditionRequired):
+            return OutcomeStatus.INVALID
+        if self.rejected or self.error is not None:
+            return OutcomeStatus.REJECTED
+        if self.found[-1]:
+            return OutcomeStatus.MATCHED
+        return OutcomeStatus.NOT_MATCHED
+
+    def materialize(self, context: AnalysisContext) -> Tuple[List[ConditionMatch], Any]:
+        if not self._materialized:
+            if self.rejected:
+                self.error = ConditionRequired(condition=self.condition, context=context)
+            elif self.error is None:
+                self.matches = condition_matches(
+                    self.condition, self.slot, context, self.found
+                )
+            self._materialized = True
+
+        return self.matches, self.error
+
+
+class PartialContext(object):
+    """stands in for an :py:class:`~drone_ci_butler.drone_api.models.AnalysisContext`
+    while only the outer elements of a build are known, avoiding the
+    copy of the elements into a model"""
+
+    def __init__(self, **elements):
+        self.elements = elements
+
+    def __str__(self):
+        return f"<PartialContext {', '.join(self.elements)}>"
+
+    def get(self, name: str, default=None):
+        return self.elements.get(name, default)
+
+
+class Evaluation(object):
+    def __init__(
+        self,
+        conditions: Sequence[Condition],
+        context: AnalysisContext,
+        scan=None,
+        profiler=None,
+        names: Sequence[str] = (),
+    ):
+        self.conditions = conditions
+        self.context = context
+        self.scan = scan
+        self.profiler = profiler
+        self.names = names
+        self.outcomes: List[Outcome] = [None] * len(conditions)
+
+    def outcome(self, slot: int) -> Outcome:
+        outcome = self.outcomes[slot]
+        if outcome is None:
+            condition = self.conditions[slot]
+            started = clock()
+            try:
+                found = condition.find_matches(self.context, scan=self.scan)
+            except InvalidCondition as e:
+                outcome = Outcome(condition, error=e, slot=slot)
+            else:
+                outcome = Outcome(condition, found=found, slot=slot)
+
+            self.outcomes[slot] = outcome
+            if self.profiler is not None:
+                self.record(slot, outcome, clock() - started)
+
+        return outcome
+
+    def record(self, slot: int, outcome: Outcome, seconds: float):
+        hit = outcome.error is None and bool(outcome.found[-1])
+        scanned = outcome.error is None and size_of(outcome.found[3]) or 0
+        counter = self.profiler.counter(self.profiler.conditions, self.names[slot])
+        counter.record(seconds, hit, scanned)
+
+    def rejects(self, slots: Sequence[int]) -> bool:
+        """returns True as soon as one of the given required conditions
+        does not match, without evaluating the remaining ones"""
+        for slot in slots:
+            if self.outcome(slot).rejected:
+                return True
+
+        return False
+
+    def reports(self, slots: Sequence[int]) -> bool:
+        """returns True when :py:meth:`apply` would return matched or
+        invalid conditions for the given slots"""
+        for slot in slots:
+            outcome = self.outcome(slot)
+            if outcome.error is not None or outcome.rejected or outcome.found[-1]:
+                return True
+
+        return False
+
+    def apply(self, slots: Sequence[int]) -> Tuple[List[ConditionMatch], list]:
+        """the equivalent of :py:func:`~drone_ci_butler.rule_engine.models.apply_conditions`
+        for the conditions in the given slots"""
+        matched_conditions = []
+        invalid_conditions = []
+        for slot in slots:
+            matches, error = self.outcome(slot).materialize(self.context)
+            if error is not None:
+                invalid_conditions.append(error)
+            elif matches:
+                matched_conditions.extend(matches)
+
+        if not matched_conditions:
+            return [], invalid_conditions
+
+        return matched_conditions, invalid_conditions
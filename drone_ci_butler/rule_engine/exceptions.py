@@ -33,11 +33,36 @@ class CancelationRequested(InvalidCondition):
         super().__init__(message, None, context)
 
 
+class RegexBudgetExceeded(InvalidCondition):
+    """raised when the regular expression of a condition takes longer
+    than its time budget to search the target value"""
+
+    def __init__(
+        self,
+        condition: Any,
+        elapsed: float,
+        budget: float,
+        size: int,
+        context: Optional[AnalysisContext] = None,
+    ):
+        self.elapsed = elapsed
+        self.budget = budget
+        self.size = size
+        description = condition.to_description()
+        message = f"{description} exceeded its regex time budget of {budget:.3f}s: gave up after {elapsed:.3f}s searching {size} characters"
+        super().__init__(message, condition, context)
+
+
 class InvalidConditionSet(UserFriendlyException):
     def __init__(self, message):
         super().__init__(f"{message}")
 
 
+class InvalidRuleSet(UserFriendlyException):
+    def __init__(self, message):
+        super().__init__(f"{message}")
+
+
 class NotStringOrListOfStrings(UserFriendlyException):
     def __init__(self, v: Union[List[str], str]):
         super().__init__(f"got invalid value {v} {type(v)}")
@@ -0,0 +1,129 @@
+"""Candidate rules of a step, looked up by its cheap attributes.
+
+A rule is never reported for a step that one of its required
+conditions rejects. When such a condition only looks at the name or
+status of the step or at the name of its stage, whether it rejects a
+step is known from those few values alone. A :py:class:`RuleIndex`
+evaluates these conditions once per distinct combination of values
+and remembers which rules remain candidates, so
+:py:meth:`CompiledRuleSet.select
+<drone_ci_butler.rule_engine.compiler.CompiledRuleSet.select>` only
+evaluates the rules that can still be reported for the step.
+
+Conditions that are not required do not take part in the index: a rule
+is reported as soon as any of its conditions matches, so they cannot
+rule it out. The index belongs to the
+:py:class:`~drone_ci_butler.rule_engine.compiler.CompiledRuleSet`,
+which is rebuilt whenever the rules of its ruleset change.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from drone_ci_butler.drone_api.models import AnalysisContext
+from drone_ci_butler.rule_engine.attributes import TargetKey, target_key
+from drone_ci_butler.rule_engine.exceptions import InvalidCondition
+from drone_ci_butler.rule_engine.models import Condition
+
+
+INDEXED_TARGETS: Tuple[TargetKey, ...] = (
+    ("step", ("name",)),
+    ("step", ("status",)),
+    ("stage", ("name",)),
+)
+
+MAX_KEYS = 4096
+
+
+def is_indexable(condition: Condition) -> bool:
+    return bool(condition.required) and target_key(condition) in INDEXED_TARGETS
+
+
+class RuleIndex(object):
+    def __init__(
+        self,
+        conditions: Sequence[Condition],
+        rule_slots: Sequence[Tuple[int, ...]],
+        skip_slots: Sequence[int] = (),
+        max_keys: int = MAX_KEYS,
+    ):
+        """:param rule_slots: the slots of the conditions of each rule
+        :param skip_slots: slots that are checked before any rule, i.e.:
+          the required conditions of the ruleset
+        """
+        self.conditions = conditions
+        skip_slots = set(skip_slots)
+        self.max_keys = max_keys
+        self.all_rules = tuple(range(len(rule_slots)))
+        self.indexed_slots: Dict[int, Tuple[int, ...]] = {}
+        for index, slots in enumerate(rule_slots):
+            indexed = tuple(
+                slot
+                for slot in slots
+                if slot not in skip_slots and is_indexable(conditions[slot])
+            )
+            if indexed:
+                self.indexed_slots[index] = indexed
+
+        slots = sorted({s for indexed in self.indexed_slots.values() for s in indexed})
+        self.targets: List[TargetKey] = sorted(
+            {target_key(conditions[slot]) for slot in slots}
+        )
+        self.target_slots = {
+            slot: self.targets.index(target_key(conditions[slot])) for slot in slots
+        }
+        self.candidates: Dict[tuple, Tuple[int, ...]] = {}
+
+    def __repr__(self):
+        return f"<RuleIndex targets={self.targets} rules={len(self.indexed_slots)}/{len(self.all_rules)}>"
+
+    def __bool__(self) -> bool:
+        return bool(self.indexed_slots)
+
+    def key_of(self, context: AnalysisContext) -> Optional[tuple]:
+        values = []
+        for element_name, path in self.targets:
+            element = context.get(element_name)
+            if not element:
+                return None
+            values.append(getattr(element, path[0], None))
+
+        key = tuple(values)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def rejects(self, slot: int, value: Any) -> bool:
+        try:
+            return not self.conditions[slot].match_value(value)
+        except InvalidCondition:
+            # e.g.: a regex that exceeds its budget is reported by the rule
+            return False
+
+    def lookup(self, context: AnalysisContext) -> Sequence[int]:
+        """the indexes of the rules that can be reported for the
+        context, in the order they were declared"""
+        if not self.indexed_slots:
+            return self.all_rules
+
+        key = self.key_of(context)
+        if key is None:
+            return self.all_rules
+
+        candidates = self.candidates.get(key)
+        if candidates is None:
+            rejected = {
+                slot
+                for slot, position in self.target_slots.items()
+                if self.rejects(slot, key[position])
+            }
+            candidates = tuple(
+                index
+                for index in self.all_rules
+                if rejected.isdisjoint(self.indexed_slots.get(index, ()))
+            )
+            if len(self.candidates) >= self.max_keys:
+                self.candidates.clear()
+            self.candidates[key] = candidates
+
+        return candidates
@@ -1,4 +1,6 @@
+import os
 import re
+import logging
 from re import Pattern
 from enum import Enum
 
@@ -10,8 +12,11 @@ from typing import Any
 from typing import TypeVar
 from typing import Set
 from typing import Iterator
+from typing import Iterable
 from typing import Tuple
-from fnmatch import fnmatch
+from typing import Dict
+from typing import NamedTuple
+from fnmatch import fnmatch, translate
 
 from itertools import chain
 from uiclasses import Model, UserFriendlyObject
@@ -19,13 +24,17 @@ from uiclasses import ModelList, ModelSet
 from uiclasses.typing import Property
 from datetime import datetime
 from drone_ci_butler.config import Config
+from drone_ci_butler.version import version as package_version
 from drone_ci_butler.drone_api.models import AnalysisContext, Build, Step, Stage
 from .exceptions import ConditionRequired
 from .exceptions import CancelationRequested
 from .exceptions import ContextElementMissing
 from .exceptions import InvalidCondition
 from .exceptions import InvalidConditionSet
+from .exceptions import InvalidRuleSet
 from .exceptions import NotStringOrListOfStrings
+from .exceptions import RegexBudgetExceeded
+from .safe_regex import DEFAULT_REGEX_BUDGET_SECONDS, GuardedRegex, RegexTimeout
 
 
 class RuleAction(Enum):
@@ -36,6 +45,14 @@ class RuleAction(Enum):
     ABRUPT_INTERRUPTION = "ABRUPT_INTERRUPTION"
 
 
+def rule_action_from_config(name: str, owner: str) -> RuleAction:
+    try:
+        return RuleAction(str(name).upper())
+    except ValueError:
+        options = ", ".join(a.value for a in RuleAction)
+        raise InvalidRuleSet(f"{owner!r} has an invalid action {name!r}, options: {options}")
+
+
 class ConditionMatchType(Enum):
     CONTAINS_STRING = "CONTAINS_STRING"
     IS_NOT = "IS_NOT"
@@ -44,6 +61,39 @@ class ConditionMatchType(Enum):
     VALUE_EXACT = "VALUE_EXACT"
 
 
+class RegexMatch(NamedTuple):
+    """where the regex of a condition matched in the text of the value"""
+
+    start: int
+    end: int
+    groups: Tuple[Optional[str], ...]
+    named: Dict[str, Optional[str]]
+
+    @classmethod
+    def from_match(cls, match, regex: Optional[Pattern] = None, group: str = None):
+        """:param regex: the pattern combined into the alternation that
+          produced the match, under the given named ``group``
+        """
+        if regex is None:
+            return cls(match.start(), match.end(), match.groups(), match.groupdict())
+
+        offset = match.re.groupindex[group]
+        return cls(
+            match.start(group),
+            match.end(group),
+            tuple(match.group(offset + i) for i in range(1, regex.groups + 1)),
+            {name: match.group(name) for name in regex.groupindex},
+        )
+
+
+class ConditionMatchTypes(list):
+    """the :py:class:`ConditionMatchType` of each matcher of a
+    condition that matched, along with the :py:class:`RegexMatch` when
+    ``MATCHES_REGEX`` is one of them"""
+
+    regex_match: Optional[RegexMatch] = None
+
+
 DEFAULT_REGEX_OPTIONS: int = re.I | re.MULTILINE | re.DOTALL | re.UNICODE
 DEFAULT_ACTION: RuleAction = RuleAction.NEXT_RULE
 T = TypeVar("T")
@@ -51,6 +101,8 @@ nothing = type("nothing", (tuple,), {})()
 
 
 StringOrListOfStrings = Union[List[str], str]
+logger = logging.getLogger(__name__)
+GLOB_CHARACTERS = re.compile(r"[*?\[]")
 
 
 def list_of_strings(value: StringOrListOfStrings) -> List[str]:
@@ -69,6 +121,91 @@ def list_of_strings(value: StringOrListOfStrings) -> List[str]:
     return result
 
 
+def has_glob(value: str) -> bool:
+    return GLOB_CHARACTERS.search(value) is not None
+
+
+def glob_affixes(pattern: str) -> Tuple[str, str]:
+    """returns the literal prefix and suffix that every value matched
+    by the given glob pattern starts and ends with"""
+    first = GLOB_CHARACTERS.search(pattern)
+    prefix = first and pattern[: first.start()] or ""
+    last = max(pattern.rfind(c) for c in "*?[]")
+    return prefix, pattern[last + 1 :]
+
+
+class PatternList(object):
+    """The precompiled form of a list of glob patterns.
+
+    Patterns without glob characters are compared as a set, the
+    others are translated by :py:func:`fnmatch.translate` into a single
+    regular expression, so that matching a value against every pattern
+    costs a set lookup and one regex match instead of one
+    :py:func:`fnmatch.fnmatch` call per pattern.
+    """
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = tuple(patterns)
+        normalized = [os.path.normcase(p) for p in self.patterns]
+        self.literals = frozenset(p for p in normalized if not has_glob(p))
+        self.globs = {}
+        self.any_glob = None
+        # patterns that fnmatch cannot translate into a valid regex
+        # (e.g.: ``[z-a]``) leave the matching to fnmatch itself
+        self.valid = True
+        for pattern, n in zip(self.patterns, normalized):
+            if has_glob(n):
+                try:
+                    self.globs[pattern] = re.compile(translate(n)).match
+                except re.error:
+                    self.valid = False
+
+        if self.globs and self.valid:
+            combined = "|".join(translate(n) for n in normalized if has_glob(n))
+            try:
+                self.any_glob = re.compile(combined).match
+            except re.error:  # pragma: no cover
+                pass
+
+        # quick rejection of values that cannot contain or be contained
+        # by any of the patterns, see :py:meth:`ValueList.contains`
+        self.any_substring = re.compile(
+            "|".join(map(re.escape, sorted(self.patterns, key=len, reverse=True)))
+        ).search
+        self.joined = "\0".join(self.patterns)
+
+    def __repr__(self):
+        return f"<PatternList {list(self.patterns)}>"
+
+    def may_be_matched_by(self, glob: str) -> bool:
+        """quickly rules out glob patterns (e.g.: log lines containing
+        ``[`` or ``*``) that cannot match any of these patterns"""
+        prefix, suffix = glob_affixes(glob)
+        minimum = len(prefix) + len(suffix)
+        return any(
+            len(p) >= minimum and p.startswith(prefix) and p.endswith(suffix)
+            for p in self.patterns
+        )
+
+    def fnmatch(self, value: str, pattern: str) -> bool:
+        """the equivalent of ``fnmatch(value, pattern)`` for one of
+        these patterns"""
+        glob = self.globs.get(pattern)
+        if glob is None:
+            return os.path.normcase(value) == os.path.normcase(pattern)
+        return glob(os.path.normcase(value)) is not None
+
+    def matches(self, value: str) -> bool:
+        """the equivalent of ``any(fnmatch(value, p) for p in patterns)``"""
+        value = os.path.normcase(value)
+        if value in self.literals:
+            return True
+        if self.any_glob is not None:
+            return self.any_glob(value) is not None
+
+        return any(glob(value) is not None for glob in self.globs.values())
+
+
 class ValueList(list, UserFriendlyObject):
     values: List[str]
     name: str
@@ -80,12 +217,61 @@ class ValueList(list, UserFriendlyObject):
     def __repr__(self):
         return f"<ValueList: {self.values}>"
 
-    def contains(self, value_or_values: StringOrListOfStrings) -> Optional[bool]:
+    @property
+    def patterns(self) -> PatternList:
+        """compiled once, the first time it is needed"""
+        patterns = self.__dict__.get("_patterns")
+        if patterns is None:
+            patterns = self.__dict__["_patterns"] = PatternList(self.values)
+        return patterns
+
+    def contains(
+        self,
+        value_or_values: StringOrListOfStrings,
+        substrings: Optional[Set[str]] = None,
+    ) -> Optional[bool]:
+        """returns the first of these values that matches the given
+        value(s) either as a glob pattern or as a substring.
+
+        :param substrings: which of these values are already known to
+          occur in ``value_or_values``, e.g.: as found by a
+          :py:class:`~drone_ci_butler.rule_engine.scanner.Scan`, in
+          which case the value(s) are not searched again.
+        """
+        if substrings is not None:
+            for mine in self.values:
+                if mine in substrings:
+                    return mine
+
+        if not self.values:
+            return None
+
+        patterns = self.patterns
+        forward = substrings is None
         for theirs in list_of_strings(value_or_values):
+            if not patterns.valid:
+                for mine in self.values:
+                    if forward and (fnmatch(theirs, mine) or mine in theirs):
+                        return mine
+                    if theirs in mine or fnmatch(mine, theirs):
+                        return mine
+                continue
+
+            # each value is first checked against all of these values
+            # at once and only compared one by one when it can match
+            maybe = (
+                (forward and patterns.any_substring(theirs) is not None)
+                or (forward and patterns.matches(theirs))
+                or theirs in patterns.joined
+                or (has_glob(theirs) and patterns.may_be_matched_by(theirs))
+            )
+            if not maybe:
+                continue
+
             for mine in self.values:
-                if fnmatch(f"{theirs}", f"{mine}") or fnmatch(f"{mine}", f"{theirs}"):
+                if forward and (patterns.fnmatch(theirs, mine) or mine in theirs):
                     return mine
-                if theirs in mine or mine in theirs:
+                if theirs in mine or fnmatch(mine, theirs):
                     return mine
 
     @property
@@ -117,6 +303,7 @@ class Condition(Model):
     is_not: Any
     value: Any
     regex_options: int
+    regex_budget: float
     required: bool
 
     def __init__(
@@ -124,6 +311,7 @@ class Condition(Model):
         condition=None,
         **kw,
     ):
+        regex = None
         if isinstance(condition, dict):
             kw.update(condition)
         elif isinstance(condition, Condition):
@@ -136,6 +324,10 @@ class Condition(Model):
             kw["matches_value"] = condition.matches_value
             kw["value_exact"] = condition.value_exact
             kw["value"] = condition.value
+            kw["regex_options"] = condition.regex_options
+            if condition.regex_budget:
+                kw["regex_budget"] = condition.regex_budget
+            regex = condition.regex
 
         elif condition is not None:  # pragma: no cover
             raise RuntimeError(f"invalid condition {repr(condition)}")
@@ -183,6 +375,61 @@ class Condition(Model):
                 condition=self,
             )
 
+        self.regex = regex or self.compile_regex()
+        self.guarded_regex = self.regex and GuardedRegex(
+            self.regex, self.regex_budget or DEFAULT_REGEX_BUDGET_SECONDS
+        )
+        if self.guarded_regex and self.guarded_regex.unsafe:
+            logger.warning(
+                f"{self.to_description()} has nested quantifiers and might "
+                f"backtrack catastrophically, searches are limited to "
+                f"{self.guarded_regex.budget}s"
+            )
+
+    def compile_regex(self) -> Optional[Pattern]:
+        """compiles :py:attr:`matches_regex` so that it can be reused
+        across every call to :py:meth:`apply`.
+
+        :raises InvalidCondition: if the regular expression is invalid
+        """
+        if not self.matches_regex:
+            return None
+
+        if isinstance(self.matches_regex, Pattern):
+            return self.matches_regex
+
+        try:
+            return re.compile(self.matches_regex, self.regex_options)
+        except re.error as e:
+            raise InvalidCondition(
+                f"Invalid {self.to_description()} regex is INVALID: `{e}`",
+                condition=self,
+            )
+
+    def search_regex(self, text: str) -> Optional[RegexMatch]:
+        try:
+            found = self.guarded_regex.search(text)
+        except RegexTimeout as e:
+            raise RegexBudgetExceeded(self, e.elapsed, e.budget, e.size)
+
+        return found and RegexMatch.from_match(found)
+
+    def match_value_patterns(self, value: Any) -> bool:
+        """returns True if the value matches any of the glob patterns
+        in :py:attr:`matches_value`"""
+        patterns = self.__dict__.get("_value_patterns")
+        if patterns is None:
+            if isinstance(value, str) and all(
+                isinstance(p, str) for p in self.matches_value
+            ):
+                patterns = PatternList(self.matches_value)
+                self.__dict__["_value_patterns"] = patterns
+
+        if patterns is None or not patterns.valid or not isinstance(value, str):
+            return any([fnmatch(value, pattern) for pattern in self.matches_value])
+
+        return patterns.matches(value)
+
     @classmethod
     def from_config(cls: Type[T], config: dict) -> T:
         params = {}
@@ -192,6 +439,9 @@ class Condition(Model):
             tgt_attr = keys[1:]
             params["context_element"] = ctx_elem
             params["target_attribute"] = tgt_attr
+            if not isinstance(matchers, dict):
+                # e.g.: ``- step.status: failure``
+                matchers = {"matches_value": matchers}
             params.update(matchers)
             # params["target_attribute"] = ValueList(tgt_attr)
             # for matcher, value in matchers.items():
@@ -237,114 +487,139 @@ class Condition(Model):
         location = f"{self.context_element}.{attribute}"
         value = element
         for attr in path:
+            error = KeyError(attr)
             try:
                 value = getattr(value, attr, nothing)
-                if value is nothing:
-                    raise KeyError(attr)
-
             except (AttributeError, KeyError) as e:
+                value, error = nothing, e
+
+            if value is nothing:
                 raise InvalidCondition(
-                    f"{self} could not find attribute {attribute} in {self.context_element}: {e}",
+                    f"{self} could not find attribute {attribute} in {self.context_element}: {error}",
                     condition=self,
                     context=context,
                 )
 
         return element, path, attribute, location, value
 
-    def apply(self: Type[T], context: AnalysisContext) -> List[T]:
-        result = []
-        element, path, attribute, location, value = self.process_context(context)
-
-        def matched_condition_of_type(match_type: ConditionMatchType, **kw):
-            if not kw.get("value"):
-                kw["value"] = value
-            return MatchedCondition(
-                condition=self,
-                context=context,
-                element=element,
-                attribute=attribute,
-                location=location,
-                match_type=match_type,
-                **kw,
-            )
-
+    def find_matches(
+        self, context: AnalysisContext, scan=None
+    ) -> Tuple[Any, str, str, Any, List[ConditionMatchType]]:
+        """evaluates the matchers of this condition without building
+        :py:class:`MatchedCondition` instances.
+
+        :returns: a tuple with the ``element``, ``attribute``,
+          ``location`` and ``value`` that were matched against along with
+          the list of :py:class:`ConditionMatchType` that matched
+        """
+        if scan is not None and scan.context is context:
+            resolved = scan.attributes.resolve(self)
+        else:
+            resolved = self.process_context(context)
+
+        element, path, attribute, location, value = resolved
+        try:
+            match_types = self.match_value(value, scan=scan)
+        except RegexBudgetExceeded as e:
+            e.context = context
+            raise
+        return element, attribute, location, value, match_types
+
+    def match_value(self, value: Any, scan=None) -> ConditionMatchTypes:
+        """returns the :py:class:`ConditionMatchType` of each matcher of
+        this condition that matches the given value
+
+        :raises RegexBudgetExceeded: if :py:attr:`matches_regex` takes
+          longer than :py:attr:`regex_budget` seconds
+        """
+        match_types = ConditionMatchTypes()
         if self.contains_string:
-            contains_string = self.contains_string.contains(value)
+            substrings = None
+            if scan is not None:
+                substrings = scan.found_literals(self, value)
+                value_or_values = scan.attributes.list_of_strings(self, value)
+            else:
+                value_or_values = value
+            contains_string = self.contains_string.contains(value_or_values, substrings)
             if contains_string:
-                result.append(
-                    matched_condition_of_type(
-                        ConditionMatchType.CONTAINS_STRING,
-                    )
-                )
-
-        if self.matches_regex:
-            try:
-                regex = re.compile(self.matches_regex, self.regex_options)
-            except re.error as e:
-                raise InvalidCondition(
-                    f"Invalid {self.to_description()} regex is INVALID: `{e}`",
-                    condition=self,
-                    context=context,
-                )
+                match_types.append(ConditionMatchType.CONTAINS_STRING)
 
-            found = regex.search(str(value))
+        if self.regex:
+            found = scan.matches_regex(self, value) if scan else None
+            if found is None:
+                text = scan.attributes.text(self, value) if scan else str(value)
+                found = self.search_regex(text)
             if found:
-                result.append(
-                    matched_condition_of_type(
-                        ConditionMatchType.MATCHES_REGEX,
-                        value=value,
-                    )
-                )
-                # TODO: unit test
+                match_types.append(ConditionMatchType.MATCHES_REGEX)
+                match_types.regex_match = found
 
         if self.matches_value:
             # match lists
             if isinstance(self.matches_value, list):
-                # TODO: use fnmatch
-                fnmatch
-                matched = any(
-                    [fnmatch(value, pattern) for pattern in self.matches_value]
-                )
+                matched = self.match_value_patterns(value)
                 if matched:
-                    result.append(
-                        matched_condition_of_type(
-                            ConditionMatchType.MATCHES_VALUE,
-                        )
-                    )
+                    match_types.append(ConditionMatchType.MATCHES_VALUE)
             # match literal values
             else:
                 matched = value == self.matches_value
                 if matched:
-                    result.append(
-                        matched_condition_of_type(
-                            ConditionMatchType.MATCHES_VALUE,
-                        )
-                    )
+                    match_types.append(ConditionMatchType.MATCHES_VALUE)
+
         if not isinstance(self.is_not, tuple):
             matched = value != self.is_not
             if matched:
-                result.append(
-                    matched_condition_of_type(
-                        ConditionMatchType.IS_NOT,
-                    )
-                )
+                match_types.append(ConditionMatchType.IS_NOT)
 
         if not isinstance(self.value_exact, tuple):
             matched = value == self.value_exact
             if matched:
-                result.append(
-                    matched_condition_of_type(
-                        ConditionMatchType.VALUE_EXACT,
-                    )
+                match_types.append(ConditionMatchType.VALUE_EXACT)
+
+        # TODO: implement other types of match here 😉
+        return match_types
+
+    def to_matched_conditions(
+        self: Type[T],
+        context: AnalysisContext,
+        element: Any,
+        attribute: str,
+        location: str,
+        value: Any,
+        match_types: List[ConditionMatchType],
+    ) -> List[T]:
+        regex_match = getattr(match_types, "regex_match", None)
+        matched_conditions = []
+        for match_type in match_types:
+            params = {}
+            if match_type == ConditionMatchType.MATCHES_REGEX and regex_match:
+                params["matched_regex_groups"] = list(regex_match.groups)
+            matched_conditions.append(
+                MatchedCondition(
+                    condition=self,
+                    context=context,
+                    element=element,
+                    attribute=attribute,
+                    location=location,
+                    match_type=match_type,
+                    value=value,
+                    **params,
                 )
+            )
+        return matched_conditions
 
-        if self.required and len(result) == 0:
+    def apply(self: Type[T], context: AnalysisContext, scan=None) -> List[T]:
+        element, attribute, location, value, match_types = self.find_matches(
+            context, scan=scan
+        )
+        if self.required and len(match_types) == 0:
             raise ConditionRequired(
                 condition=self,
                 context=context,
             )
-        # TODO: implement other types of match here 😉
-        return result
+
+        return self.to_matched_conditions(
+            context, element, attribute, location, value, match_types
+        )
 
 
 class MatchedCondition(Model):
@@ -359,10 +634,14 @@ class MatchedCondition(Model):
     matched_regex_groups: List[str]
 
     def to_description(self):
-        matches = self.condition.describe_matches()
-        # if not matches:
-        #     import ipdb;ipdb.set_trace()  # fmt: skip
-        return f"Matched Condition: Expect {self.condition.context_element}.{self.attribute} `{self.value}` {matches}"
+        return describe_matched_condition(self.condition, self.attribute, self.value)
+
+
+def describe_matched_condition(condition: Condition, attribute: str, value: Any) -> str:
+    matches = condition.describe_matches()
+    # if not matches:
+    #     import ipdb;ipdb.set_trace()  # fmt: skip
+    return f"Matched Condition: Expect {condition.context_element}.{attribute} `{value}` {matches}"
 
 
 class ConditionSet(Model):
@@ -399,45 +678,16 @@ class ConditionSet(Model):
     def apply(
         self,
         context: AnalysisContext,
+        scan=None,
     ) -> Tuple[MatchedCondition.List, List[InvalidCondition]]:
-        matched_conditions = MatchedCondition.List([])
-        invalid_conditions = []
-        matched_count = 0
-        required_count = 0
-        total_conditions = len(self.conditions)
-        total_required = len(
-            [c for c in self.conditions if getattr(c, "required", False)]
-        )
-        conditions = list(self.conditions)
-        for condition in conditions:
-            if not isinstance(condition, Condition):
-                raise InvalidConditionSet(
-                    f"Invalid Condition: {repr(condition)} from set {conditions}"
-                )
-            try:
-                matched = condition.apply(context)
-            except InvalidCondition as e:
-                invalid_conditions.append(e)
-                continue
-            if matched:
-                matched_count += 1
-                if condition.required:
-                    required_count += 1
-
-                matched_conditions.extend(matched)
-            elif condition.required:
-                invalid_conditions.append(
-                    ConditionRequired(condition=condition, context=context)
-                )
+        return apply_conditions(list(self.conditions), context, scan=scan)
 
-        did_match_all = matched_count >= total_conditions
-        did_match_any = matched_count > 0
-        if did_match_all:
-            return matched_conditions, invalid_conditions
-        elif did_match_any:
-            return matched_conditions, invalid_conditions
-        else:
-            return [], invalid_conditions
+    def explain(self, context: AnalysisContext) -> list:
+        """:returns: a :py:class:`~drone_ci_butler.rule_engine.trace.ConditionTrace`
+          with the status of each condition"""
+        from .trace import explain_conditions
+
+        return explain_conditions(list(self.conditions), context)
 
     def extend(self: Type[T], conditions: Condition.List) -> T:
         for c in conditions:
@@ -446,6 +696,54 @@ class ConditionSet(Model):
         return self
 
 
+def apply_conditions(
+    conditions: List[Condition],
+    context: AnalysisContext,
+    scan=None,
+) -> Tuple[MatchedCondition.List, List[InvalidCondition]]:
+    matched_conditions = MatchedCondition.List([])
+    invalid_conditions = []
+    matched_count = 0
+    required_count = 0
+    total_conditions = len(conditions)
+    total_required = len(
+        [c for c in conditions if getattr(c, "required", False)]
+    )
+    for condition in conditions:
+        if not isinstance(condition, Condition):
+            raise InvalidConditionSet(
+                f"Invalid Condition: {repr(condition)} from set {conditions}"
+            )
+        # unlike Condition.apply, a required condition that does not
+        # match is reported without raising ConditionRequired
+        try:
+            found = condition.find_matches(context, scan=scan)
+        except InvalidCondition as e:
+            invalid_conditions.append(e)
+            continue
+
+        matched = found[-1] and condition.to_matched_conditions(context, *found)
+        if matched:
+            matched_count += 1
+            if condition.required:
+                required_count += 1
+
+            matched_conditions.extend(matched)
+        elif condition.required:
+            invalid_conditions.append(
+                ConditionRequired(condition=condition, context=context)
+            )
+
+    did_match_all = matched_count >= total_conditions
+    did_match_any = matched_count > 0
+    if did_match_all:
+        return matched_conditions, invalid_conditions
+    elif did_match_any:
+        return matched_conditions, invalid_conditions
+    else:
+        return [], invalid_conditions
+
+
 class Rule(Model):
     __id_attributes__ = ["name", "action"]
     name: str
@@ -455,6 +753,24 @@ class Rule(Model):
 
     conditions: ConditionSet
 
+    @classmethod
+    def from_config(cls: Type[T], config: dict) -> T:
+        name = isinstance(config, dict) and config.get("name")
+        if not name:
+            raise InvalidRuleSet(f"rule without a name: {config!r}")
+
+        conditions = config.get("when") or config.get("conditions") or []
+        params = {
+            "name": name,
+            "conditions": ConditionSet([Condition.from_config(c) for c in conditions]),
+        }
+        if config.get("action"):
+            params["action"] = rule_action_from_config(config["action"], name)
+        if config.get("notify"):
+            params["notify"] = ValueList(config["notify"])
+
+        return cls(**params)
+
     def with_preconditions(self: Type[T], pre_conditions: Condition.List) -> T:
         pre_conditions = ConditionSet(pre_conditions or [])
         pre_conditions.extend(self.conditions or [])
@@ -468,9 +784,11 @@ class Rule(Model):
         return self
 
     def apply(
-        self, context: AnalysisContext
+        self, context: AnalysisContext, scan=None
     ) -> Tuple[MatchedCondition.List, List[InvalidCondition]]:
-        matched_conditions, invalid_conditions = self.conditions.apply(context)
+        matched_conditions, invalid_conditions = self.conditions.apply(
+            context, scan=scan
+        )
         failed_required_conditions = [
             c for c in invalid_conditions if isinstance(c, ConditionRequired)
         ]
@@ -500,19 +818,32 @@ class MatchedRule(Model):
         return f"<MatchedRule {repr(self.rule.name)}>"
 
     def to_description(self, indent=2):
-        padding = " " * indent
-        message = [f"Matched Rule **{self.rule.name}**:"]
-        for condition in self.matched_conditions or []:
-            description = condition.to_description()
-            message.append(f"{padding}{description}")
+        return describe_matched_rule(
+            self.rule,
+            [c.to_description() for c in self.matched_conditions or []],
+            self.invalid_conditions,
+            indent=indent,
+        )
+
 
-        if self.invalid_conditions or []:
-            message.append(f"{padding}**Invalid Conditions**:")
+def describe_matched_rule(
+    rule: Rule,
+    descriptions: List[str],
+    invalid_conditions: Optional[List[InvalidCondition]],
+    indent=2,
+) -> str:
+    padding = " " * indent
+    message = [f"Matched Rule **{rule.name}**:"]
+    for description in descriptions:
+        message.append(f"{padding}{description}")
 
-        for condition in self.invalid_conditions or []:
-            message.append(f"{padding * 2}{condition}")
+    if invalid_conditions or []:
+        message.append(f"{padding}**Invalid Conditions**:")
 
-        return "\n".join(message)
+    for condition in invalid_conditions or []:
+        message.append(f"{padding * 2}{condition}")
+
+    return "\n".join(message)
 
 
 class RuleSet(Model):
@@ -524,100 +855,118 @@ class RuleSet(Model):
     default_notify: StringOrListOfStrings
     rules: Rule.List
 
-    # @classmethod
-    # def from_config(cls: Type[T], config: Config) -> T:
-    #     data = config.load_drone_output_rules()
-    #     return cls(**data)
-
-    def __str__(self):
-        return f"<RuleSet {self.name}>"
+    @classmethod
+    def from_config(cls: Type[T], name: str, config: dict) -> T:
+        """builds a ruleset from its YAML declaration, e.g.: an item of
+        the ``rulesets`` mapping in ``~/.drone-ci-butler.yml``
+
+        :raises InvalidRuleSet: when the declaration is malformed
+        :raises InvalidCondition: when a condition is invalid
+        """
+        if not isinstance(config, dict):
+            raise InvalidRuleSet(f"ruleset {name!r} should be a mapping: {config!r}")
+
+        config = {key.replace("-", "_"): value for key, value in config.items()}
+        params = {"name": name}
+        for key in ("required_conditions", "default_conditions"):
+            if config.get(key):
+                params[key] = ConditionSet(
+                    [Condition.from_config(c) for c in config[key]]
+                )
 
-    def apply(self, context: AnalysisContext) -> MatchedRule.List:
-        required_conditions = self.required_conditions or []
-        if required_conditions:
-            required_matches, invalid_conditions = required_conditions.apply(context)
-        else:
-            required_matches = invalid_conditions = []
-        invalid_matches = [
-            c.condition
-            for c in filter(
-                lambda x: isinstance(x, ConditionRequired), invalid_conditions
+        if config.get("default_action"):
+            params["default_action"] = rule_action_from_config(
+                config["default_action"], name
             )
-        ]
+        if config.get("default_notify"):
+            params["default_notify"] = list_of_strings(config["default_notify"])
 
-        matched_rules = MatchedRule.List([])
+        rules = config.get("rules") or []
+        if not isinstance(rules, list):
+            raise InvalidRuleSet(f"the rules of the ruleset {name!r} should be a list")
 
-        if required_matches or required_conditions:
-            if self.default_action is None or self.default_action in (
-                RuleAction.OMIT_FAILED,
-                RuleAction.NEXT_RULE,
-            ):
-                pass
-            elif self.default_action == RuleAction.SKIP_ANALYSIS:
-                return []
-            elif self.default_action == RuleAction.ABRUPT_INTERRUPTION:
-                matched_rules.append(
-                    MatchedRule(
-                        rule=Rule(
-                            name=f"{self.name}.required_conditions",
-                            conditions=required_conditions,
-                            action=self.default_action,
-                        ),
-                        matched_conditions=required_matches,
-                        invalid_conditions=invalid_conditions,
-                        context=context,
-                    )
-                )
-                return matched_rules
-            elif self.default_action == RuleAction.REQUEST_CANCELATION:
-                invalid_conditions.append(CancelationRequested(context))
-                matched_rules.append(
-                    MatchedRule(
-                        rule=Rule(
-                            name=f"{self.name}.required_conditions",
-                            conditions=required_conditions,
-                            action=self.default_action,
-                        ),
-                        matched_conditions=required_matches,
-                        invalid_conditions=invalid_conditions,
-                        context=context,
-                    )
-                )
+        params["rules"] = [Rule.from_config(rule) for rule in rules]
+        return cls(**params)
 
-            else:
-                raise RuntimeError(f"unhandled action {self.default_action}")
+    def __str__(self):
+        return f"<RuleSet {self.name}>"
+
+    @property
+    def version(self) -> str:
+        """identifies the rules that produced a match: the content hash
+        of the artifact the ruleset was loaded from or, for rulesets
+        declared in python, the version of drone-ci-butler"""
+        return self.__dict__.get("_version") or f"{self.name}@{package_version}"
+
+    def with_version(self: Type[T], version: str) -> T:
+        self.__dict__["_version"] = version
+        return self
 
-        elif required_matches:
-            # just proceed to apply rules
-            pass
+    def iter_conditions(self) -> Iterator[Condition]:
+        for conditions in (self.required_conditions, self.default_conditions):
+            yield from conditions or []
 
         for rule in self.rules or []:
-            rule = (
-                rule.with_preconditions(pre_conditions=required_conditions)
-                .with_preconditions(
-                    pre_conditions=self.default_conditions,
-                )
-                .with_default_action(self.default_action)
-            )
+            yield from rule.conditions or []
 
-            matched_conditions, invalid_conditions = rule.apply(context)
-            if matched_conditions or invalid_conditions:
-                if rule.action is None or rule.action != RuleAction.OMIT_FAILED:
-                    matched_rules.append(
-                        MatchedRule(
-                            matched_conditions=matched_conditions,
-                            invalid_conditions=invalid_conditions,
-                            context=context,
-                            rule=rule,
-                        )
-                    )
-                elif rule.action == RuleAction.NEXT_RULE:
-                    continue
-                elif rule.action == RuleAction.SKIP_ANALYSIS:
-                    return []
-                elif rule.action == RuleAction.ABRUPT_INTERRUPTION:
-                    break
-                else:
-                    logger.error(f"rule {rule} has invalid action: {rule.action}")
-
-        return matched_rules
+    @property
+    def scan_plan(self):
+        """a :py:class:`~drone_ci_butler.rule_engine.scanner.ScanPlan`
+        covering every condition of this ruleset"""
+        return self.compile().scan_plan
+
+    def compile(self):
+        """returns a :py:class:`~drone_ci_butler.rule_engine.compiler.CompiledRuleSet`
+        with the effective conditions of every rule, built once and
+        rebuilt only after the rules or conditions of this ruleset are
+        replaced."""
+        from .compiler import CompiledRuleSet, ruleset_signature
+
+        compiled = self.__dict__.get("_compiled")
+        if compiled is None or compiled.signature != ruleset_signature(self):
+            compiled = self._compiled = CompiledRuleSet(self)
+            compiled.profiler = self.__dict__.get("_profiler")
+        return compiled
+
+    def enable_profiling(self, profiler=None):
+        """records evaluation counters of this ruleset, its rules and
+        conditions into a :py:class:`~drone_ci_butler.rule_engine.profiling.Profiler`
+
+        :returns: the profiler
+        """
+        from .profiling import Profiler
+
+        self._profiler = profiler or Profiler()
+        self.compile().profiler = self._profiler
+        return self._profiler
+
+    def disable_profiling(self):
+        self._profiler = None
+        self.compile().profiler = None
+
+    def apply(self, context: AnalysisContext) -> list:
+        """:returns: a :py:class:`~drone_ci_butler.rule_engine.results.RuleMatch`
+          for each rule reported for the context"""
+        return self.compile().apply(context)
+
+    def explain(self, context: AnalysisContext):
+        """applies this ruleset to the context like :py:meth:`apply`,
+        recording why each rule was reported or not.
+
+        :returns: a :py:class:`~drone_ci_butler.rule_engine.trace.Trace`
+        """
+        return self.compile().explain(context)
+
+    def apply_many(self, items: Iterable[Union[AnalysisContext, Build]]):
+        """applies this ruleset to many contexts, or to every step of
+        the given builds, in a single call.
+
+        :returns: a :py:class:`~drone_ci_butler.rule_engine.batch.MatchColumns`
+        """
+        return self.compile().apply_many(items)
+
+    def iter_contexts(self, build: Build) -> Iterator[AnalysisContext]:
+        return self.compile().iter_contexts(build)
+
+    def stream(self, build: Build, stage: Stage, step: Step, window: int = 200):
+        return self.compile().stream(build, stage, step, window=window)
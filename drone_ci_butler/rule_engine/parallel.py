@@ -0,0 +1,221 @@
+"""Evaluation of a ruleset across the steps of a build in a pool of
+processes.
+
+:py:class:`~uiclasses.Model` instances cannot be pickled, so each
+child process imports the ruleset from its import path (e.g.:
+``drone_ci_butler.rule_engine.default_rules:wf_project_vi``) and
+compiles it once when it starts. The parent only ships the plain
+fields of each :py:class:`~drone_ci_butler.drone_api.models.AnalysisContext`
+and receives, for each matched rule, the slots, match types and regex
+match spans of its matched conditions, from which the
+:py:class:`~drone_ci_butler.rule_engine.results.RuleMatch` instances
+are rebuilt against the original contexts, in their original order.
+
+The pool uses the ``spawn`` start method so that children do not
+inherit the gevent hub of the ``workers`` process.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from drone_ci_butler.drone_api.models import AnalysisContext, Build, Stage, Step
+from drone_ci_butler.rule_engine import exceptions
+from drone_ci_butler.rule_engine.compiler import REQUIRED_RULE, CompiledRuleSet
+from drone_ci_butler.rule_engine.models import (
+    ConditionMatchType,
+    ConditionMatchTypes,
+    RuleSet,
+)
+from drone_ci_butler.rule_engine.result_cache import regex_match_from_entry
+from drone_ci_butler.rule_engine.results import RuleMatch, condition_matches
+
+
+DEFAULT_RULESET_PATH = "drone_ci_butler.rule_engine.default_rules:wf_project_vi"
+
+# (rule index, [(slot, [match type], regex match)], [(exception name, message)])
+MatchPayload = Tuple[
+    int, List[Tuple[int, List[str], Optional[list]]], List[Tuple[str, str]]
+]
+
+compiled_in_process: Optional[CompiledRuleSet] = None
+
+
+def load_ruleset(path: str) -> RuleSet:
+    """imports a ruleset from a ``module.name:attribute`` path or loads
+    it from a compiled artifact with a ``/path/to/artifact.pickle#name``
+    path (see :py:mod:`~drone_ci_butler.rule_engine.artifact`)"""
+    if "#" in path:
+        from .artifact import load_artifact
+
+        artifact, _, name = path.rpartition("#")
+        return load_artifact(artifact)[name]
+
+    module_name, _, attribute = path.partition(":")
+    if not attribute:
+        raise ValueError(f"invalid ruleset path {path!r}, expected module:attribute")
+
+    return getattr(import_module(module_name), attribute)
+
+
+def initialize_process(path: str):
+    global compiled_in_process
+    compiled_in_process = load_ruleset(path).compile()
+
+
+def context_to_payload(context: AnalysisContext) -> dict:
+    return {
+        name: element.to_dict()
+        for name, element in (
+            ("build", context.build),
+            ("stage", context.stage),
+            ("step", context.step),
+        )
+        if element is not None
+    }
+
+
+def context_from_payload(payload: dict) -> AnalysisContext:
+    elements = {"build": Build, "stage": Stage, "step": Step}
+    return AnalysisContext(
+        **{name: elements[name](data) for name, data in payload.items()}
+    )
+
+
+def rule_indexes(compiled: CompiledRuleSet) -> Dict[str, int]:
+    indexes = {rule.name: index for index, rule in enumerate(compiled.rules)}
+    if compiled.required_rule is not None:
+        indexes[compiled.required_rule.name] = REQUIRED_RULE
+    return indexes
+
+
+def evaluate_payload(payload: dict) -> List[MatchPayload]:
+    """runs in the child processes"""
+    compiled = compiled_in_process
+    evaluation = compiled.evaluate(context_from_payload(payload))
+    indexes = rule_indexes(compiled)
+    result = []
+    for matched in compiled.apply_evaluation(evaluation):
+        index = indexes[matched.rule.name]
+        conditions = []
+        if matched.matched_conditions:
+            for slot in compiled.slots_at(index):
+                outcome = evaluation.outcomes[slot]
+                if outcome and outcome.error is None and outcome.found[-1]:
+                    match_types = outcome.found[-1]
+                    regex_match = getattr(match_types, "regex_match", None)
+                    conditions.append(
+                        (
+                            slot,
+                            [t.value for t in match_types],
+                            regex_match and list(regex_match),
+                        )
+                    )
+
+        invalid = [
+            (e.__class__.__name__, str(e)) for e in matched.invalid_conditions or []
+        ]
+        result.append((index, conditions, invalid))
+
+    return result
+
+
+def rebuild_exception(name: str, message: str, context: AnalysisContext):
+    cls = getattr(exceptions, name, exceptions.InvalidCondition)
+    error = cls.__new__(cls)
+    Exception.__init__(error, message)
+    error.message = message
+    error.condition = None
+    error.context = context
+    return error
+
+
+class ParallelRuleSet(object):
+    """applies a ruleset to many contexts in a
+    :py:class:`~concurrent.futures.ProcessPoolExecutor`"""
+
+    shared: Dict[int, "ParallelRuleSet"] = {}
+
+    def __init__(self, path: str = DEFAULT_RULESET_PATH, processes: int = None):
+        self.path = path
+        self.compiled = load_ruleset(path).compile()
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes or None,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initialize_process,
+            initargs=(path,),
+        )
+
+    def __repr__(self):
+        return f"<ParallelRuleSet {self.path}>"
+
+    @classmethod
+    def get_shared(cls, path: str = DEFAULT_RULESET_PATH, processes: int = None):
+        """returns one pool per amount of processes so that every
+        worker greenlet of a process shares it, the pool is replaced
+        when the ruleset path changes (e.g.: a new artifact)"""
+        key = processes or 0
+        pool = cls.shared.get(key)
+        if pool is not None and pool.path != path:
+            pool.shutdown(wait=False)
+            pool = None
+
+        if pool is None:
+            pool = cls.shared[key] = cls(path, processes)
+        return pool
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+        for key, pool in list(self.shared.items()):
+            if pool is self:
+                self.shared.pop(key)
+
+    def rebuild(
+        self, context: AnalysisContext, payload: List[MatchPayload]
+    ) -> List[RuleMatch]:
+        compiled = self.compiled
+        matched_rules = []
+        for index, conditions, invalid in payload:
+            matched_conditions = []
+            for slot, match_types, regex_match in conditions:
+                condition = compiled.conditions[slot]
+                element, _, attribute, location, value = condition.process_context(
+                    context
+                )
+                match_types = ConditionMatchTypes(
+                    ConditionMatchType(t) for t in match_types
+                )
+                if regex_match:
+                    match_types.regex_match = regex_match_from_entry(regex_match)
+                found = (element, attribute, location, value, match_types)
+                matched_conditions.extend(
+                    condition_matches(condition, slot, context, found)
+                )
+
+            matched_rules.append(
+                RuleMatch(
+                    rule=compiled.rule_at(index),
+                    index=index,
+                    context=context,
+                    matched_conditions=matched_conditions,
+                    invalid_conditions=[
+                        rebuild_exception(name, message, context)
+                        for name, message in invalid
+                    ],
+                )
+            )
+
+        return matched_rules
+
+    def apply_many(
+        self, contexts: Iterable[AnalysisContext]
+    ) -> List[List[RuleMatch]]:
+        """returns the matches of each context in the same order"""
+        contexts = list(contexts)
+        payloads = self.executor.map(
+            evaluate_payload, [context_to_payload(c) for c in contexts]
+        )
+        return [
+            self.rebuild(context, payload)
+            for context, payload in zip(contexts, payloads)
+        ]
@@ -0,0 +1,136 @@
+"""Optional instrumentation of the rule engine.
+
+A :py:class:`Profiler` attached to a ruleset with
+:py:meth:`RuleSet.enable_profiling` counts how many times each
+ruleset, rule and condition is evaluated, how long they take, how many
+bytes of the context they had to look at and how often they match::
+
+   profiler = wf_project_vi.enable_profiling()
+   for context in contexts:
+       wf_project_vi.apply(context)
+
+   profiler.to_dict()["conditions"]
+
+The time of a condition whose attribute is scanned through the
+:py:class:`~drone_ci_butler.rule_engine.scanner.ScanPlan` includes the
+scan when it is the first condition to look at that attribute.
+"""
+import math
+import time
+from collections import deque
+from typing import Any, Dict, List
+
+
+MAX_SAMPLES = 10000
+SORT_KEYS = ("total_seconds", "p99_seconds", "count", "bytes_scanned", "hit_rate")
+
+
+def size_of(value: Any) -> int:
+    """the amount of bytes of text a matcher had to look at"""
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, list):
+        return sum(size_of(item) for item in value)
+
+    return len(str(value))
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    if not samples:
+        return 0.0
+
+    ordered = sorted(samples)
+    index = max(int(math.ceil(len(ordered) * percent / 100.0)) - 1, 0)
+    return ordered[index]
+
+
+class Counter(object):
+    """evaluation statistics of a single ruleset, rule or condition"""
+
+    def __init__(self, name: str, max_samples: int = MAX_SAMPLES):
+        self.name = name
+        self.count = 0
+        self.hits = 0
+        self.total_seconds = 0.0
+        self.bytes_scanned = 0
+        self.samples = deque(maxlen=max_samples)
+
+    def __repr__(self):
+        return f"<Counter {self.name!r} count={self.count}>"
+
+    def record(self, seconds: float, hit: bool, bytes_scanned: int = 0):
+        self.count += 1
+        self.hits += int(bool(hit))
+        self.total_seconds += seconds
+        self.bytes_scanned += bytes_scanned
+        self.samples.append(seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "count": self.count,
+            "hits": self.hits,
+            "hit_rate": self.count and self.hits / self.count or 0.0,
+            "total_seconds": self.total_seconds,
+            "p99_seconds": percentile(list(self.samples), 99),
+            "bytes_scanned": self.bytes_scanned,
+        }
+
+
+class Profiler(object):
+    def __init__(self, max_samples: int = MAX_SAMPLES):
+        self.max_samples = max_samples
+        self.rulesets: Dict[str, Counter] = {}
+        self.rules: Dict[str, Counter] = {}
+        self.conditions: Dict[str, Counter] = {}
+
+    def __repr__(self):
+        return f"<Profiler rules={len(self.rules)} conditions={len(self.conditions)}>"
+
+    def counter(self, group: Dict[str, Counter], name: str) -> Counter:
+        counter = group.get(name)
+        if counter is None:
+            counter = group[name] = Counter(name, self.max_samples)
+        return counter
+
+    def reset(self):
+        self.rulesets.clear()
+        self.rules.clear()
+        self.conditions.clear()
+
+    def to_dict(self, sort_by: str = "total_seconds") -> dict:
+        """returns the statistics of each group sorted in descending
+        order of ``sort_by``"""
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"cannot sort by {sort_by!r}, options: {SORT_KEYS}")
+
+        def sorted_counters(group: Dict[str, Counter]) -> List[dict]:
+            stats = [counter.to_dict() for counter in group.values()]
+            return sorted(stats, key=lambda s: s[sort_by], reverse=True)
+
+        return {
+            "rulesets": sorted_counters(self.rulesets),
+            "rules": sorted_counters(self.rules),
+            "conditions": sorted_counters(self.conditions),
+        }
+
+    def to_table(self, sort_by: str = "total_seconds") -> str:
+        lines = []
+        header = f"{'count':>8} {'hit rate':>8} {'total':>10} {'p99':>10} {'scanned':>12}  name"
+        for group, stats in self.to_dict(sort_by=sort_by).items():
+            lines.append(f"{group}:")
+            lines.append(header)
+            for s in stats:
+                lines.append(
+                    f"{s['count']:>8} {s['hit_rate']:>8.1%} "
+                    f"{s['total_seconds'] * 1e3:>8.1f}ms {s['p99_seconds'] * 1e6:>8.1f}µs "
+                    f"{s['bytes_scanned']:>12}  {s['name']}"
+                )
+            lines.append("")
+
+        return "\n".join(lines)
+
+
+clock = time.perf_counter
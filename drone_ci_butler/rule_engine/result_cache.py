@@ -0,0 +1,266 @@
+"""Content-addressed cache of the matches of a ruleset.
+
+Re-runs, restarted builds and the same failure across many pull
+requests produce steps whose targeted attributes are identical. The
+key of a context is the sha256 of the version and conditions of the
+ruleset along with the value of every attribute targeted by its
+conditions (e.g.: ``step.output.lines``, ``build.link``), so a hit is
+guaranteed to produce the same matches.
+
+Entries hold the index of each reported rule and, for each of its
+matched conditions, the slot, match type and regex match. The
+:py:class:`~drone_ci_butler.rule_engine.results.RuleMatch` instances
+are rebuilt against the context of the lookup. Results with invalid
+conditions are never cached because their messages mention the
+context they were raised for.
+
+:py:class:`RuleResultCache` keeps the most recent entries in process
+and, when given a :py:class:`redis.Redis` client, shares them across
+workers as JSON.
+"""
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from drone_ci_butler.drone_api.models import AnalysisContext
+from drone_ci_butler.rule_engine.attributes import AttributeCache, target_key
+from drone_ci_butler.rule_engine.models import ConditionMatchType, RegexMatch, RuleSet
+from drone_ci_butler.rule_engine.results import ConditionMatch, RuleMatch
+
+
+logger = logging.getLogger(__name__)
+
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+def ruleset_fingerprint(compiled) -> str:
+    """identifies the conditions and rules of a compiled ruleset"""
+    fingerprint = compiled.__dict__.get("_fingerprint")
+    if fingerprint is None:
+        parts = [compiled.name, str(compiled.default_action)]
+        parts.extend(compiled.condition_names)
+        parts.extend(f"{rule.name}:{rule.action}:{rule.slots}" for rule in compiled.rules)
+        fingerprint = compiled._fingerprint = hashlib.sha256(
+            "\0".join(parts).encode("utf-8")
+        ).hexdigest()
+    return fingerprint
+
+
+def value_to_text(value: Any) -> Optional[str]:
+    """an unambiguous text for the values that conditions compare,
+    None for values that cannot be told apart by their text (e.g.: models)"""
+    if isinstance(value, SCALAR_TYPES):
+        return f"{type(value).__name__}:{value}"
+
+    if isinstance(value, list):
+        items = []
+        for item in value:
+            item = getattr(item, "out", item)
+            if not isinstance(item, SCALAR_TYPES):
+                return None
+            items.append(str(item or ""))
+        return f"list:{len(items)}:" + "\0".join(items)
+
+    return None
+
+
+def context_digest(
+    compiled, version: str, context: AnalysisContext, attributes=None
+) -> Optional[str]:
+    """returns the cache key of a context or None when one of the
+    attributes targeted by the ruleset cannot be resolved or hashed"""
+    attributes = attributes or AttributeCache(context)
+    digest = hashlib.sha256(version.encode("utf-8"))
+    digest.update(ruleset_fingerprint(compiled).encode("ascii"))
+
+    targets = {}
+    for condition in compiled.conditions:
+        targets.setdefault(target_key(condition), condition)
+
+    for key, condition in sorted(targets.items()):
+        try:
+            value = attributes.resolve(condition)[-1]
+        except Exception:
+            return None
+
+        text = value_to_text(value)
+        if text is None:
+            return None
+
+        digest.update(f"\0{key}\0".encode("utf-8"))
+        digest.update(text.encode("utf-8", "surrogatepass"))
+
+    return digest.hexdigest()
+
+
+def matches_to_entry(matches: List[RuleMatch]) -> Optional[list]:
+    entry = []
+    for matched in matches:
+        if matched.invalid_conditions:
+            return None
+
+        entry.append(
+            [
+                matched.index,
+                [
+                    [
+                        c.slot,
+                        c.match_type.value,
+                        c.regex_match and list(c.regex_match),
+                    ]
+                    for c in matched.matched_conditions
+                ],
+            ]
+        )
+    return entry
+
+
+def regex_match_from_entry(data: list) -> RegexMatch:
+    start, end, groups, named = data
+    return RegexMatch(start, end, tuple(groups), named)
+
+
+def matches_from_entry(
+    compiled, context: AnalysisContext, entry: list, attributes=None
+) -> List[RuleMatch]:
+    attributes = attributes or AttributeCache(context)
+    matched_rules = []
+    for index, conditions in entry:
+        matched_conditions = []
+        for slot, match_type, regex_match in conditions:
+            condition = compiled.conditions[slot]
+            element, _, attribute, location, value = attributes.resolve(condition)
+            matched_conditions.append(
+                ConditionMatch(
+                    condition,
+                    slot,
+                    context,
+                    element,
+                    attribute,
+                    location,
+                    value,
+                    ConditionMatchType(match_type),
+                    regex_match and regex_match_from_entry(regex_match),
+                )
+            )
+
+        matched_rules.append(
+            RuleMatch(
+                rule=compiled.rule_at(index),
+                index=index,
+                context=context,
+                matched_conditions=matched_conditions,
+                invalid_conditions=[],
+            )
+        )
+
+    return matched_rules
+
+
+class RuleResultCache(object):
+    """an LRU of cache entries in front of an optional redis tier"""
+
+    prefix = "drone-ci-butler:rule-results:"
+    shared: Optional["RuleResultCache"] = None
+
+    def __init__(self, size: int = 1024, redis=None, ttl: int = 0):
+        self.size = size
+        self.redis = redis
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, list]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f"<RuleResultCache entries={len(self.entries)} hits={self.hits} misses={self.misses}>"
+
+    @classmethod
+    def get_shared(cls, config) -> "RuleResultCache":
+        """one cache per process, shared by every worker greenlet"""
+        if cls.shared is None:
+            redis = None
+            if config.rule_engine_result_cache_redis_ttl > 0:
+                from drone_ci_butler.networking import connect_to_redis, get_redis_pool
+
+                redis = connect_to_redis(get_redis_pool())
+
+            cls.shared = cls(
+                size=config.rule_engine_result_cache_size,
+                redis=redis,
+                ttl=config.rule_engine_result_cache_redis_ttl,
+            )
+        return cls.shared
+
+    def get(self, key: str) -> Optional[list]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+
+        if self.redis is None:
+            return None
+
+        try:
+            data = self.redis.get(self.prefix + key)
+        except Exception as e:
+            logger.warning(f"failed to read rule results from redis: {e}")
+            return None
+
+        if data is None:
+            return None
+
+        entry = json.loads(data)
+        self.remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: list):
+        self.remember(key, entry)
+        if self.redis is None:
+            return
+
+        try:
+            self.redis.set(self.prefix + key, json.dumps(entry), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"failed to store rule results in redis: {e}")
+
+    def remember(self, key: str, entry: list):
+        if self.size <= 0:
+            return
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def lookup(
+        self, ruleset: RuleSet, context: AnalysisContext, attributes=None
+    ) -> Tuple[Optional[str], Optional[List[RuleMatch]]]:
+        """:returns: the key of the context and its cached matches,
+        which are None on a miss"""
+        compiled = ruleset.compile()
+        attributes = attributes or AttributeCache(context)
+        key = context_digest(compiled, ruleset.version, context, attributes)
+        entry = key and self.get(key)
+        if entry is None:
+            self.misses += 1
+            return key, None
+
+        self.hits += 1
+        return key, matches_from_entry(compiled, context, entry, attributes)
+
+    def store(self, key: Optional[str], matches: List[RuleMatch]):
+        entry = key and matches_to_entry(matches)
+        if entry is not None:
+            self.put(key, entry)
+
+    def apply(self, ruleset: RuleSet, context: AnalysisContext) -> List[RuleMatch]:
+        """the equivalent of :py:meth:`RuleSet.apply` that skips the
+        evaluation of contexts whose targeted attributes were seen before"""
+        compiled = ruleset.compile()
+        evaluation = compiled.evaluate(context)
+        key, matches = self.lookup(ruleset, context, evaluation.scan.attributes)
+        if matches is None:
+            matches = compiled.apply_evaluation(evaluation)
+            self.store(key, matches)
+        return matches
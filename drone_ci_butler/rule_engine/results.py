@@ -0,0 +1,188 @@
+"""Compact matches returned by :py:meth:`RuleSet.apply
+<drone_ci_butler.rule_engine.models.RuleSet.apply>`.
+
+Building a :py:class:`~drone_ci_butler.rule_engine.models.MatchedCondition`
+or a :py:class:`~drone_ci_butler.rule_engine.models.MatchedRule` deep
+copies its :py:class:`~drone_ci_butler.drone_api.models.AnalysisContext`,
+including the output of the step, once per match type. The classes of
+this module only keep references to the objects the rule engine
+already holds along with the ids of the rule and condition, and
+describe themselves exactly like their models. :py:meth:`to_model`
+builds the model form when it is really needed, e.g.: to serialize it.
+"""
+from typing import Any, List, Optional
+
+from drone_ci_butler.drone_api.models import AnalysisContext, OutputLine, OutputLines
+from drone_ci_butler.rule_engine.models import (
+    Condition,
+    ConditionMatchType,
+    MatchedCondition,
+    MatchedRule,
+    RegexMatch,
+    Rule,
+    describe_matched_condition,
+    describe_matched_rule,
+)
+
+
+def serialized(value: Any) -> Any:
+    """the value as described by a :py:class:`MatchedCondition` that
+    was copied into a :py:class:`MatchedRule`, which serializes it"""
+    if value and callable(getattr(value, "to_dict", None)):
+        return value.to_dict()
+    return value
+
+
+class ConditionMatch(object):
+    __slots__ = (
+        "condition",
+        "slot",
+        "context",
+        "element",
+        "attribute",
+        "location",
+        "value",
+        "match_type",
+        "regex_match",
+    )
+
+    def __init__(
+        self,
+        condition: Condition,
+        slot: Optional[int],
+        context: AnalysisContext,
+        element: Any,
+        attribute: str,
+        location: str,
+        value: Any,
+        match_type: ConditionMatchType,
+        regex_match: Optional[RegexMatch] = None,
+    ):
+        self.condition = condition
+        self.slot = slot
+        self.context = context
+        self.element = element
+        self.attribute = attribute
+        self.location = location
+        self.value = value
+        self.match_type = match_type
+        self.regex_match = regex_match
+
+    def __repr__(self):
+        return f"<ConditionMatch {self.location} {self.match_type.name}>"
+
+    @property
+    def step_key(self) -> Optional[tuple]:
+        """the ``__id_attributes__`` of the step that was analyzed"""
+        step = self.context.step
+        if step is None:
+            return None
+        return tuple(step.__data__.get(name) for name in step.__id_attributes__)
+
+    @property
+    def line_index(self) -> Optional[int]:
+        """the index of the output line where the regex matched"""
+        if self.regex_match is None or not isinstance(self.value, OutputLines):
+            return None
+        return self.value.index_at(self.regex_match.start)
+
+    @property
+    def line(self) -> Optional[OutputLine]:
+        index = self.line_index
+        return None if index is None else self.value[index]
+
+    @property
+    def line_number(self) -> Optional[int]:
+        """the ``pos`` of the output line where the regex matched"""
+        line = self.line
+        return line and line.pos
+
+    def context_window(self, before: int = 3, after: int = 3) -> Optional[OutputLines]:
+        """the output lines around the line where the regex matched,
+        e.g.: ``match.context_window().to_markdown()``"""
+        index = self.line_index
+        if index is None:
+            return None
+        return self.value.around(index, before=before, after=after)
+
+    def to_description(self, serialize: bool = False) -> str:
+        value = serialized(self.value) if serialize else self.value
+        return describe_matched_condition(self.condition, self.attribute, value)
+
+    def to_model(self) -> MatchedCondition:
+        params = {}
+        if self.regex_match is not None:
+            params["matched_regex_groups"] = list(self.regex_match.groups)
+        return MatchedCondition(
+            condition=self.condition,
+            context=self.context,
+            element=self.element,
+            attribute=self.attribute,
+            location=self.location,
+            match_type=self.match_type,
+            value=self.value,
+            **params,
+        )
+
+
+def condition_matches(
+    condition: Condition,
+    slot: Optional[int],
+    context: AnalysisContext,
+    found: tuple,
+) -> List[ConditionMatch]:
+    """the equivalent of :py:meth:`Condition.to_matched_conditions` for
+    the tuple returned by :py:meth:`Condition.find_matches`"""
+    element, attribute, location, value, match_types = found
+    regex_match = getattr(match_types, "regex_match", None)
+    return [
+        ConditionMatch(
+            condition,
+            slot,
+            context,
+            element,
+            attribute,
+            location,
+            value,
+            match_type,
+            regex_match if match_type == ConditionMatchType.MATCHES_REGEX else None,
+        )
+        for match_type in match_types
+    ]
+
+
+class RuleMatch(object):
+    __slots__ = ("rule", "index", "context", "matched_conditions", "invalid_conditions")
+
+    def __init__(
+        self,
+        rule: Rule,
+        index: int,
+        context: AnalysisContext,
+        matched_conditions: List[ConditionMatch],
+        invalid_conditions: List[Exception],
+    ):
+        self.rule = rule
+        self.index = index
+        self.context = context
+        self.matched_conditions = matched_conditions
+        self.invalid_conditions = invalid_conditions
+
+    def __repr__(self):
+        return f"<RuleMatch {repr(self.rule.name)}>"
+
+    def to_description(self, indent=2) -> str:
+        return describe_matched_rule(
+            self.rule,
+            [c.to_description(serialize=True) for c in self.matched_conditions],
+            self.invalid_conditions,
+            indent=indent,
+        )
+
+    def to_model(self) -> MatchedRule:
+        return MatchedRule(
+            rule=self.rule,
+            matched_conditions=[m.to_model() for m in self.matched_conditions],
+            invalid_conditions=self.invalid_conditions,
+            context=self.context,
+        )
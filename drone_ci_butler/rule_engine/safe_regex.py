@@ -0,0 +1,190 @@
+"""Guarded execution of the user-supplied regular expressions of
+:py:class:`~drone_ci_butler.rule_engine.models.Condition`.
+
+Rules search their patterns with ``re.DOTALL | re.MULTILINE`` over
+entire step logs, where a single catastrophically backtracking pattern
+such as ``(a+)+$`` can stall a worker for minutes. A
+:py:class:`GuardedRegex`:
+
+- uses the linear-time `re2 <https://github.com/google/re2>`_ engine
+  when a binding is installed (``pip install google-re2``) and the
+  pattern is supported by it, falling back to :py:mod:`re` otherwise.
+- detects nested unbounded quantifiers when the condition is loaded,
+  those patterns are kept out of the combined
+  :py:class:`~drone_ci_butler.rule_engine.scanner.ScanPlan`.
+- gives each search a time budget. In the main thread of a process
+  the search is interrupted with ``SIGALRM`` as soon as the budget is
+  exhausted, elsewhere the budget is checked once the search returns.
+"""
+import re
+import signal
+import threading
+from re import Pattern
+from typing import Any, List, Optional
+
+try:  # pragma: no cover
+    import re2
+except ImportError:  # pragma: no cover
+    re2 = None
+
+try:  # pragma: no cover
+    from re import _parser as sre_parse  # python 3.11+
+    from re import _constants as sre_constants
+except ImportError:  # pragma: no cover
+    import sre_parse
+    import sre_constants
+
+from drone_ci_butler.rule_engine.profiling import clock
+
+
+DEFAULT_REGEX_BUDGET_SECONDS = 1.0
+
+# the flags honored by re2, unicode is implied for str patterns
+RE2_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL
+REPEAT_OPCODES = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+
+
+class RegexTimeout(Exception):
+    """raised by :py:meth:`GuardedRegex.search` when the search
+    exceeded its time budget"""
+
+    def __init__(self, elapsed: float, budget: float, size: int):
+        self.elapsed = elapsed
+        self.budget = budget
+        self.size = size
+        super().__init__(
+            f"gave up after {elapsed:.3f}s (budget {budget:.3f}s) searching {size} characters"
+        )
+
+
+class AlarmExpired(BaseException):
+    """raised from the SIGALRM handler, a BaseException so that it is
+    not swallowed by ``except Exception`` along the way"""
+
+
+def raise_alarm_expired(signum, frame):
+    raise AlarmExpired()
+
+
+def subpatterns(op, av) -> List[Any]:
+    if op in REPEAT_OPCODES:
+        return [av[2]]
+    if op is sre_constants.SUBPATTERN:
+        return [av[-1]]
+    if op is sre_constants.BRANCH:
+        return list(av[1])
+    if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        return [av[1]]
+    if op is sre_constants.GROUPREF_EXISTS:
+        return [p for p in av[1:] if p is not None]
+    return []
+
+
+def contains_repeat(parsed) -> bool:
+    for op, av in parsed:
+        if op in REPEAT_OPCODES and av[1] > 1:
+            return True
+        if any(contains_repeat(p) for p in subpatterns(op, av)):
+            return True
+    return False
+
+
+def find_nested_quantifiers(parsed) -> List[str]:
+    found = []
+    for op, av in parsed:
+        if op in REPEAT_OPCODES and av[1] == sre_constants.MAXREPEAT:
+            if contains_repeat(av[2]):
+                found.append(str(av[2]))
+                continue
+
+        for sub in subpatterns(op, av):
+            found.extend(find_nested_quantifiers(sub))
+
+    return found
+
+
+def has_nested_quantifiers(pattern: str, flags: int = 0) -> bool:
+    """returns True when an unbounded quantifier repeats an expression
+    that is itself repeated, e.g.: ``(a+)+``, ``(\\w*\\s?)*`` or
+    ``(?:x{2,})*`` which backtrack exponentially on non-matching input"""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (re.error, RecursionError):
+        return False
+
+    return bool(find_nested_quantifiers(parsed))
+
+
+def compile_re2(regex: Pattern):
+    if re2 is None:
+        return None
+
+    try:
+        return re2.compile(regex.pattern, regex.flags & RE2_FLAGS)
+    except Exception:
+        # unsupported syntax (e.g.: backreferences or lookarounds)
+        return None
+
+
+def can_use_alarm() -> bool:
+    return (
+        hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    )
+
+
+class GuardedRegex(object):
+    def __init__(self, regex: Pattern, budget: float = DEFAULT_REGEX_BUDGET_SECONDS):
+        self.regex = regex
+        self.budget = budget
+        self.linear = compile_re2(regex)
+        self.unsafe = has_nested_quantifiers(regex.pattern, regex.flags)
+
+    def __repr__(self):
+        engine = self.linear is not None and "re2" or "re"
+        return f"<GuardedRegex {self.regex.pattern!r} engine={engine} budget={self.budget}s>"
+
+    @property
+    def pattern(self) -> str:
+        return self.regex.pattern
+
+    def search(self, text: str) -> Optional[Any]:
+        """:raises RegexTimeout: when the search takes longer than the budget"""
+        if self.linear is not None:
+            return self.linear.search(text)
+
+        if not self.budget or self.budget <= 0:
+            return self.regex.search(text)
+
+        started = clock()
+        if not can_use_alarm():
+            found = self.regex.search(text)
+            self.check_budget(started, text)
+            return found
+
+        previous_handler = signal.signal(signal.SIGALRM, raise_alarm_expired)
+        previous_delay, _ = signal.setitimer(signal.ITIMER_REAL, self.budget)
+        if previous_delay:
+            # another timer is armed, leave it untouched
+            signal.setitimer(signal.ITIMER_REAL, previous_delay)
+            signal.signal(signal.SIGALRM, previous_handler)
+            found = self.regex.search(text)
+            self.check_budget(started, text)
+            return found
+
+        try:
+            try:
+                found = self.regex.search(text)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        except AlarmExpired:
+            raise RegexTimeout(clock() - started, self.budget, len(text))
+        finally:
+            signal.signal(signal.SIGALRM, previous_handler)
+
+        return found
+
+    def check_budget(self, started: float, text: str):
+        elapsed = clock() - started
+        if elapsed > self.budget:
+            raise RegexTimeout(elapsed, self.budget, len(text))
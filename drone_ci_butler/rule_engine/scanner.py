@@ -0,0 +1,322 @@
+"""Single-pass scanning of the attributes targeted by a
+:py:class:`~drone_ci_butler.rule_engine.models.RuleSet`.
+
+A :py:class:`ScanPlan` groups every ``contains_string`` needle and
+every ``matches_regex`` pattern of a ruleset by the attribute they
+target (e.g.: ``step.output.lines``) so that each attribute value is
+scanned once per :py:class:`~drone_ci_butler.drone_api.models.AnalysisContext`
+instead of once per condition.
+"""
+import re
+from re import Pattern
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from drone_ci_butler.drone_api.models import AnalysisContext
+from drone_ci_butler.rule_engine.attributes import (
+    AttributeCache,
+    TargetKey,
+    target_key,
+)
+from drone_ci_butler.rule_engine.models import Condition, GLOB_CHARACTERS, RegexMatch
+
+
+BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=")
+
+RegexKey = Tuple[str, int]
+
+
+def is_plain_literal(needle: str) -> bool:
+    """needles containing glob characters or line breaks keep being
+    evaluated by :py:meth:`ValueList.contains` because their semantics
+    are not plain substring checks"""
+    if not needle or "\n" in needle:
+        return False
+    return not GLOB_CHARACTERS.search(needle)
+
+
+def regex_key(regex: Pattern) -> RegexKey:
+    return regex.pattern, regex.flags
+
+
+def build_trie(needles: Iterable[str]) -> dict:
+    trie = {}
+    for needle in needles:
+        node = trie
+        for char in needle:
+            node = node.setdefault(char, {})
+        node[""] = True
+    return trie
+
+
+def trie_to_regex(node: dict) -> str:
+    """converts a trie into a regular expression where common prefixes
+    are shared, e.g.: ``["server error", "service"]`` becomes
+    ``serv(?:er\\ error|ice)``.
+
+    The optional suffix of a needle that is also the prefix of other
+    needles is greedy, so each match is the longest needle starting at
+    that position.
+    """
+    terminal = "" in node
+    branches = [
+        re.escape(char) + trie_to_regex(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if not branches:
+        return ""
+
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+
+    pattern = f"(?:{'|'.join(branches)})"
+    if terminal:
+        pattern += "?"
+    return pattern
+
+
+class LiteralAutomaton(object):
+    """Finds which of many literal needles occur in a text with a
+    single pass of one prefix-sharing regular expression, similar to
+    an Aho-Corasick automaton.
+
+    Needles that never appear as a match might still occur overlapped
+    by a longer match, those are confirmed with a substring check but
+    only when the text matched at least one needle.
+    """
+
+    def __init__(self, needles: Iterable[str]):
+        self.needles = tuple(sorted(set(needles)))
+        self.regex = None
+        if self.needles:
+            self.regex = re.compile(trie_to_regex(build_trie(self.needles)))
+
+    def __repr__(self):
+        return f"<LiteralAutomaton {list(self.needles)}>"
+
+    def find(self, text: str) -> Set[str]:
+        found = set()
+        if not self.needles:
+            return found
+
+        total = len(self.needles)
+        for match in self.regex.finditer(text):
+            found.add(match.group(0))
+            if len(found) == total:
+                return found
+
+        if not found:
+            return found
+
+        for needle in self.needles:
+            if needle not in found and needle in text:
+                found.add(needle)
+
+        return found
+
+
+class RegexAlternation(object):
+    """Combines the regular expressions that share the same flags into
+    one alternation of named groups so that the common case of no
+    pattern matching costs a single pass over the text.
+
+    Patterns that cannot be combined (backreferences, conflicting
+    group names, inline global flags) are searched individually.
+    """
+
+    def __init__(self, patterns: Iterable[Pattern]):
+        self.patterns = tuple({regex_key(p): p for p in patterns}.values())
+        self.combined: Dict[int, Tuple[Pattern, Dict[str, Pattern]]] = {}
+        self.individual: List[Pattern] = []
+
+        by_flags: Dict[int, List[Pattern]] = {}
+        for regex in self.patterns:
+            if BACKREFERENCE.search(regex.pattern):
+                self.individual.append(regex)
+            else:
+                by_flags.setdefault(regex.flags, []).append(regex)
+
+        for flags, patterns in by_flags.items():
+            if len(patterns) < 2:
+                self.individual.extend(patterns)
+                continue
+
+            groups = {f"_scan{i}": regex for i, regex in enumerate(patterns)}
+            alternation = "|".join(
+                f"(?P<{name}>{regex.pattern})" for name, regex in groups.items()
+            )
+            try:
+                combined = re.compile(alternation, flags)
+            except re.error:
+                self.individual.extend(patterns)
+                continue
+
+            self.combined[flags] = (combined, groups)
+
+    def find(self, text: str) -> Set[RegexKey]:
+        return set(self.search(text))
+
+    def search(self, text: str) -> Dict[RegexKey, RegexMatch]:
+        """returns a match of each pattern found in the text, not
+        necessarily the leftmost one when patterns overlap"""
+        found = {}
+        for combined, groups in self.combined.values():
+            matched = {}
+            for match in combined.finditer(text):
+                for name, regex in groups.items():
+                    if name not in matched and match.start(name) != -1:
+                        matched[name] = RegexMatch.from_match(match, regex, name)
+                if len(matched) == len(groups):
+                    break
+
+            if matched:
+                for name, regex in groups.items():
+                    if name in matched:
+                        found[regex_key(regex)] = matched[name]
+                        continue
+                    # overlapped by the match of another pattern
+                    match = regex.search(text)
+                    if match:
+                        found[regex_key(regex)] = RegexMatch.from_match(match)
+
+        for regex in self.individual:
+            match = regex.search(text)
+            if match:
+                found[regex_key(regex)] = RegexMatch.from_match(match)
+
+        return found
+
+
+class TargetPlan(object):
+    """everything that has to be searched in one attribute"""
+
+    def __init__(self, key: TargetKey):
+        self.key = key
+        self.needles: Set[str] = set()
+        self.patterns: List[Pattern] = []
+        self.pattern_keys: Set[RegexKey] = set()
+        self.automaton = None
+        self.alternation = None
+
+    def add(self, condition: Condition):
+        if condition.contains_string and all(
+            map(is_plain_literal, condition.contains_string)
+        ):
+            self.needles.update(condition.contains_string)
+        # patterns that might backtrack catastrophically are searched
+        # individually within the time budget of their condition
+        if condition.regex and not condition.guarded_regex.unsafe:
+            self.patterns.append(condition.regex)
+            self.pattern_keys.add(regex_key(condition.regex))
+
+    def compile(self) -> "TargetPlan":
+        self.automaton = LiteralAutomaton(self.needles)
+        self.alternation = RegexAlternation(self.patterns)
+        return self
+
+    def scan(self, lines: str, text: str) -> "TargetScan":
+        """:param lines: the strings of the value joined by line breaks
+        :param text: the value converted to :py:class:`str`
+        """
+        literals = set()
+        if self.needles:
+            literals = self.automaton.find(lines)
+
+        regexes = {}
+        if self.patterns:
+            regexes = self.alternation.search(text)
+
+        return TargetScan(self, literals, regexes)
+
+
+class TargetScan(object):
+    def __init__(
+        self,
+        plan: TargetPlan,
+        literals: Set[str],
+        regexes: Dict[RegexKey, RegexMatch],
+    ):
+        self.plan = plan
+        self.literals = literals
+        self.regexes = regexes
+
+
+class ScanPlan(object):
+    def __init__(self, conditions: Iterable[Condition]):
+        self.targets: Dict[TargetKey, TargetPlan] = {}
+        for condition in conditions:
+            key = target_key(condition)
+            if key not in self.targets:
+                self.targets[key] = TargetPlan(key)
+            self.targets[key].add(condition)
+
+        for plan in self.targets.values():
+            plan.compile()
+
+    def __repr__(self):
+        return f"<ScanPlan {list(self.targets)}>"
+
+    def scan(self, context: AnalysisContext) -> "Scan":
+        return Scan(self, context)
+
+
+class Scan(object):
+    """The lazy result of a :py:class:`ScanPlan` for a single
+    context: each attribute is scanned the first time one of the
+    conditions targeting it is applied."""
+
+    def __init__(self, plan: ScanPlan, context: AnalysisContext):
+        self.plan = plan
+        self.context = context
+        self.attributes = AttributeCache(context)
+        self.results: Dict[TargetKey, TargetScan] = {}
+
+    def get(self, condition: Condition, value: Any) -> Optional[TargetScan]:
+        key = target_key(condition)
+        if key in self.results:
+            return self.results[key]
+
+        plan = self.plan.targets.get(key)
+        if plan is None:
+            return None
+
+        attributes = self.attributes
+        result = self.results[key] = plan.scan(
+            plan.needles and attributes.lines(condition, value) or "",
+            plan.patterns and attributes.text(condition, value) or "",
+        )
+        return result
+
+    def found_literals(self, condition: Condition, value: Any) -> Optional[Set[str]]:
+        """returns which needles of ``condition.contains_string`` occur
+        in the value or None if the condition is not covered by the plan"""
+        if not condition.contains_string:
+            return None
+
+        result = self.get(condition, value)
+        if result is None:
+            return None
+
+        needles = set(condition.contains_string)
+        if not needles.issubset(result.plan.needles):
+            return None
+
+        return needles.intersection(result.literals)
+
+    def matches_regex(
+        self, condition: Condition, value: Any
+    ) -> Union[RegexMatch, bool, None]:
+        """returns where the regex of the condition matched, False when
+        it did not match or None if the condition is not covered by the plan"""
+        if not condition.regex:
+            return None
+
+        result = self.get(condition, value)
+        if result is None:
+            return None
+
+        key = regex_key(condition.regex)
+        if key not in result.plan.pattern_keys:
+            return None
+
+        return result.regexes.get(key, False)
@@ -0,0 +1,218 @@
+"""Incremental evaluation of a ruleset over the output of a running step.
+
+A :py:class:`StreamingMatcher` receives the
+:py:class:`~drone_ci_butler.drone_api.models.OutputLine` chunks of a
+step as Drone streams them and reports each rule as soon as the line
+that triggers it arrives, keeping only a bounded window of the most
+recent lines in memory.
+
+Conditions on the output of the step are tracked per condition
+between calls: once a ``contains_string`` or ``matches_regex``
+matcher matched it stays matched for the rest of the step. Regular
+expressions are searched in the current window so that patterns
+spanning a few consecutive lines are still found. Every other
+condition (build, stage and step metadata) is evaluated once and
+again only when :py:meth:`StreamingMatcher.feed` receives an updated
+step.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from drone_ci_butler.drone_api.models import (
+    AnalysisContext,
+    Build,
+    Output,
+    OutputLine,
+    OutputLines,
+    Stage,
+    Step,
+)
+from drone_ci_butler.rule_engine.compiler import CompiledRuleSet, without_children
+from drone_ci_butler.rule_engine.evaluation import (
+    Evaluation,
+    Outcome,
+    PartialContext,
+)
+from drone_ci_butler.rule_engine.exceptions import InvalidCondition
+from drone_ci_butler.rule_engine.models import (
+    Condition,
+    ConditionMatchType,
+    ConditionMatchTypes,
+    RegexMatch,
+)
+from drone_ci_butler.rule_engine.results import RuleMatch
+
+
+# matchers that stay matched once any line of the output matched them
+STICKY_MATCH_TYPES = (
+    ConditionMatchType.CONTAINS_STRING,
+    ConditionMatchType.MATCHES_REGEX,
+)
+
+
+def is_output_condition(condition: Condition) -> bool:
+    path = list(condition.target_attribute)
+    return condition.context_element == "step" and path[:1] == ["output"]
+
+
+class StreamedCondition(object):
+    """the state of a condition on the output of the step between
+    calls to :py:meth:`StreamingMatcher.feed`"""
+
+    def __init__(self, condition: Condition):
+        self.condition = condition
+        self.attribute = ".".join(condition.target_attribute)
+        self.location = f"step.{self.attribute}"
+        self.sticky: List[ConditionMatchType] = []
+        self.match_types: List[ConditionMatchType] = []
+        self.value = None
+        self.regex_match: Optional[RegexMatch] = None
+        self.error: Optional[InvalidCondition] = None
+
+    @property
+    def settled(self) -> bool:
+        """True once every matcher of the condition is sticky and
+        matched or the condition turned out to be invalid"""
+        if self.error is not None:
+            return True
+
+        condition = self.condition
+        expected = len(
+            [m for m in (condition.contains_string, condition.regex) if m]
+        )
+        others = (
+            condition.matches_value
+            or not isinstance(condition.is_not, tuple)
+            or not isinstance(condition.value_exact, tuple)
+        )
+        return not others and len(self.sticky) == expected
+
+    def feed(self, window: OutputLines) -> bool:
+        """matches the condition against the current window and
+        returns True when the condition matched something new"""
+        if self.settled:
+            return False
+
+        try:
+            found = self.condition.match_value(window)
+        except InvalidCondition as e:
+            self.error = e
+            return True
+
+        new_sticky = [
+            t for t in found if t in STICKY_MATCH_TYPES and t not in self.sticky
+        ]
+        others = [t for t in found if t not in STICKY_MATCH_TYPES]
+        self.sticky.extend(new_sticky)
+        changed = bool(new_sticky) or others != [
+            t for t in self.match_types if t not in STICKY_MATCH_TYPES
+        ]
+        if new_sticky or (others and self.value is None):
+            self.value = window
+            # spans are offsets in the text of the window they came from
+            self.regex_match = found.regex_match
+
+        self.match_types = ConditionMatchTypes(self.sticky + others)
+        self.match_types.regex_match = self.regex_match
+        return changed
+
+    def outcome(self, step: Step, slot: int = None) -> Outcome:
+        if self.error is not None:
+            return Outcome(self.condition, error=self.error, slot=slot)
+
+        found = (step, self.attribute, self.location, self.value, self.match_types)
+        return Outcome(self.condition, found=found, slot=slot)
+
+
+class StreamingMatcher(object):
+    def __init__(
+        self,
+        compiled: CompiledRuleSet,
+        build: Build,
+        stage: Stage,
+        step: Step,
+        window: int = 200,
+    ):
+        self.compiled = compiled
+        self.build = without_children(build, "stages")
+        self.stage = without_children(stage, "steps")
+        self.window = deque(maxlen=window)
+        self.line_count = 0
+        self.reported: Set[str] = set()
+        self.streamed: Dict[int, StreamedCondition] = {
+            slot: StreamedCondition(condition)
+            for slot, condition in enumerate(compiled.conditions)
+            if is_output_condition(condition)
+        }
+        self.static: Dict[int, Tuple[tuple, Optional[InvalidCondition]]] = {}
+        self.update_step(step)
+
+    def __repr__(self):
+        return f"<StreamingMatcher {self.compiled.name} lines={self.line_count}>"
+
+    def update_step(self, step: Step):
+        """evaluates the conditions that do not depend on the output
+        against the given step metadata (e.g.: status, exit_code)"""
+        self.step = without_children(step, "output")
+        context = PartialContext(build=self.build, stage=self.stage, step=self.step)
+        self.static = {}
+        for slot, condition in enumerate(self.compiled.conditions):
+            if slot in self.streamed:
+                continue
+            try:
+                self.static[slot] = (condition.find_matches(context), None)
+            except InvalidCondition as e:
+                self.static[slot] = ((), e)
+
+        self.rejected = self.compiled.prunable and any(
+            self.compiled.conditions[slot].required and not found[-1]
+            for slot, (found, error) in self.static.items()
+            if error is None and slot in self.compiled.precondition_slots
+        )
+
+    def feed(
+        self, lines: Iterable[OutputLine], step: Optional[Step] = None
+    ) -> List[RuleMatch]:
+        """consumes a chunk of output lines and returns the rules that
+        matched for the first time since the matcher was created"""
+        changed = self.line_count == 0
+        if step is not None:
+            self.update_step(step)
+            changed = True
+
+        for line in lines:
+            self.window.append(line)
+            self.line_count += 1
+
+        if self.rejected:
+            return []
+
+        window = OutputLines(list(self.window))
+        for streamed in self.streamed.values():
+            if streamed.feed(window):
+                changed = True
+
+        if not changed:
+            return []
+
+        return self.report(window)
+
+    def report(self, window: OutputLines) -> List[RuleMatch]:
+        step = Step(dict(self.step.__data__), output=Output(lines=window))
+        context = AnalysisContext(build=self.build, stage=self.stage, step=step)
+        evaluation = Evaluation(self.compiled.conditions, context)
+        for slot, (found, error) in self.static.items():
+            evaluation.outcomes[slot] = Outcome(
+                self.compiled.conditions[slot], found=found, error=error, slot=slot
+            )
+        for slot, streamed in self.streamed.items():
+            evaluation.outcomes[slot] = streamed.outcome(context.step, slot)
+
+        matches = []
+        for matched in self.compiled.apply_evaluation(evaluation):
+            name = matched.rule.name
+            if name not in self.reported:
+                self.reported.add(name)
+                matches.append(matched)
+
+        return matches
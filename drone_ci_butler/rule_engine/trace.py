@@ -0,0 +1,190 @@
+"""Decision tree of a ruleset applied to a single context.
+
+:py:meth:`RuleSet.explain <drone_ci_butler.rule_engine.models.RuleSet.explain>`
+applies the ruleset exactly like :py:meth:`RuleSet.apply` but with a
+:py:class:`TracedEvaluation`, which records the order and duration of
+each condition it evaluates. The resulting :py:class:`Trace` tells, for
+every rule, whether it was reported, rejected by one of its required
+conditions, did not match or was never evaluated, along with the
+status of each of its conditions, e.g.::
+
+    print(wf_project_vi.explain(context).to_description())
+
+The regular :py:class:`~drone_ci_butler.rule_engine.evaluation.Evaluation`
+records nothing, so tracing costs nothing unless it is asked for.
+"""
+from enum import Enum
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from drone_ci_butler.drone_api.models import AnalysisContext
+from drone_ci_butler.rule_engine.compiler import REQUIRED_RULE
+from drone_ci_butler.rule_engine.evaluation import Evaluation, Outcome, OutcomeStatus
+from drone_ci_butler.rule_engine.models import Condition
+from drone_ci_butler.rule_engine.profiling import clock
+from drone_ci_butler.rule_engine.results import RuleMatch
+
+
+class RuleStatus(Enum):
+    REPORTED = "reported"
+    REJECTED = "rejected"
+    NOT_MATCHED = "not_matched"
+    NOT_EVALUATED = "not_evaluated"
+
+
+class TracedEvaluation(Evaluation):
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.order: List[int] = []
+        self.seconds: Dict[int, float] = {}
+
+    def outcome(self, slot: int) -> Outcome:
+        if self.outcomes[slot] is not None:
+            return self.outcomes[slot]
+
+        started = clock()
+        outcome = super().outcome(slot)
+        self.seconds[slot] = clock() - started
+        self.order.append(slot)
+        return outcome
+
+
+class ConditionTrace(NamedTuple):
+    slot: int
+    description: str
+    status: str
+    match_types: List[str]
+    error: Optional[str]
+    order: Optional[int]
+    seconds: Optional[float]
+
+    def to_description(self) -> str:
+        details = self.error or ", ".join(self.match_types)
+        suffix = details and f": {details}"
+        return f"[{self.status}] {self.description}{suffix}"
+
+
+class RuleTrace(NamedTuple):
+    index: int
+    name: str
+    status: str
+    conditions: List[ConditionTrace]
+
+
+def trace_conditions(
+    evaluation: TracedEvaluation, slots: Sequence[int], names: Sequence[str]
+) -> List[ConditionTrace]:
+    traces = []
+    for slot in slots:
+        outcome = evaluation.outcomes[slot]
+        if outcome is None:
+            traces.append(
+                ConditionTrace(
+                    slot,
+                    names[slot],
+                    RuleStatus.NOT_EVALUATED.value,
+                    [],
+                    None,
+                    None,
+                    None,
+                )
+            )
+            continue
+
+        error = outcome.error
+        match_types = [] if error is not None else outcome.found[-1]
+        traces.append(
+            ConditionTrace(
+                slot=slot,
+                description=names[slot],
+                status=outcome.status.value,
+                match_types=[t.name for t in match_types],
+                error=error and str(error),
+                order=evaluation.order.index(slot),
+                seconds=evaluation.seconds[slot],
+            )
+        )
+    return traces
+
+
+def explain_conditions(
+    conditions: List[Condition], context: AnalysisContext
+) -> List[ConditionTrace]:
+    """evaluates every condition, e.g.: to find out why
+    :py:meth:`ConditionSet.apply` returned no matches"""
+    evaluation = TracedEvaluation(conditions, context)
+    for slot in range(len(conditions)):
+        evaluation.outcome(slot)
+
+    names = [c.to_description() for c in conditions]
+    return trace_conditions(evaluation, range(len(conditions)), names)
+
+
+def rule_status(reported: bool, conditions: List[ConditionTrace]) -> RuleStatus:
+    statuses = {c.status for c in conditions}
+    if reported:
+        return RuleStatus.REPORTED
+    if OutcomeStatus.REJECTED.value in statuses:
+        return RuleStatus.REJECTED
+    if RuleStatus.NOT_EVALUATED.value in statuses:
+        return RuleStatus.NOT_EVALUATED
+    return RuleStatus.NOT_MATCHED
+
+
+class Trace(object):
+    def __init__(
+        self,
+        ruleset: str,
+        context: AnalysisContext,
+        rules: List[RuleTrace],
+        matches: List[RuleMatch],
+    ):
+        self.ruleset = ruleset
+        self.context = context
+        self.rules = rules
+        self.matches = matches
+
+    def __repr__(self):
+        return f"<Trace {self.ruleset} rules={len(self.rules)} matches={len(self.matches)}>"
+
+    @classmethod
+    def from_evaluation(
+        cls, compiled, evaluation: TracedEvaluation, matches: List[RuleMatch]
+    ) -> "Trace":
+        reported = {m.index for m in matches}
+        indexes = list(range(len(compiled.rules)))
+        if compiled.required_rule is not None:
+            indexes.insert(0, REQUIRED_RULE)
+
+        rules = []
+        for index in indexes:
+            conditions = trace_conditions(
+                evaluation, compiled.slots_at(index), compiled.condition_names
+            )
+            status = rule_status(index in reported, conditions)
+            rules.append(
+                RuleTrace(
+                    index, compiled.rule_at(index).name, status.value, conditions
+                )
+            )
+
+        return cls(compiled.name, evaluation.context, rules, matches)
+
+    def to_dict(self) -> dict:
+        return {
+            "ruleset": self.ruleset,
+            "context": str(self.context),
+            "rules": [
+                dict(rule._asdict(), conditions=[c._asdict() for c in rule.conditions])
+                for rule in self.rules
+            ],
+        }
+
+    def to_description(self, indent: int = 2) -> str:
+        padding = " " * indent
+        lines = [f"{self.ruleset}: {self.context}"]
+        for rule in self.rules:
+            lines.append(f"{padding}[{rule.status}] {rule.name}")
+            for condition in rule.conditions:
+                lines.append(f"{padding * 2}{condition.to_description()}")
+
+        return "\n".join(lines)
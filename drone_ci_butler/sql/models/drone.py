@@ -40,6 +40,7 @@ class DroneBuild(Model):
         db.Column("last_ruleset_processed_at", db.DateTime),
         db.Column("error_type", db.Unicode(100)),
         db.Column("matches_json", db.UnicodeText),
+        db.Column("ruleset_version", db.Unicode(255)),
     )
 
     def save(self, *args, **kw):
@@ -63,10 +64,14 @@ class DroneBuild(Model):
         data["build"] = load_json(data.pop("drone_api_data", None))
         return data
 
-    def update_matches(self, matches: List[UserFriendlyObject]):
+    def update_matches(
+        self, matches: List[UserFriendlyObject], ruleset_version: Optional[str] = None
+    ):
         matches_json = json.dumps([m.to_description() for m in matches], default=str)
         return self.update_and_save(
-            matches_json=matches_json, last_ruleset_processed_at=datetime.utcnow()
+            matches_json=matches_json,
+            ruleset_version=ruleset_version,
+            last_ruleset_processed_at=datetime.utcnow(),
         )
 
     def drone_api_data_to_dict(self):
@@ -192,3 +197,49 @@ class DroneStep(Model):
             data["stopped_at"] = step.stopped_at
 
         return stored_step.update_and_save(**data)
+
+
+class DroneSyncState(Model):
+    """the newest build number and ``updated`` timestamp seen by ``sync-builds``
+    for each owner/repo, see :py:mod:`drone_ci_butler.workers.sync`"""
+
+    table = db.Table(
+        "drone_sync_state",
+        metadata,
+        db.Column("id", db.Integer, primary_key=True),
+        db.Column("owner", db.Unicode(255), nullable=False),
+        db.Column("repo", db.Unicode(255), nullable=False),
+        db.Column("last_build_number", db.Integer),
+        db.Column("last_build_updated", db.Integer),
+        db.Column("synced_at", db.DateTime),
+        db.UniqueConstraint("owner", "repo", name="uq_drone_sync_state_owner_repo"),
+    )
+
+    @classmethod
+    def get_for(cls, owner: str, repo: str) -> "DroneSyncState":
+        return cls.get_or_create(owner=owner, repo=repo)
+
+    def has_seen(self, build: Build) -> bool:
+        """True when the build is not newer than the last sync and was
+        not updated since"""
+        if self.last_build_number is None or build.number > self.last_build_number:
+            return False
+
+        return not build.updated or (
+            self.last_build_updated is not None
+            and build.updated <= self.last_build_updated
+        )
+
+    def advance(self, last_build_number: Optional[int], last_build_updated: Optional[int]):
+        """records the newest build number and ``updated`` timestamp
+        seen by a complete sync"""
+        data = {"synced_at": datetime.utcnow()}
+        if last_build_number is not None:
+            data["last_build_number"] = max(
+                last_build_number, self.last_build_number or last_build_number
+            )
+        if last_build_updated is not None:
+            data["last_build_updated"] = max(
+                last_build_updated, self.last_build_updated or last_build_updated
+            )
+        return self.update_and_save(**data)
@@ -2,6 +2,7 @@ import json
 import io
 import logging
 import requests
+from requests.structures import CaseInsensitiveDict
 from urllib.parse import urlencode
 from chemist import Model, db
 from datetime import datetime
@@ -10,6 +11,9 @@ from .base import metadata
 
 logger = logging.getLogger(__name__)
 
+# response headers that a 304 Not Modified refreshes
+REVALIDATED_HEADERS = ("ETag", "Last-Modified", "Date", "Cache-Control", "Expires")
+
 
 class HttpInteraction(Model):
     table = db.Table(
@@ -44,6 +48,30 @@ class HttpInteraction(Model):
         response.headers = load_json(self.response_headers, {})
         return response
 
+    def conditional_headers(self) -> dict:
+        """the ``If-None-Match`` and ``If-Modified-Since`` headers that
+        revalidate the cached response, empty when it has no validators"""
+        cached = CaseInsensitiveDict(load_json(self.response_headers, {}))
+        headers = {}
+        if cached.get("ETag"):
+            headers["If-None-Match"] = cached["ETag"]
+        if cached.get("Last-Modified"):
+            headers["If-Modified-Since"] = cached["Last-Modified"]
+        return headers
+
+    def revalidate(self, response: requests.Response):
+        """keeps the cached body of a response that the server reported
+        as not modified and refreshes its validators"""
+        headers = CaseInsensitiveDict(load_json(self.response_headers, {}))
+        for name in REVALIDATED_HEADERS:
+            if name in response.headers:
+                headers[name] = response.headers[name]
+
+        return self.update_and_save(
+            response_headers=json.dumps(dict(headers)),
+            updated_at=datetime.utcnow(),
+        )
+
     def request(self) -> requests.Request:
         request = requests.Request(
             method=self.request_method,
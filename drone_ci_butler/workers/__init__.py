@@ -1,2 +1,4 @@
 from .get_build_info import GetBuildInfoWorker
 from .queue import QueueServer, QueueClient, ClientSocketType
+from .rules import RulesSubscriber, publish_artifact
+from .sync import BuildSyncer
@@ -6,7 +6,11 @@ from drone_ci_butler.drone_api.models import Build
 from drone_ci_butler.sql.models.drone import DroneBuild
 from drone_ci_butler.sql.models.user import User
 from drone_ci_butler.drone_api.models import AnalysisContext
+from drone_ci_butler.rule_engine.artifact import RuleSetLoader, configured_ruleset
 from drone_ci_butler.rule_engine.default_rules import wf_project_vi
+from drone_ci_butler.rule_engine.models import RuleSet
+from drone_ci_butler.rule_engine.parallel import DEFAULT_RULESET_PATH, ParallelRuleSet
+from drone_ci_butler.rule_engine.result_cache import RuleResultCache
 from .puller import PullerWorker
 from drone_ci_butler.networking import connect_to_elasticsearch
 
@@ -149,6 +153,53 @@ class GetBuildInfoWorker(PullerWorker):
 
         self.process_rulesets(build, stored, user, owner, repo, logmeta=logmeta)
 
+    @property
+    def rules_loader(self) -> RuleSetLoader:
+        """the rulesets of ``config.rule_engine_rules_path`` or the
+        ones published by ``compile-rules --publish``"""
+        return RuleSetLoader.get_shared(
+            self.config.rule_engine_rules_path or None,
+            self.config.rule_engine_cache_dir,
+        )
+
+    @property
+    def ruleset(self) -> RuleSet:
+        """the ruleset applied to every build, reloaded whenever the
+        YAML file of ``config.rule_engine_rules_path`` changes or a new
+        artifact is published"""
+        return configured_ruleset(
+            self.config.rule_engine_rules_path or None,
+            self.config.rule_engine_cache_dir,
+            self.config.rule_engine_ruleset,
+        )
+
+    def evaluate_rulesets(self, ruleset: RuleSet, contexts):
+        """yields each context along with its matches, spreading the
+        evaluation across ``config.rule_engine_processes`` processes
+        when it is greater than zero. Steps whose targeted attributes
+        were already evaluated reuse the cached matches."""
+        cache = RuleResultCache.get_shared(self.config)
+        processes = self.config.rule_engine_processes
+        if processes > 0:
+            contexts = list(contexts)
+            path = DEFAULT_RULESET_PATH
+            if ruleset is not wf_project_vi:
+                path = f"{self.rules_loader.artifact_path}#{ruleset.name}"
+
+            pool = ParallelRuleSet.get_shared(path, processes=processes)
+            found = [cache.lookup(ruleset, context) for context in contexts]
+            misses = [i for i, (key, matches) in enumerate(found) if matches is None]
+            evaluated = pool.apply_many([contexts[i] for i in misses])
+            for i, matches in zip(misses, evaluated):
+                cache.store(found[i][0], matches)
+                found[i] = (found[i][0], matches)
+
+            yield from zip(contexts, (matches for key, matches in found))
+            return
+
+        for context in contexts:
+            yield context, cache.apply(ruleset, context)
+
     def process_rulesets(
         self,
         build: Build,
@@ -180,72 +231,77 @@ class GetBuildInfoWorker(PullerWorker):
             )
             es = None
 
-        for stage in build.stages or []:
+        # builds, stages and steps that fail the preconditions of the
+        # ruleset are skipped before their context is created
+        ruleset = self.ruleset
+        logmeta["ruleset_version"] = ruleset.version
+        contexts = ruleset.iter_contexts(build)
+        # the stage of each context comes without its steps, the
+        # indexed documents keep the stage as returned by drone
+        stages = {(s.number, s.name): s for s in build.stages or []}
+        for context, matches in self.evaluate_rulesets(ruleset, contexts):
+            stage = context.stage
+            step = context.step
             logmeta.update({"stage": stage and stage.to_dict() or {}})
-            for step in stage.steps or []:
-                logmeta.update({"step": step and step.to_dict() or {}})
-                context = AnalysisContext(
-                    build=build,
-                    stage=stage,
-                    step=step,
+            logmeta.update({"step": step and step.to_dict() or {}})
+            self.logger.debug(
+                f"processed {ruleset} against {context}",
+                extra=dict(logmeta),
+            )
+
+            described_matches = [m.to_description() for m in matches]
+            logmeta.update({"matched_rules": described_matches})
+            if matches:
+                message = "\n".join(described_matches)
+                self.logger.info(
+                    f"found {len(matches)} matches for {ruleset} against {context}",
+                    extra=dict(logmeta),
                 )
-                self.logger.debug(
-                    f"processing {wf_project_vi} against {context}",
+
+                stored.update_matches(matches, ruleset_version=ruleset.version)
+                self.logger.info(
+                    f"ruleset matches for step {step}",
                     extra=dict(logmeta),
                 )
 
-                matches = wf_project_vi.apply(context)
-                described_matches = [m.to_description() for m in matches]
-                logmeta.update({"matched_rules": described_matches})
-                if matches:
-                    message = "\n".join(described_matches)
-                    self.logger.info(
-                        f"found {len(matches)} matches for {wf_project_vi} against {context}",
-                        extra=dict(logmeta),
-                    )
-
-                    stored.update_matches(matches)
-                    self.logger.info(
-                        f"ruleset matches for step {step}",
-                        extra=dict(logmeta),
-                    )
-
-                    if es:
-                        try:
-                            document = stored.to_document()
-                            document["build"] = build.to_dict()
-                            document["stage"] = stage.to_dict()
-                            document["step"] = step.to_dict()
-                            es.index(
-                                index=f"drone_ci_butler_builds_{owner}_{repo}",
-                                id=stored.id,
-                                body=document,
-                            )
-                        except Exception as e:
-                            self.logger.warning(
-                                f"failed to index {stored} in elasticsearch: {e}",
-                                extra=dict(logmeta),
-                            )
-
-                    if user:
-                        user.notify_ruleset_matches(context, matches)
-                        print(message, stage, step, step.to_markdown())
-
-                elif (
-                    user
-                    and "http-status-check" in str(step.output)
-                    and "🖤 404" in str(output.lines)
-                ):
-                    message = "**http-status-check** failed for {step.to_markdown()}"
-                    self.logger.info(
-                        message,
-                        extra=dict(logmeta),
-                    )
-
-                    user.notify_error(message, context, matches)
-                    continue
-                elif user:
-                    self.logger.warning(
-                        f"no ruleset matches for build {build.number} {build.link} by {build.author_login}",
-                        extra=dict(logmeta),
-                    )
+                if es:
+                    try:
+                        document = stored.to_document()
+                        document["build"] = build.to_dict()
+                        document["stage"] = stages.get(
+                            (stage.number, stage.name), stage
+                        ).to_dict()
+                        document["step"] = step.to_dict()
+                        es.index(
+                            index=f"drone_ci_butler_builds_{owner}_{repo}",
+                            id=stored.id,
+                            body=document,
+                        )
+                    except Exception as e:
+                        self.logger.warning(
+                            f"failed to index {stored} in elasticsearch: {e}",
+                            extra=dict(logmeta),
+                        )
+
+                if user:
+                    user.notify_ruleset_matches(context, matches)
+                    print(message, stage, step, step.to_markdown())
+
+            elif (
+                user
+                and "http-status-check" in str(step.output)
+                and "🖤 404" in str(output.lines)
+            ):
+                message = "**http-status-check** failed for {step.to_markdown()}"
+                self.logger.info(
+                    message,
+                    extra=dict(logmeta),
+                )
+
+                user.notify_error(message, context, matches)
+                continue
+            elif user:
+                self.logger.warning(
+                    f"no ruleset matches for build {build.number} {build.link} by {build.author_login}",
+                    extra=dict(logmeta),
+                )
@@ -0,0 +1,145 @@
+"""Distribution of compiled rulesets to the running workers.
+
+``drone-ci-butler compile-rules --publish rules.yml`` stores the
+artifact in redis as the current one, then binds a PUB socket to
+``config.worker_rules_address`` and broadcasts it for a few seconds.
+Every ``workers`` process runs a :py:class:`RulesSubscriber` connected
+to that address which installs the artifact in the process-wide
+:py:class:`~drone_ci_butler.rule_engine.artifact.RuleSetLoader`, each
+:py:class:`~drone_ci_butler.workers.GetBuildInfoWorker` picks up the
+new rulesets when it starts its next job.
+
+Workers that start or reconnect after the broadcast install the current
+artifact from redis when they start and whenever no broadcast arrived
+for ``config.worker_rules_check_interval`` seconds, which only costs
+reading its digest when it did not change.
+"""
+import gevent
+import zmq.green as zmq
+from pathlib import Path
+
+from drone_ci_butler.config import Config, config
+from drone_ci_butler.logs import get_logger
+from drone_ci_butler.networking import (
+    connect_to_redis,
+    get_redis_pool,
+    resolve_zmq_address,
+)
+from drone_ci_butler.rule_engine.artifact import RuleSetLoader, parse_artifact
+
+from .base import context
+
+
+RULES_TOPIC = b"rulesets"
+CURRENT_ARTIFACT_KEY = "drone-ci-butler:rulesets:artifact"
+CURRENT_DIGEST_KEY = "drone-ci-butler:rulesets:digest"
+
+logger = get_logger(__name__)
+
+
+def store_current_artifact(redis, data: bytes) -> str:
+    """keeps the artifact in redis for the subscribers that miss its
+    broadcast
+
+    :returns: the content hash of the artifact
+    :raises InvalidRuleSet: when the artifact is incompatible
+    """
+    digest = parse_artifact(data)["content_hash"]
+    redis.set(CURRENT_ARTIFACT_KEY, data)
+    redis.set(CURRENT_DIGEST_KEY, digest)
+    return digest
+
+
+def publish_artifact(
+    bind_address: str,
+    path: Path,
+    duration: float = 5.0,
+    interval: float = 0.5,
+    redis=None,
+) -> int:
+    """stores the artifact as the current one when given a
+    :py:class:`redis.Redis` client and broadcasts it to the subscribers
+    that connect within ``duration`` seconds, subscribers ignore the
+    repeated messages.
+
+    :returns: the amount of messages sent
+    """
+    data = Path(path).read_bytes()
+    if redis is not None:
+        try:
+            store_current_artifact(redis, data)
+        except Exception as e:
+            logger.warning(f"failed to store {path} as the current artifact: {e}")
+
+    socket = context.socket(zmq.PUB)
+    socket.bind(resolve_zmq_address(bind_address, listen=True))
+    sent = 0
+    try:
+        for _ in range(max(int(duration / interval), 1)):
+            socket.send_multipart([RULES_TOPIC, data])
+            sent += 1
+            gevent.sleep(interval)
+    finally:
+        socket.close(linger=int(interval * 1000))
+
+    return sent
+
+
+class RulesSubscriber(object):
+    __log_name__ = "rules-subscriber"
+
+    def __init__(self, connect_address: str, config: Config = config, redis=None):
+        self.logger = get_logger(self.__log_name__)
+        self.connect_address = resolve_zmq_address(connect_address)
+        self.loader = RuleSetLoader.get_shared(
+            config.rule_engine_rules_path or None, config.rule_engine_cache_dir
+        )
+        self.redis = redis or connect_to_redis(get_redis_pool())
+        self.check_interval = config.worker_rules_check_interval
+        self.should_run = True
+        self.socket = context.socket(zmq.SUB)
+        self.socket.setsockopt(zmq.SUBSCRIBE, RULES_TOPIC)
+
+    def connect(self):
+        self.logger.info(f"subscribing to rulesets published at {self.connect_address}")
+        self.socket.connect(self.connect_address)
+
+    def run(self):
+        self.connect()
+        self.install_current()
+        while self.should_run:
+            if self.socket.poll(self.check_interval * 1000):
+                self.receive_once()
+            else:
+                self.install_current()
+
+    def receive_once(self) -> bool:
+        topic, data = self.socket.recv_multipart()
+        return self.install(data)
+
+    def install_current(self) -> bool:
+        """installs the artifact stored by the last publish when it
+        differs from the installed one"""
+        try:
+            digest = self.redis.get(CURRENT_DIGEST_KEY)
+            if not digest or digest.decode("ascii") == self.loader.digest:
+                return False
+            data = self.redis.get(CURRENT_ARTIFACT_KEY)
+        except Exception as e:
+            self.logger.warning(f"failed to read the current ruleset artifact: {e}")
+            return False
+
+        return data is not None and self.install(data)
+
+    def install(self, data: bytes) -> bool:
+        try:
+            installed = self.loader.install(data)
+        except Exception as e:
+            self.logger.exception(f"ignoring invalid ruleset artifact: {e}")
+            return False
+
+        if installed:
+            self.logger.info(
+                f"installed rulesets {list(self.loader.rulesets)} ({self.loader.digest})"
+            )
+        return installed
@@ -0,0 +1,100 @@
+"""Incremental synchronization of the builds of a repository.
+
+``drone-ci-butler sync-builds`` polls the builds of the configured
+owner/repo every ``config.drone_api_sync_interval`` seconds. The first
+pass walks every page like the ``builds`` command, the following ones
+only enqueue builds that are newer than the last pass or were updated
+since, and stop at the first page whose builds were all seen already
+and are finished. The newest build number and ``updated`` timestamp seen for
+each owner/repo is kept in
+:py:class:`~drone_ci_butler.sql.models.drone.DroneSyncState`, so a
+restarted poller carries on where it stopped.
+"""
+import gevent
+from typing import List
+
+from drone_ci_butler.config import config
+from drone_ci_butler.drone_api import DroneAPIClient
+from drone_ci_butler.drone_api.models import Build
+from drone_ci_butler.logs import get_logger
+from drone_ci_butler.sql.models.drone import DroneSyncState
+
+from .queue import QueueClient
+
+
+class BuildSyncer(object):
+    __log_name__ = "build-syncer"
+
+    def __init__(
+        self,
+        client: DroneAPIClient,
+        queue: QueueClient,
+        owner: str,
+        repo: str,
+        interval: float = config.drone_api_sync_interval,
+        ignore_filters: bool = True,
+    ):
+        self.logger = get_logger(self.__log_name__)
+        self.client = client
+        self.queue = queue
+        self.owner = owner
+        self.repo = repo
+        self.interval = interval
+        self.ignore_filters = ignore_filters
+        self.should_run = True
+
+    def run(self):
+        while self.should_run:
+            try:
+                self.sync_once()
+            except Exception as e:
+                self.logger.exception(
+                    f"failed to sync builds of {self.owner}/{self.repo}: {e}"
+                )
+            gevent.sleep(self.interval)
+
+    def sync_once(self) -> List[int]:
+        """enqueues the builds that are new or were updated since the
+        last pass
+
+        :returns: the numbers of the builds that were enqueued
+        """
+        state = DroneSyncState.get_for(self.owner, self.repo)
+
+        def is_synced(builds: Build.List) -> bool:
+            return all(state.has_seen(b) and b.finished for b in builds)
+
+        enqueued = []
+        last_build_number = None
+        last_build_updated = None
+        for builds, page, max_pages in self.client.iter_builds_by_page(
+            self.owner, self.repo, until=is_synced
+        ):
+            for build in builds:
+                last_build_number = max(build.number, last_build_number or 0)
+                if build.updated:
+                    last_build_updated = max(build.updated, last_build_updated or 0)
+
+                if state.has_seen(build):
+                    continue
+
+                # like the ``builds`` command, jobs that bypass the
+                # filters only process pull requests, the others are
+                # left to the filters of the job
+                if self.ignore_filters and "/pull" not in (build.link or ""):
+                    continue
+
+                self.logger.info(
+                    f"enqueing {build.link} (#{build.number} by {build.author_login})"
+                )
+                self.queue.send(
+                    {"build_id": build.number, "ignore_filters": self.ignore_filters}
+                )
+                enqueued.append(build.number)
+
+        # only recorded after a complete pass, an interrupted one starts over
+        state.advance(last_build_number, last_build_updated)
+        self.logger.debug(
+            f"synced {self.owner}/{self.repo} up to build {state.last_build_number}: enqueued {len(enqueued)} builds"
+        )
+        return enqueued
@@ -0,0 +1,119 @@
+import asyncio
+import subprocess
+import sys
+
+from aiohttp import web
+
+from drone_ci_butler.drone_api import NotFound
+from drone_ci_butler.drone_api.async_client import AsyncDroneAPIClient
+
+
+def serve_drone_api(test):
+    "runs the test coroutine against a local fake of the drone api"
+
+    builds = [{"number": number, "status": "failure"} for number in range(1, 6)]
+    build = {
+        "number": 3,
+        "stages": [
+            {
+                "number": 1,
+                "steps": [
+                    {"number": 1, "status": "failure"},
+                    {"number": 2, "status": "skipped"},
+                ],
+            },
+            {"number": 2, "steps": [{"number": 1, "status": "failure"}]},
+        ],
+    }
+
+    async def list_builds(request):
+        page = int(request.query["page"])
+        return web.json_response(builds[page * 2 : page * 2 + 2])
+
+    async def get_build(request):
+        if request.match_info["number"] != "3":
+            raise web.HTTPNotFound()
+        return web.json_response(build)
+
+    async def get_logs(request):
+        stage, step = request.match_info["stage"], request.match_info["step"]
+        await asyncio.sleep(0.01)
+        return web.json_response([{"pos": 0, "out": f"{stage}.{step}"}])
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/api/repos/{owner}/{repo}/builds", list_builds)
+        app.router.add_get("/api/repos/{owner}/{repo}/builds/{number}", get_build)
+        app.router.add_get(
+            "/api/repos/{owner}/{repo}/builds/{number}/logs/{stage}/{step}", get_logs
+        )
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with AsyncDroneAPIClient(
+                f"http://127.0.0.1:{port}",
+                "token",
+                owner="owner",
+                repo="repo",
+                max_builds=100,
+                max_pages=100,
+            ) as client:
+                return await test(client)
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(main())
+
+
+def test_iter_builds_by_page_stops_at_the_first_empty_page():
+    "AsyncDroneAPIClient.iter_builds_by_page() should yield pages until they run out"
+
+    async def test(client):
+        return [
+            (page, [b.number for b in builds])
+            async for builds, page, max_pages in client.iter_builds_by_page(limit=2)
+        ]
+
+    serve_drone_api(test).should.equal(
+        [(0, [1, 2]), (1, [3, 4]), (2, [5]), (3, [])]
+    )
+
+
+def test_get_build_with_logs_attaches_outputs_in_order():
+    "AsyncDroneAPIClient.get_build_with_logs() should fetch the outputs of every step that was not skipped"
+
+    async def test(client):
+        build = await client.get_build_with_logs("owner", "repo", 3)
+        try:
+            await client.get_build_info("owner", "repo", 4)
+        except NotFound as e:
+            return build, e
+
+    build, error = serve_drone_api(test)
+    [
+        step.output and step.output.lines[0].out
+        for stage in build.stages
+        for step in stage.steps
+    ].should.equal(["1.1", None, "2.1"])
+    str(error).should.contain("/api/repos/owner/repo/builds/4")
+
+
+def test_drone_api_does_not_require_aiohttp():
+    "drone_ci_butler.drone_api should import without aiohttp, which only the async client needs"
+
+    code = "\n".join(
+        [
+            "import sys",
+            "sys.modules['aiohttp'] = None",
+            "from drone_ci_butler.drone_api import DroneAPIClient",
+        ]
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    )
+
+    result.stderr.should.equal("")
+    result.returncode.should.equal(0)
@@ -0,0 +1,236 @@
+import gevent
+import json
+import requests
+
+from unittest.mock import Mock, patch
+
+from drone_ci_butler.drone_api import DroneAPIClient
+from drone_ci_butler.drone_api.exceptions import ClientError
+from drone_ci_butler.drone_api.models import Build, Output, Step
+
+
+def fake_build():
+    return Build(
+        number=42,
+        stages=[
+            {
+                "number": 1,
+                "steps": [
+                    {"number": 1, "status": "success"},
+                    {"number": 2, "status": "skipped"},
+                    {"number": 3, "status": "failure"},
+                ],
+            },
+            {"number": 2, "steps": [{"number": 1, "status": "failure"}]},
+        ],
+    )
+
+
+@patch("drone_ci_butler.drone_api.client.DroneAPIClient.get_build_step_output")
+def test_inject_logs_into_build_fetches_steps_concurrently(get_build_step_output):
+    "DroneAPIClient.inject_logs_into_build() should fetch step outputs concurrently and attach them in order"
+
+    in_flight = []
+    peak = []
+
+    def get_output(owner, repo, build_number, stage_number, step_number, revalidate):
+        in_flight.append(step_number)
+        peak.append(len(in_flight))
+        gevent.sleep(0.01 * (4 - step_number))
+        in_flight.remove(step_number)
+        return Output({"lines": [{"out": f"{stage_number}.{step_number}"}]})
+
+    get_build_step_output.side_effect = get_output
+    client = DroneAPIClient("https://drone.dummy", "token", max_requests_per_host=2)
+
+    build = client.inject_logs_into_build("owner", "repo", fake_build())
+
+    get_build_step_output.call_count.should.equal(3)
+    max(peak).should.equal(2)
+    [
+        step.output and step.output.lines[0].out
+        for stage in build.stages
+        for step in stage.steps
+    ].should.equal(["1.1", None, "1.3", "2.1"])
+
+
+@patch("drone_ci_butler.drone_api.client.DroneAPIClient.get_build_step_output")
+def test_inject_logs_into_build_skips_failed_requests(get_build_step_output):
+    "DroneAPIClient.inject_logs_into_build() should keep the remaining outputs when a request fails"
+
+    def get_output(owner, repo, build_number, stage_number, step_number, revalidate):
+        if stage_number == 2:
+            raise ClientError(Mock(name="response"), "boom")
+        return Output({"lines": []})
+
+    get_build_step_output.side_effect = get_output
+    client = DroneAPIClient("https://drone.dummy", "token")
+
+    build = client.inject_logs_into_build("owner", "repo", fake_build())
+
+    build.stages[0].steps[0].output.should.be.an(Output)
+    build.stages[1].steps[0].output.should.be.none
+
+
+@patch("drone_ci_butler.drone_api.client.DroneAPIClient.fetch_builds_page")
+def test_iter_pages_prefetches_pages_until_the_watermark(fetch_builds_page):
+    "DroneAPIClient.iter_pages() should request pages ahead and stop at the first build that is not newer than the watermark"
+
+    requested = []
+
+    def fetch_page(owner, repo, limit, page):
+        requested.append(page)
+        gevent.sleep(0.01)
+        first = 100 - page * limit
+        return Build.List([Build(number=n) for n in range(first, first - limit, -1)])
+
+    fetch_builds_page.side_effect = fetch_page
+    client = DroneAPIClient(
+        "https://drone.dummy", "token", max_builds=1000, max_pages=100
+    )
+
+    pages = [
+        (page, [b.number for b in builds])
+        for builds, page, max_pages in client.iter_pages(
+            "owner", "repo", limit=10, prefetch=3, watermark=75
+        )
+    ]
+
+    pages.should.equal(
+        [
+            (0, list(range(100, 90, -1))),
+            (1, list(range(90, 80, -1))),
+            (2, list(range(80, 75, -1))),
+        ]
+    )
+    # page 4 was scheduled but the paginator stopped before it ran
+    sorted(requested).should.equal([0, 1, 2, 3])
+
+
+def cached_interaction(body, headers):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps(body).encode("utf-8")
+    response.headers = headers
+    interaction = Mock(name="interaction", response_body=response.text)
+    interaction.response.return_value = response
+    interaction.conditional_headers.return_value = {"If-None-Match": headers["ETag"]}
+    return interaction
+
+
+def test_request_revalidates_cached_response():
+    "DroneAPIClient.request(revalidate=True) should send the validators of the cached response and serve it on 304"
+
+    client = DroneAPIClient("https://drone.dummy", "token")
+    client.http = Mock(name="http")
+    client.http.request.return_value = Mock(name="response", status_code=304)
+    client.cache = Mock(name="cache")
+    interaction = cached_interaction([{"number": 1}], {"ETag": '"v1"'})
+    client.cache.get_by_url_and_method.return_value = interaction
+
+    result = client.request(
+        "GET", "/api/repos/o/r/builds", params={"page": 0}, revalidate=True
+    )
+
+    client.cache.get_by_url_and_method.assert_called_once_with(
+        method="GET", url="https://drone.dummy/api/repos/o/r/builds?page=0"
+    )
+    client.http.request.assert_called_once_with(
+        "GET",
+        "https://drone.dummy/api/repos/o/r/builds",
+        data=None,
+        headers={"If-None-Match": '"v1"'},
+        params={"page": 0},
+    )
+    client.cache.revalidate.assert_called_once_with(
+        interaction, client.http.request.return_value
+    )
+    result.should.equal(client.cache.revalidate.return_value.response.return_value)
+    client.cache.hit.called.should.be.false
+    client.cache.set.called.should.be.false
+
+
+def fresh_response(body, headers):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps(body).encode("utf-8")
+    response.headers = headers
+    return response
+
+
+def test_get_build_info_revalidates_cached_builds():
+    "DroneAPIClient.get_build_info() should revalidate cached builds, whatever their status"
+
+    client = DroneAPIClient("https://drone.dummy", "token")
+    client.http = Mock(name="http")
+    client.cache = Mock(name="cache")
+    client.cache.get_by_url_and_method.return_value = cached_interaction(
+        {"number": 8, "status": "pending", "finished": 0}, {"ETag": '"v1"'}
+    )
+    running = fresh_response(
+        {"number": 8, "status": "running", "finished": 0}, {"ETag": '"v2"'}
+    )
+    client.http.request.return_value = running
+    client.cache.set.return_value.response.return_value = running
+
+    build = client.get_build_info("o", "r", 8)
+
+    build.status.should.equal("running")
+    client.http.request.call_args.kwargs["headers"].should.equal(
+        {"If-None-Match": '"v1"'}
+    )
+    client.cache.set.assert_called_once_with(running.request, running)
+    client.cache.hit.called.should.be.false
+
+    client.cache.get_by_url_and_method.return_value = cached_interaction(
+        {"number": 7, "status": "success", "finished": 1000}, {"ETag": '"v3"'}
+    )
+    client.http.request.return_value = Mock(name="response", status_code=304)
+    client.cache.revalidate.return_value = cached_interaction(
+        {"number": 7, "status": "success", "finished": 1000}, {"ETag": '"v3"'}
+    )
+
+    build = client.get_build_info("o", "r", 7)
+
+    build.status.should.equal("success")
+    client.http.request.call_args.kwargs["headers"].should.equal(
+        {"If-None-Match": '"v3"'}
+    )
+    client.cache.revalidate.call_count.should.equal(1)
+
+
+def test_fetch_step_output_revalidates_logs_cached_before_the_step_stopped():
+    "DroneAPIClient.fetch_step_output() should refetch a log cached while its step was running and serve it from cache once the step stopped"
+
+    client = DroneAPIClient("https://drone.dummy", "token")
+    client.http = Mock(name="http")
+    client.cache = Mock(name="cache")
+    client.cache.get_by_url_and_method.return_value = cached_interaction(
+        [{"out": "yarn install"}],
+        {"ETag": '"v1"', "Date": "Thu, 01 Jan 1970 00:16:40 GMT"},
+    )
+    complete = fresh_response(
+        [{"out": "yarn install"}, {"out": "Done in 3s"}],
+        {"ETag": '"v2"', "Date": "Thu, 01 Jan 1970 00:17:00 GMT"},
+    )
+    client.http.request.return_value = complete
+    client.cache.set.return_value.response.return_value = complete
+    step = Step(number=1, status="success", stopped=1010)
+
+    output = client.fetch_step_output("o", "r", Build(number=1), 1, step)
+
+    [line.out for line in output.lines].should.equal(["yarn install", "Done in 3s"])
+    client.http.request.call_args.kwargs["headers"].should.equal(
+        {"If-None-Match": '"v1"'}
+    )
+
+    client.cache.get_by_url_and_method.return_value = cached_interaction(
+        [{"out": "yarn install"}, {"out": "Done in 3s"}],
+        {"ETag": '"v2"', "Date": "Thu, 01 Jan 1970 00:17:00 GMT"},
+    )
+
+    output = client.fetch_step_output("o", "r", Build(number=1), 1, step)
+
+    [line.out for line in output.lines].should.equal(["yarn install", "Done in 3s"])
+    client.http.request.call_count.should.equal(1)
+    client.cache.hit.call_count.should.equal(1)
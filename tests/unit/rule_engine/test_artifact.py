@@ -0,0 +1,172 @@
+import pickle
+
+from drone_ci_butler.rule_engine.artifact import (
+    RuleSetLoader,
+    compile_rules,
+    configured_ruleset,
+    load_artifact,
+    rulesets_from_yaml,
+)
+from drone_ci_butler.rule_engine.exceptions import InvalidRuleSet
+from drone_ci_butler.rule_engine.models import RuleAction, RuleSet
+from .fakes import fake_context_with_output_lines
+
+
+RULES_YAML = """
+rulesets:
+  wf-project-vi:
+    required-conditions:
+      - build.link:
+          contains_string: "nytm/wf-project-vi"
+      - step.status:
+          - "fail*"
+          - running
+    default-conditions:
+      - step.exit_code:
+          is_not: 0
+    default_action: NEXT_RULE
+    default_notify:
+      - slack
+
+    rules:
+      - name: GitMergeConflict
+        when:
+          - step.output.lines:
+              matches_regex: "(not something we can merge|Automatic merge failed)"
+        action: SKIP_ANALYSIS
+
+      - name: YarnDependencyNotResolved
+        when:
+          - step.output.lines:
+              contains_string: "Couldn't find any versions for"
+        notify:
+          - github
+"""
+
+
+def test_compile_rules_writes_an_artifact_keyed_by_content_hash(tmp_path):
+    "compile_rules() should validate the YAML rulesets and write an artifact that loads the same rules"
+
+    rules_path = tmp_path.joinpath("rules.yml")
+    rules_path.write_text(RULES_YAML)
+
+    path, digest = compile_rules(rules_path, tmp_path.joinpath("cache"))
+
+    path.name.should.equal(f"rules-{digest}.v1.pickle")
+    rulesets = load_artifact(path)
+    list(rulesets).should.equal(["wf-project-vi"])
+
+    ruleset = rulesets["wf-project-vi"]
+    ruleset.default_action.should.equal(RuleAction.NEXT_RULE)
+    [r.name for r in ruleset.rules].should.equal(
+        ["GitMergeConflict", "YarnDependencyNotResolved"]
+    )
+
+    context = fake_context_with_output_lines(
+        build_link="https://github.com/nytm/wf-project-vi/pull/1",
+        lines=["Couldn't find any versions for left-pad"],
+    )
+    expected = rulesets_from_yaml(RULES_YAML.encode())["wf-project-vi"]
+    [m.to_description() for m in ruleset.apply(context)].should.equal(
+        [m.to_description() for m in expected.apply(context)]
+    )
+    [m.rule.name for m in ruleset.apply(context)].should.equal(
+        ["YarnDependencyNotResolved"]
+    )
+
+
+def test_rulesets_from_yaml_with_invalid_action():
+    "rulesets_from_yaml() should reject unknown actions"
+
+    rulesets_from_yaml.when.called_with(
+        RULES_YAML.replace("SKIP_ANALYSIS", "EXPLODE").encode()
+    ).should.throw(InvalidRuleSet, "'GitMergeConflict' has an invalid action 'EXPLODE'")
+
+
+def test_ruleset_loader_reloads_when_the_rules_change(tmp_path):
+    "RuleSetLoader.get() should swap in the new rulesets after the YAML file changes"
+
+    rules_path = tmp_path.joinpath("rules.yml")
+    rules_path.write_text(RULES_YAML)
+    loader = RuleSetLoader(rules_path, tmp_path.joinpath("cache"), check_interval=0)
+    first_digest = loader.digest
+
+    loader.get().name.should.equal("wf-project-vi")
+    loader.artifact_path.exists().should.be.true
+
+    rules_path.write_text(RULES_YAML.replace("wf-project-vi:", "wf-project-vii:"))
+
+    loader.get("wf-project-vii").name.should.equal("wf-project-vii")
+    loader.digest.shouldnt.equal(first_digest)
+
+    rules_path.write_text("rulesets: {}")
+    loader.get().name.should.equal("wf-project-vii")
+
+
+def test_ruleset_loader_installs_published_artifacts(tmp_path):
+    "RuleSetLoader.install() should swap in the rulesets of a published artifact and stamp their version"
+
+    rules_path = tmp_path.joinpath("rules.yml")
+    rules_path.write_text(RULES_YAML)
+    path, digest = compile_rules(rules_path, tmp_path.joinpath("build"))
+    loader = RuleSetLoader(None, tmp_path.joinpath("cache"))
+
+    loader.get.when.called_with().should.throw(InvalidRuleSet)
+    loader.install(path.read_bytes()).should.be.true
+    loader.install(path.read_bytes()).should.be.false
+
+    loader.get().version.should.equal(f"wf-project-vi@{digest[:12]}")
+    loader.artifact_path.read_bytes().should.equal(path.read_bytes())
+
+    loader.install.when.called_with(
+        pickle.dumps({"format": 1, "rulesets": RuleSet(name="evil")})
+    ).should.throw(InvalidRuleSet, "forbidden global")
+    loader.digest.should.equal(digest)
+
+
+def test_ruleset_version_defaults_to_the_package_version():
+    "RuleSet.version should fall back to the name of the ruleset and the version of drone-ci-butler"
+
+    ruleset = RuleSet(name="wf-project-vi")
+    ruleset.version.should.equal("wf-project-vi@0.1.0")
+    ruleset.with_version("wf-project-vi@abc").version.should.equal("wf-project-vi@abc")
+
+
+def test_ruleset_loader_survives_invalid_rules_at_startup(tmp_path):
+    "RuleSetLoader.get_shared() should keep a loader without rulesets when the YAML file is invalid and load it once fixed"
+
+    rules_path = tmp_path.joinpath("rules.yml")
+    rules_path.write_text("rulesets: [")
+    cache_dir = tmp_path.joinpath("cache")
+
+    loader = RuleSetLoader.get_shared(rules_path, cache_dir)
+    try:
+        loader.rulesets.should.equal({})
+        loader.digest.should.be.none
+        RuleSetLoader.get_shared(rules_path, cache_dir).should.be(loader)
+
+        loader.check_interval = 0
+        rules_path.write_text(RULES_YAML)
+        loader.get().name.should.equal("wf-project-vi")
+    finally:
+        RuleSetLoader.shared.clear()
+
+
+def test_configured_ruleset_prefers_the_rules_file_over_the_builtin_ruleset(tmp_path):
+    "configured_ruleset() should return the ruleset the workers apply"
+
+    rules_path = tmp_path.joinpath("rules.yml")
+    rules_path.write_text(RULES_YAML)
+    cache_dir = tmp_path.joinpath("cache")
+
+    try:
+        ruleset = configured_ruleset(rules_path, cache_dir, "wf-project-vi")
+        ruleset.should.be(RuleSetLoader.get_shared(rules_path, cache_dir).get())
+        [rule.name for rule in ruleset.rules].should.equal(
+            ["GitMergeConflict", "YarnDependencyNotResolved"]
+        )
+        configured_ruleset.when.called_with(
+            rules_path, cache_dir, "missing"
+        ).should.throw(InvalidRuleSet)
+    finally:
+        RuleSetLoader.shared.clear()
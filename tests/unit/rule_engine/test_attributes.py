@@ -0,0 +1,38 @@
+from drone_ci_butler.rule_engine.models import Condition
+from drone_ci_butler.rule_engine.scanner import ScanPlan
+from .fakes import fake_context_with_output_lines
+
+
+def test_conditions_share_the_text_of_their_target_attribute():
+    "Condition.find_matches() should resolve and convert each target attribute once per context"
+
+    conditions = [
+        Condition(
+            context_element="step",
+            target_attribute=["output", "lines"],
+            matches_regex=r"Couldn't find \w+ versions",
+        ),
+        Condition(
+            context_element="step",
+            target_attribute=["output", "lines"],
+            matches_regex=r"(not something|nothing) we can merge",
+        ),
+        Condition(
+            context_element="step",
+            target_attribute=["output", "lines"],
+            contains_string="yarn install",
+        ),
+    ]
+    context = fake_context_with_output_lines(
+        lines=["yarn install", "Couldn't find any versions"]
+    )
+    scan = ScanPlan(conditions).scan(context)
+
+    results = [condition.find_matches(context, scan=scan) for condition in conditions]
+
+    [bool(match_types) for *_, match_types in results].should.equal([True, False, True])
+    list(scan.attributes.resolved).should.equal([("step", ("output", "lines"))])
+    results[0][3].should.be(results[1][3])
+    scan.attributes.text(conditions[1], results[1][3]).should.be(
+        scan.attributes.text(conditions[0], results[0][3])
+    )
@@ -0,0 +1,73 @@
+from drone_ci_butler.drone_api.models import Build, Stage
+from drone_ci_butler.rule_engine.batch import MatchColumns
+from drone_ci_butler.rule_engine.models import ConditionMatchType
+from .fakes import fake_context_with_output_lines
+from .test_compiler import make_ruleset
+
+
+def test_apply_many_returns_columns_equivalent_to_apply():
+    "RuleSet.apply_many() should report the same matches as RuleSet.apply() for each context"
+
+    ruleset = make_ruleset()
+    contexts = [
+        fake_context_with_output_lines(
+            build_link="https://drone/nytm/wf-project-vi/1",
+            step_name="node_modules",
+            lines=lines,
+        )
+        for lines in (
+            ["Couldn't find any versions for left-pad"],
+            ["Done in 3s"],
+            ["Couldn't find any versions for is-odd"],
+        )
+    ]
+
+    columns = ruleset.apply_many(contexts)
+
+    columns.should.be.a(MatchColumns)
+    list(columns.rule_context).should.equal([0, 2])
+    list(columns.context_rows).should.equal([0, 1, 1])
+    list(columns.row_matches).should.equal([0, 3])
+    list(columns.row_errors).should.equal([0, 0])
+    columns.count_by_rule().should.equal({"Yarn Dependency Not Resolved": 2})
+    [row.match_type for row in columns.iter_matches()].should.equal(
+        [
+            ConditionMatchType.CONTAINS_STRING,
+            ConditionMatchType.VALUE_EXACT,
+            ConditionMatchType.CONTAINS_STRING,
+        ]
+        * 2
+    )
+    for position, context in enumerate(contexts):
+        [m.to_description() for m in columns.matched_rules(position)].should.equal(
+            [m.to_description() for m in ruleset.apply(context)]
+        )
+
+
+def test_apply_many_evaluates_build_conditions_once_per_build():
+    "RuleSet.apply_many() should share the outcome of build conditions across the steps of a build"
+
+    ruleset = make_ruleset()
+    build = Build(
+        number=1,
+        link="https://drone/nytm/wf-project-vi/1",
+        stages=[
+            Stage(
+                number=1,
+                steps=[
+                    fake_context_with_output_lines(step_name="node_modules").step
+                    for _ in range(3)
+                ],
+            )
+        ],
+    )
+    profiler = ruleset.enable_profiling()
+
+    columns = ruleset.apply_many([build])
+
+    len(columns.contexts).should.equal(3)
+    counter = profiler.counter(
+        profiler.conditions, ruleset.compile().condition_names[1]
+    )
+    ruleset.compile().conditions[1].context_element.should.equal("build")
+    counter.count.should.equal(1)
@@ -0,0 +1,217 @@
+from drone_ci_butler.drone_api.models import Build, Stage, Step
+from drone_ci_butler.rule_engine.models import (
+    Rule,
+    RuleAction,
+    Condition,
+    RuleSet,
+)
+from drone_ci_butler.rule_engine.compiler import CompiledRuleSet
+from .fakes import fake_context_with_output_lines
+
+
+def make_ruleset():
+    return RuleSet(
+        name="my-ruleset",
+        default_action=RuleAction.NEXT_RULE,
+        default_conditions=[
+            Condition(
+                context_element="build",
+                target_attribute="link",
+                contains_string="wf-project-vi",
+                required=True,
+            ),
+        ],
+        required_conditions=[
+            Condition(
+                context_element="step",
+                target_attribute="name",
+                value_exact="node_modules",
+                required=True,
+            ),
+        ],
+        rules=[
+            Rule(
+                name="Yarn Dependency Not Resolved",
+                conditions=[
+                    Condition(
+                        context_element="step",
+                        target_attribute=["output", "lines"],
+                        contains_string="Couldn't find any versions",
+                    )
+                ],
+            )
+        ],
+    )
+
+
+def test_compile_merges_preconditions_without_mutating_rules():
+    "RuleSet().compile() should build the effective conditions of each rule once"
+
+    ruleset = make_ruleset()
+
+    compiled = ruleset.compile()
+
+    compiled.should.be.a(CompiledRuleSet)
+    ruleset.compile().should.be(compiled)
+    ruleset.rules[0].conditions.should.have.length_of(1)
+    ruleset.rules[0].action.should.be.none
+
+    rule = compiled.rules[0]
+    rule.action.should.equal(RuleAction.NEXT_RULE)
+    [c.context_element for c in rule.conditions].should.equal(
+        ["build", "step", "step"]
+    )
+
+
+def test_apply_does_not_grow_conditions():
+    "RuleSet().apply() should not change the rules of the ruleset"
+
+    ruleset = make_ruleset()
+    context = fake_context_with_output_lines(
+        build_link="https://drone.dv.nyt.net/nytm/wf-project-vi/138785",
+        step_name="node_modules",
+        lines=['''Couldn't find any versions for "react" that matches "2021"'''],
+    )
+
+    for _ in range(3):
+        matches = ruleset.apply(context)
+
+    matches.should.have.length_of(1)
+    matches[0].matched_conditions.should.have.length_of(3)
+    ruleset.rules[0].conditions.should.have.length_of(1)
+
+
+def test_compile_again_after_rules_change():
+    "RuleSet().compile() should be rebuilt after the rules are replaced"
+
+    ruleset = make_ruleset()
+    compiled = ruleset.compile()
+
+    ruleset.rules.append(Rule(name="Other", conditions=[]))
+
+    ruleset.compile().should_not.be(compiled)
+    ruleset.compile().rules.should.have.length_of(2)
+
+
+def make_build(link="https://github.com/nytm/wf-project-vi/pull/1"):
+    return Build(
+        link=link,
+        stages=[
+            Stage(
+                name=stage_name,
+                steps=[
+                    Step(name="node_modules", status="failure"),
+                    Step(name="lint", status="success"),
+                ],
+            )
+            for stage_name in ("build", "deploy")
+        ],
+    )
+
+
+def make_pruning_ruleset():
+    return RuleSet(
+        name="my-ruleset",
+        default_action=RuleAction.NEXT_RULE,
+        required_conditions=[
+            Condition(
+                context_element="build",
+                target_attribute="link",
+                contains_string="wf-project-vi",
+            ),
+            Condition(
+                context_element="stage",
+                target_attribute="name",
+                value_exact="build",
+            ),
+            Condition(
+                context_element="step",
+                target_attribute="status",
+                value_exact="failure",
+            ),
+        ],
+        rules=[],
+    )
+
+
+def test_iter_contexts_prunes_stages_and_steps():
+    "RuleSet().iter_contexts() should only yield steps that pass the preconditions of each level"
+
+    ruleset = make_pruning_ruleset()
+
+    contexts = list(ruleset.iter_contexts(make_build()))
+
+    contexts.should.have.length_of(1)
+    contexts[0].stage.name.should.equal("build")
+    contexts[0].step.name.should.equal("node_modules")
+    contexts[0].build.stages.should.be.none
+    contexts[0].stage.steps.should.be.none
+
+
+def test_iter_contexts_prunes_builds():
+    "RuleSet().iter_contexts() should not look at the stages of a build that fails a precondition"
+
+    ruleset = make_pruning_ruleset()
+    build = make_build(link="https://github.com/nytm/other-project/pull/1")
+
+    list(ruleset.iter_contexts(build)).should.be.empty
+
+
+def test_iter_contexts_does_not_prune_abrupt_interruption():
+    "RuleSet().iter_contexts() should yield every step when failed preconditions are reported"
+
+    ruleset = make_pruning_ruleset()
+    ruleset.default_action = RuleAction.ABRUPT_INTERRUPTION
+
+    list(ruleset.iter_contexts(make_build())).should.have.length_of(4)
+
+
+def test_rule_index_skips_rules_rejected_by_the_step_name():
+    "CompiledRuleSet.select() should only evaluate the rules whose required step conditions accept the step"
+
+    ruleset = RuleSet(
+        name="my-ruleset",
+        rules=[
+            Rule(
+                name="Yarn",
+                conditions=[
+                    Condition(
+                        context_element="step",
+                        target_attribute="name",
+                        matches_value=["node_*"],
+                        required=True,
+                    ),
+                    Condition(
+                        context_element="step",
+                        target_attribute=["output", "lines"],
+                        contains_string="error",
+                    ),
+                ],
+            ),
+            Rule(
+                name="Any",
+                conditions=[
+                    Condition(
+                        context_element="step",
+                        target_attribute=["output", "lines"],
+                        contains_string="error",
+                    ),
+                ],
+            ),
+        ],
+    )
+    compiled = ruleset.compile()
+
+    def candidates(step_name):
+        context = fake_context_with_output_lines(step_name=step_name, lines=["error"])
+        return list(compiled.rule_index.lookup(context))
+
+    candidates("node_modules").should.equal([0, 1])
+    candidates("webpack").should.equal([1])
+    compiled.rule_index.candidates.should.have.length_of(2)
+
+    context = fake_context_with_output_lines(step_name="webpack", lines=["error"])
+    [m.rule.name for m in ruleset.apply(context)].should.equal(["Any"])
+
+    ruleset.rules = ruleset.rules[1:]
+    ruleset.compile().rule_index.should.be.false
@@ -0,0 +1,79 @@
+from unittest.mock import patch
+
+from drone_ci_butler.rule_engine.models import (
+    Rule,
+    RuleAction,
+    Condition,
+    RuleSet,
+)
+from .fakes import fake_context_with_output_lines
+
+
+def make_ruleset():
+    return RuleSet(
+        name="my-ruleset",
+        default_action=RuleAction.NEXT_RULE,
+        required_conditions=[
+            Condition(
+                context_element="step",
+                target_attribute="name",
+                value_exact="node_modules",
+                required=True,
+            ),
+        ],
+        rules=[
+            Rule(
+                name=name,
+                conditions=[
+                    Condition(
+                        context_element="step",
+                        target_attribute=["output", "lines"],
+                        contains_string=needle,
+                    )
+                ],
+            )
+            for name, needle in [
+                ("Yarn Dependency Not Resolved", "Couldn't find any versions"),
+                ("Merge Conflict", "Automatic merge failed"),
+            ]
+        ],
+    )
+
+
+def test_shared_conditions_are_evaluated_once_per_context():
+    "RuleSet().apply() should evaluate each distinct condition once per context"
+
+    ruleset = make_ruleset()
+    context = fake_context_with_output_lines(
+        step_name="node_modules",
+        lines=['''Couldn't find any versions for "react" that matches "2021"'''],
+    )
+
+    with patch.object(
+        Condition, "find_matches", side_effect=Condition.find_matches, autospec=True
+    ) as find_matches:
+        matches = ruleset.apply(context)
+
+    find_matches.call_count.should.equal(3)
+    [m.rule.name for m in matches].should.equal(["Yarn Dependency Not Resolved"])
+
+
+def test_failed_required_condition_skips_rules():
+    "RuleSet().apply() should not evaluate any rule when a required condition fails"
+
+    ruleset = make_ruleset()
+    context = fake_context_with_output_lines(
+        step_name="lint",
+        lines=['''Couldn't find any versions for "react" that matches "2021"'''],
+    )
+
+    with patch.object(
+        Condition, "find_matches", side_effect=Condition.find_matches, autospec=True
+    ) as find_matches, patch.object(
+        Condition, "to_matched_conditions", autospec=True
+    ) as to_matched_conditions:
+        matches = ruleset.apply(context)
+
+    matches.should.be.empty
+    find_matches.call_count.should.equal(1)
+    to_matched_conditions.called.should.be.false
@@ -1,3 +1,5 @@
+import re
+from unittest.mock import patch
 from drone_ci_butler.rule_engine.models import (
     Condition,
     ConditionSet,
@@ -35,6 +37,35 @@ def test_value_list_with_list_of_strings():
     value.lines.should.equal("build\nlink")
 
 
+def test_value_list_contains_with_precompiled_patterns():
+    "ValueList.contains() should match globs and substrings in either direction"
+
+    value = ValueList(["fail*", "server error", "running"])
+
+    value.contains(["all good", "failed to connect"]).should.equal("fail*")
+    value.contains("502 server error").should.equal("server error")
+    value.contains("run").should.equal("running")
+    value.contains("serv?r*").should.equal("server error")
+    value.contains(["success", "done"]).should.be.none
+    value.contains("failure", substrings=set()).should.be.none
+    value.patterns.should.be(value.patterns)
+
+
+def test_condition_matches_value_with_list_of_globs():
+    "Condition(matches_value=[...]) should match any of the glob patterns"
+
+    condition = Condition(
+        context_element="step",
+        target_attribute="status",
+        matches_value=["fail*", "running"],
+    )
+
+    [
+        bool(condition.match_value(status))
+        for status in ("failure", "running", "success", "runningx")
+    ].should.equal([True, True, False, False])
+
+
 def test_condition_without_context_element():
     "Condition(context_element=None) should raise InvalidCondition"
 
@@ -127,27 +158,43 @@ def test_process_context_traverse_nested_failed():
     )
 
 
-def test_apply_condition_with_invalid_regex():
-    "Condition().apply() should raise InvalidCondition if regex is invalid"
+def test_condition_with_invalid_regex():
+    "Condition() should raise InvalidCondition if regex is invalid"
 
-    cond = Condition(
+    when_called = Condition.when.called_with(
         context_element="step",
         target_attribute="name",
         matches_regex="())",
     )
 
-    context = fake_context_with_output_lines(
-        step_name="some_step_name",
-    )
-
-    when_called = cond.apply.when.called_with(context)
-
     when_called.should.have.raised(
         InvalidCondition,
         "Invalid Condition: Expect step.name to match regular expression `())` regex is INVALID: `unbalanced parenthesis at position 2`",
     )
 
 
+def test_condition_compiles_regex_once():
+    "Condition().apply() should reuse the regex compiled at construction"
+
+    cond = Condition(
+        context_element="step",
+        target_attribute="name",
+        matches_regex="(.*fail.*)",
+    )
+    cond.regex.pattern.should.equal("(.*fail.*)")
+    cond.regex.flags.should.equal(re.compile("", cond.regex_options).flags)
+
+    context = fake_context_with_output_lines(
+        step_name="failed_step",
+    )
+
+    with patch("drone_ci_butler.rule_engine.models.re.compile") as compile_regex:
+        result = cond.apply(context)
+
+    result.should.have.length_of(1)
+    compile_regex.called.should.be.false
+
+
 def test_apply_required_condition_no_matches():
     "Condition(required=True).apply() should raise InvalidCondition when make no matches"
 
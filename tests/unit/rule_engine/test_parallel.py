@@ -0,0 +1,89 @@
+from drone_ci_butler.rule_engine.default_rules import wf_project_vi
+from drone_ci_butler.rule_engine.models import ConditionMatchType
+from drone_ci_butler.rule_engine.parallel import (
+    ParallelRuleSet,
+    context_from_payload,
+    context_to_payload,
+)
+from .fakes import fake_context_with_output_lines
+
+
+PR_LINK = "https://github.com/nytm/wf-project-vi/pull/1337"
+
+
+def make_contexts():
+    return [
+        fake_context_with_output_lines(
+            build_link=PR_LINK,
+            lines=["yarn install", "error: not something we can merge"],
+        ),
+        fake_context_with_output_lines(
+            build_link=PR_LINK,
+            step_status="success",
+            lines=["done"],
+        ),
+        fake_context_with_output_lines(
+            build_link=PR_LINK,
+            step_name="slack-notify",
+            lines=["got server error", "run yarn prettier:docs"],
+        ),
+    ]
+
+
+def test_context_payload_roundtrip():
+    "context_to_payload() should ship only plain data that rebuilds the same context"
+
+    context = make_contexts()[0]
+
+    payload = context_to_payload(context)
+
+    sorted(payload).should.equal(["build", "stage", "step"])
+    context_from_payload(payload).to_dict().should.equal(context.to_dict())
+
+
+def test_apply_many_matches_serial_evaluation():
+    "ParallelRuleSet.apply_many() should return the same matches as RuleSet.apply() in order"
+
+    contexts = make_contexts()
+    pool = ParallelRuleSet(processes=2)
+
+    try:
+        results = pool.apply_many(contexts)
+    finally:
+        pool.shutdown()
+
+    results.should.have.length_of(3)
+    [[m.to_description() for m in matches] for matches in results].should.equal(
+        [
+            [m.to_description() for m in wf_project_vi.apply(context)]
+            for context in contexts
+        ]
+    )
+    [m.rule.name for m in results[2]].should.equal(
+        ["ValidateDocsPrettified", "SlackServerError"]
+    )
+
+
+def test_apply_many_keeps_the_regex_spans():
+    "ParallelRuleSet.apply_many() should rebuild the regex match of MATCHES_REGEX conditions like RuleSet.apply()"
+
+    context = make_contexts()[0]
+    pool = ParallelRuleSet(processes=1)
+
+    try:
+        (results,) = pool.apply_many([context])
+    finally:
+        pool.shutdown()
+
+    def regex_matches(matches):
+        return [
+            (c.regex_match, c.line_number, c.to_model().matched_regex_groups)
+            for m in matches
+            for c in m.matched_conditions
+            if c.match_type == ConditionMatchType.MATCHES_REGEX
+        ]
+
+    expected = regex_matches(wf_project_vi.apply(context))
+    expected.shouldnt.be.empty
+    expected[0][0].shouldnt.be.none
+    regex_matches(results).should.equal(expected)
@@ -0,0 +1,92 @@
+from drone_ci_butler.rule_engine.models import (
+    Rule,
+    RuleAction,
+    Condition,
+    RuleSet,
+)
+from drone_ci_butler.rule_engine.profiling import Counter, Profiler
+from .fakes import fake_context_with_output_lines
+
+
+def make_ruleset():
+    return RuleSet(
+        name="my-ruleset",
+        default_action=RuleAction.NEXT_RULE,
+        required_conditions=[
+            Condition(
+                context_element="step",
+                target_attribute="status",
+                value_exact="failure",
+                required=True,
+            ),
+        ],
+        rules=[
+            Rule(
+                name="Merge Conflict",
+                conditions=[
+                    Condition(
+                        context_element="step",
+                        target_attribute=["output", "lines"],
+                        matches_regex="Automatic merge failed",
+                    )
+                ],
+            )
+        ],
+    )
+
+
+def test_counter_to_dict():
+    "Counter().to_dict() should compute the hit rate and p99"
+
+    counter = Counter("rule")
+    for number in range(1, 101):
+        counter.record(number / 1000.0, hit=number % 4 == 0, bytes_scanned=10)
+
+    stats = counter.to_dict()
+    stats.should.have.key("count").being.equal(100)
+    stats.should.have.key("hit_rate").being.equal(0.25)
+    stats.should.have.key("p99_seconds").being.equal(0.099)
+    stats.should.have.key("bytes_scanned").being.equal(1000)
+
+
+def test_enable_profiling_records_rules_and_conditions():
+    "RuleSet().enable_profiling() should count the evaluations of each rule and condition"
+
+    ruleset = make_ruleset()
+    profiler = ruleset.enable_profiling()
+    failed = fake_context_with_output_lines(lines=["Automatic merge failed"])
+    succeeded = fake_context_with_output_lines(step_status="success", lines=["ok"])
+
+    ruleset.apply(failed)
+    ruleset.apply(succeeded)
+
+    stats = profiler.to_dict(sort_by="count")
+    [(s["name"], s["count"], s["hits"]) for s in stats["rulesets"]].should.equal(
+        [("my-ruleset", 2, 1)]
+    )
+    [(s["name"], s["count"], s["hits"]) for s in stats["rules"]].should.equal(
+        [("Merge Conflict", 1, 1)]
+    )
+    [(s["name"], s["count"], s["hits"]) for s in stats["conditions"]].should.equal(
+        [
+            ("Condition: Expect step.status to have exact value `failure`", 2, 1),
+            (
+                "Condition: Expect step.output.lines to match regular expression `Automatic merge failed`",
+                1,
+                1,
+            ),
+        ]
+    )
+    stats["conditions"][1]["bytes_scanned"].should.equal(len("Automatic merge failed"))
+
+
+def test_disable_profiling():
+    "RuleSet().disable_profiling() should stop recording"
+
+    ruleset = make_ruleset()
+    profiler = ruleset.enable_profiling()
+    ruleset.disable_profiling()
+
+    ruleset.apply(fake_context_with_output_lines(lines=["Automatic merge failed"]))
+
+    profiler.to_dict().should.equal({"rulesets": [], "rules": [], "conditions": []})
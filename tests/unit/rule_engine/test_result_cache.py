@@ -0,0 +1,63 @@
+from drone_ci_butler.rule_engine.models import Condition, Rule, RuleSet
+from drone_ci_butler.rule_engine.result_cache import RuleResultCache
+from .fakes import fake_context_with_output_lines
+from .test_compiler import make_ruleset
+
+
+def test_result_cache_reuses_matches_of_identical_steps():
+    "RuleResultCache.apply() should reuse the matches of a step whose targeted attributes were already evaluated"
+
+    ruleset = make_ruleset()
+    cache = RuleResultCache(size=2)
+    params = dict(
+        build_link="https://drone/nytm/wf-project-vi/1",
+        step_name="node_modules",
+        lines=["Couldn't find any versions for left-pad"],
+    )
+    first = fake_context_with_output_lines(build_number=1, **params)
+    rerun = fake_context_with_output_lines(build_number=2, **params)
+
+    expected = ruleset.apply(rerun)
+    cache.apply(ruleset, first)
+    matches = cache.apply(ruleset, rerun)
+
+    (cache.hits, cache.misses).should.equal((1, 1))
+    [m.to_description() for m in matches].should.equal(
+        [m.to_description() for m in expected]
+    )
+    matches[0].context.should.be(rerun)
+    matches[0].matched_conditions[-1].value.should.be(rerun.step.output.lines)
+
+    params["lines"] = ["Couldn't find any versions for is-odd"]
+    cache.apply(ruleset, fake_context_with_output_lines(**params))
+    (cache.hits, cache.misses).should.equal((1, 2))
+
+
+def test_result_cache_keeps_regex_matches():
+    "RuleResultCache should restore the span and groups of regex matches"
+
+    ruleset = RuleSet(
+        name="my-ruleset",
+        rules=[
+            Rule(
+                name="Yarn Dependency Not Resolved",
+                conditions=[
+                    Condition(
+                        context_element="step",
+                        target_attribute=["output", "lines"],
+                        matches_regex=r'versions for "(?P<package>[^"]+)"',
+                    )
+                ],
+            )
+        ],
+    )
+    cache = RuleResultCache()
+    lines = ["yarn install", 'Couldn\'t find any versions for "react"']
+
+    expected = cache.apply(ruleset, fake_context_with_output_lines(lines=lines))
+    context = fake_context_with_output_lines(step_name="other", lines=lines)
+    matched = cache.apply(ruleset, context)[0].matched_conditions[0]
+
+    cache.hits.should.equal(1)
+    matched.regex_match.should.equal(expected[0].matched_conditions[0].regex_match)
+    matched.line.should.be(context.step.output.lines[1])
@@ -0,0 +1,74 @@
+from drone_ci_butler.rule_engine.models import (
+    Condition,
+    ConditionMatchType,
+    MatchedRule,
+    Rule,
+    RuleSet,
+)
+from drone_ci_butler.rule_engine.results import RuleMatch
+from .fakes import fake_context_with_output_lines
+from .test_compiler import make_ruleset
+
+
+def test_ruleset_apply_returns_compact_matches():
+    "RuleSet.apply() should return matches that reference the context and describe themselves like models"
+
+    ruleset = make_ruleset()
+    context = fake_context_with_output_lines(
+        build_link="https://drone/nytm/wf-project-vi/1",
+        step_name="node_modules",
+        lines=["Couldn't find any versions for left-pad"],
+    )
+
+    matches = ruleset.apply(context)
+
+    matches.should.have.length_of(1)
+    matched = matches[0]
+    matched.should.be.a(RuleMatch)
+    matched.context.should.be(context)
+    matched.index.should.equal(0)
+    [c.slot for c in matched.matched_conditions].should.equal(
+        list(ruleset.compile().rules[0].slots)
+    )
+    matched.matched_conditions[-1].match_type.should.equal(
+        ConditionMatchType.CONTAINS_STRING
+    )
+    matched.matched_conditions[-1].value.should.be(context.step.output.lines)
+
+    model = matched.to_model()
+    model.should.be.a(MatchedRule)
+    model.to_description().should.equal(matched.to_description())
+
+
+def test_regex_matches_keep_their_span_line_and_groups():
+    "ConditionMatch should locate the output line where the regex matched without searching again"
+
+    ruleset = RuleSet(
+        name="my-ruleset",
+        rules=[
+            Rule(
+                name="Yarn Dependency Not Resolved",
+                conditions=[
+                    Condition(
+                        context_element="step",
+                        target_attribute=["output", "lines"],
+                        matches_regex=r'versions for "(?P<package>[^"]+)"',
+                    )
+                ],
+            )
+        ],
+    )
+    lines = ["yarn install", "step 1", 'Couldn\'t find any versions for "react"', "done"]
+    context = fake_context_with_output_lines(lines=lines)
+
+    matched = ruleset.apply(context)[0].matched_conditions[0]
+
+    matched.regex_match.named.should.equal({"package": "react"})
+    text = str(context.step.output.lines)
+    text[matched.regex_match.start : matched.regex_match.end].should.equal(
+        'versions for "react"'
+    )
+    matched.line_index.should.equal(2)
+    matched.line_number.should.equal(2)
+    [l.out for l in matched.context_window(before=1, after=0)].should.equal(lines[1:3])
+    matched.to_model().matched_regex_groups.should.equal(["react"])
@@ -0,0 +1,68 @@
+from drone_ci_butler.rule_engine.exceptions import RegexBudgetExceeded
+from drone_ci_butler.rule_engine.models import Condition, Rule, RuleSet
+from drone_ci_butler.rule_engine.safe_regex import has_nested_quantifiers
+from .fakes import fake_context_with_output_lines
+
+
+def test_has_nested_quantifiers():
+    "has_nested_quantifiers() should flag unbounded quantifiers of repeated expressions"
+
+    has_nested_quantifiers(r"(a+)+$").should.be.true
+    has_nested_quantifiers(r"(\w*\s?)*:").should.be.true
+    has_nested_quantifiers(r"x(?:foo|(?:ba+r)*)*").should.be.true
+
+    has_nested_quantifiers(r"prettier:docs").should.be.false
+    has_nested_quantifiers(r"(\d{1,3}\.){3}\d+").should.be.false
+    has_nested_quantifiers(
+        r"(not something we can merge|Automatic merge failed; fix conflicts)"
+    ).should.be.false
+
+
+def test_condition_with_nested_quantifiers_is_left_out_of_the_scan_plan():
+    "RuleSet().scan_plan should not combine patterns that might backtrack catastrophically"
+
+    condition = Condition(
+        context_element="step",
+        target_attribute=["output", "lines"],
+        matches_regex=r"(a+)+$",
+    )
+    ruleset = RuleSet(
+        name="ruleset",
+        rules=[Rule(name="Catastrophic", conditions=[condition])],
+    )
+
+    condition.guarded_regex.unsafe.should.be.true
+    target = ruleset.scan_plan.targets[("step", ("output", "lines"))]
+    target.patterns.should.be.empty
+
+
+def test_regex_exceeding_its_budget_is_reported_as_invalid_condition():
+    "RuleSet().apply() should report a regex that exceeds its time budget as an invalid condition"
+
+    ruleset = RuleSet(
+        name="ruleset",
+        rules=[
+            Rule(
+                name="Catastrophic",
+                conditions=[
+                    Condition(
+                        context_element="step",
+                        target_attribute=["output", "lines"],
+                        matches_regex=r"(a+)+$",
+                        regex_budget=0.05,
+                    )
+                ],
+            )
+        ],
+    )
+    context = fake_context_with_output_lines(lines=["a" * 40 + "!"])
+
+    matches = ruleset.apply(context)
+
+    matches.should.have.length_of(1)
+    error = matches[0].invalid_conditions[0]
+    error.should.be.a(RegexBudgetExceeded)
+    error.context.should.equal(context)
+    error.budget.should.equal(0.05)
+    error.elapsed.should.be.lower_than(1.0)
+    str(error).should.contain("exceeded its regex time budget of 0.050s")
@@ -0,0 +1,109 @@
+import re
+from unittest.mock import patch
+
+from drone_ci_butler.rule_engine.models import Condition
+from drone_ci_butler.rule_engine.default_rules import wf_project_vi
+from drone_ci_butler.rule_engine.scanner import (
+    LiteralAutomaton,
+    RegexAlternation,
+    ScanPlan,
+    TargetPlan,
+    regex_key,
+    trie_to_regex,
+    build_trie,
+)
+from .fakes import fake_context_with_output_lines
+
+
+def test_trie_to_regex_shares_prefixes():
+    "trie_to_regex() should factor common prefixes of the needles"
+
+    pattern = trie_to_regex(build_trie(["server error", "service", "serve"]))
+
+    pattern.should.equal(r"serv(?:e(?:r\ error)?|ice)")
+
+
+def test_literal_automaton_finds_overlapping_needles():
+    "LiteralAutomaton().find() should find needles hidden by longer matches"
+
+    automaton = LiteralAutomaton(["server error", "error", "ECONNREFUSED", "samizdat"])
+
+    found = automaton.find("slack: server error\nconnect ECONNREFUSED")
+
+    found.should.equal({"server error", "error", "ECONNREFUSED"})
+    automaton.find("everything is fine").should.equal(set())
+
+
+def test_regex_alternation_finds_shadowed_patterns():
+    "RegexAlternation().find() should report patterns overlapped by another match"
+
+    first = re.compile("merge failed.*", re.DOTALL)
+    second = re.compile("conflicts", re.DOTALL)
+    alternation = RegexAlternation([first, second])
+    alternation.combined.should.have.length_of(1)
+
+    found = alternation.find("Automatic merge failed; fix conflicts")
+
+    found.should.equal({regex_key(first), regex_key(second)})
+    alternation.find("nothing to see here").should.equal(set())
+
+
+def test_regex_alternation_keeps_backreferences_individual():
+    "RegexAlternation() should not combine patterns with backreferences"
+
+    repeated = re.compile(r"(\w+) \1")
+    alternation = RegexAlternation([repeated, re.compile("foo")])
+
+    alternation.combined.should.be.empty
+    alternation.find("again again").should.equal({regex_key(repeated)})
+
+
+def test_scan_plan_groups_conditions_by_target():
+    "ScanPlan() should group the needles and patterns of a ruleset by target"
+
+    plan = wf_project_vi.scan_plan
+
+    plan.targets.should.have.key(("step", ("output", "lines")))
+    output = plan.targets[("step", ("output", "lines"))]
+    output.needles.should.equal({"server error", "ECONNREFUSED", "samizdat"})
+    output.patterns.should.have.length_of(4)
+
+
+def test_scan_searches_each_target_once():
+    "Condition().apply(scan=...) should reuse the scan of its target"
+
+    conditions = [
+        Condition(
+            context_element="step",
+            target_attribute=["output", "lines"],
+            matches_regex=pattern,
+            required=False,
+        )
+        for pattern in ("prettier:docs", "DNS-1123", "Automatic merge failed")
+    ]
+    context = fake_context_with_output_lines(
+        lines=["Automatic merge failed; fix conflicts"]
+    )
+    scan = ScanPlan(conditions).scan(context)
+
+    with patch.object(
+        TargetPlan, "scan", side_effect=TargetPlan.scan, autospec=True
+    ) as scan_target:
+        results = [c.apply(context, scan=scan) for c in conditions]
+
+    scan_target.call_count.should.equal(1)
+    [len(r) for r in results].should.equal([0, 0, 1])
+
+
+def test_regex_alternation_search_returns_spans_and_groups():
+    "RegexAlternation().search() should return where each combined pattern matched with its own groups"
+
+    first = re.compile(r"(?P<verb>merge) failed")
+    second = re.compile(r"fix (\w+)")
+    alternation = RegexAlternation([first, second])
+
+    found = alternation.search("Automatic merge failed; fix conflicts")
+
+    found[regex_key(first)].named.should.equal({"verb": "merge"})
+    found[regex_key(second)].groups.should.equal(("conflicts",))
+    found[regex_key(second)][:2].should.equal((24, 37))
@@ -0,0 +1,55 @@
+from unittest.mock import patch
+
+from drone_ci_butler.drone_api.models import Build, OutputLine, Stage, Step
+from drone_ci_butler.rule_engine.models import Condition
+from drone_ci_butler.rule_engine.default_rules import wf_project_vi
+
+
+def make_stream(link="https://github.com/nytm/wf-project-vi/pull/1", window=5):
+    build = Build(number=1, link=link, status="running")
+    stage = Stage(number=1, name="build", status="running")
+    step = Step(number=1, name="git-merge", status="running", exit_code=1)
+    return wf_project_vi.stream(build, stage, step, window=window)
+
+
+def lines(*outs, start=0):
+    return [OutputLine(pos=start + i, out=out) for i, out in enumerate(outs)]
+
+
+def test_stream_reports_rules_as_soon_as_they_match():
+    "RuleSet().stream().feed() should report each rule once, as soon as its line arrives"
+
+    stream = make_stream()
+
+    stream.feed(lines("$ git fetch origin", "$ git merge master")).should.be.empty
+
+    matches = stream.feed(
+        lines("Automatic merge failed; fix conflicts and then commit.", start=2)
+    )
+    [m.rule.name for m in matches].should.equal(["GitMergeConflict"])
+
+    stream.feed(lines("Automatic merge failed; fix conflicts", start=3)).should.be.empty
+
+
+def test_stream_keeps_a_bounded_window():
+    "RuleSet().stream() should only keep the most recent lines in memory"
+
+    stream = make_stream(window=3)
+
+    for number in range(10):
+        stream.feed(lines(f"line {number}", start=number))
+
+    stream.line_count.should.equal(10)
+    [line.out for line in stream.window].should.equal(["line 7", "line 8", "line 9"])
+
+
+def test_stream_rejected_by_preconditions_does_not_scan_output():
+    "RuleSet().stream().feed() should not look at the output when a precondition fails"
+
+    stream = make_stream(link="https://github.com/nytm/other-project/pull/1")
+
+    with patch.object(Condition, "match_value", autospec=True) as match_value:
+        matches = stream.feed(lines("Automatic merge failed; fix conflicts"))
+
+    matches.should.be.empty
+    match_value.called.should.be.false
@@ -0,0 +1,71 @@
+from drone_ci_butler.rule_engine.models import Condition, ConditionSet
+from .fakes import fake_context_with_output_lines
+from .test_compiler import make_ruleset
+
+
+def test_explain_reports_the_status_of_each_rule_and_condition():
+    "RuleSet.explain() should tell which condition rejected a rule"
+
+    ruleset = make_ruleset()
+    context = fake_context_with_output_lines(
+        build_link="https://drone/nytm/wf-project-vi/1",
+        step_name="webpack",
+        lines=["Couldn't find any versions for left-pad"],
+    )
+
+    trace = ruleset.explain(context)
+
+    trace.matches.should.equal([])
+    rule = trace.rules[-1]
+    rule.name.should.equal("Yarn Dependency Not Resolved")
+    rule.status.should.equal("rejected")
+    [c.status for c in rule.conditions].should.equal(
+        ["matched", "rejected", "not_evaluated"]
+    )
+    rule.conditions[0].match_types.should.equal(["CONTAINS_STRING"])
+    trace.to_description().should.contain(
+        "[rejected] Yarn Dependency Not Resolved"
+    )
+
+
+def test_explain_matches_apply():
+    "RuleSet.explain() should return the same matches as RuleSet.apply()"
+
+    ruleset = make_ruleset()
+    context = fake_context_with_output_lines(
+        build_link="https://drone/nytm/wf-project-vi/1",
+        step_name="node_modules",
+        lines=["Couldn't find any versions for left-pad"],
+    )
+
+    trace = ruleset.explain(context)
+
+    [m.to_description() for m in trace.matches].should.equal(
+        [m.to_description() for m in ruleset.apply(context)]
+    )
+    trace.rules[-1].status.should.equal("reported")
+
+
+def test_condition_set_explain_reports_invalid_conditions():
+    "ConditionSet.explain() should report the error of invalid conditions without raising"
+
+    conditions = ConditionSet(
+        [
+            Condition(
+                context_element="step",
+                target_attribute="invalid_attr",
+                contains_string="foo",
+            ),
+            Condition(
+                context_element="step",
+                target_attribute="name",
+                value_exact="node_modules",
+                required=True,
+            ),
+        ]
+    )
+
+    traces = conditions.explain(fake_context_with_output_lines())
+
+    [t.status for t in traces].should.equal(["invalid", "rejected"])
+    traces[0].error.should.contain("could not find attribute invalid_attr")
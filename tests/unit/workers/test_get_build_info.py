@@ -3,6 +3,10 @@ import gevent
 from unittest.mock import patch, Mock, call
 
 
+from drone_ci_butler.drone_api.models import Build, Output, Stage, Step
+from drone_ci_butler.rule_engine.artifact import RuleSetLoader
+from drone_ci_butler.rule_engine.default_rules import wf_project_vi
+from drone_ci_butler.rule_engine.result_cache import RuleResultCache
 from drone_ci_butler.workers.get_build_info import (
     GetBuildInfoWorker,
     try_parse_github_pull_request_url,
@@ -45,3 +49,80 @@ def test_try_parse_github_pull_request_url_ok():
     result.should.equal(
         {"pr_number": "12870", "owner": "drone-ci-monitor", "repo": "drone-ci-monitor"}
     )
+
+
+def test_ruleset_falls_back_to_the_builtin_rules_when_the_rules_file_is_invalid(
+    tmp_path,
+):
+    "GetBuildInfoWorker.ruleset should be the built-in ruleset when config.rule_engine_rules_path cannot be loaded"
+
+    rules_path = tmp_path.joinpath("rules.yml")
+    rules_path.write_text("rulesets: [")
+    worker = GetBuildInfoWorker(pull_connect_address="tcp://dummy:0", worker_id="dummy")
+    worker.config = Mock(
+        name="config",
+        rule_engine_rules_path=str(rules_path),
+        rule_engine_cache_dir=str(tmp_path.joinpath("cache")),
+        rule_engine_ruleset=None,
+    )
+
+    try:
+        worker.ruleset.should.be(wf_project_vi)
+        worker.ruleset.should.be(wf_project_vi)
+    finally:
+        RuleSetLoader.shared.clear()
+
+
+@patch("drone_ci_butler.workers.get_build_info.connect_to_elasticsearch")
+def test_process_rulesets_indexes_the_whole_stage(connect_to_elasticsearch):
+    "GetBuildInfoWorker.process_rulesets() should index the stage with its steps even though the contexts carry stages without them"
+
+    build = Build(
+        number=1337,
+        link="https://github.com/nytm/wf-project-vi/pull/1337",
+        stages=[
+            Stage(
+                number=1,
+                name="build",
+                steps=[
+                    Step(
+                        number=1,
+                        name="node_modules",
+                        status="failure",
+                        exit_code=1,
+                        output=Output(
+                            lines=[{"out": "error: not something we can merge"}]
+                        ),
+                    ),
+                    Step(number=2, name="lint", status="skipped"),
+                ],
+            )
+        ],
+    )
+    stored = Mock(name="stored", id=1)
+    stored.to_document.return_value = {}
+    es = connect_to_elasticsearch.return_value
+    worker = GetBuildInfoWorker(pull_connect_address="tcp://dummy:0", worker_id="dummy")
+    worker.logger = Mock(name="logger")
+    worker.config = Mock(
+        name="config",
+        rule_engine_rules_path=None,
+        rule_engine_cache_dir="/tmp",
+        rule_engine_processes=0,
+        rule_engine_result_cache_size=0,
+        rule_engine_result_cache_redis_ttl=0,
+    )
+
+    try:
+        worker.process_rulesets(build, stored, None, "nytm", "wf-project-vi")
+    finally:
+        RuleSetLoader.shared.clear()
+        RuleResultCache.shared = None
+
+    es.index.call_count.should.equal(1)
+    document = es.index.call_args.kwargs["body"]
+    [step["name"] for step in document["stage"]["steps"]].should.equal(
+        ["node_modules", "lint"]
+    )
+    document["build"]["stages"][0]["name"].should.equal("build")
+    document["step"]["name"].should.equal("node_modules")
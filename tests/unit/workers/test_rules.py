@@ -0,0 +1,64 @@
+from unittest.mock import Mock
+
+from drone_ci_butler.rule_engine.artifact import RuleSetLoader, compile_rules
+from drone_ci_butler.workers.rules import (
+    CURRENT_DIGEST_KEY,
+    RulesSubscriber,
+    store_current_artifact,
+)
+
+
+RULES_YAML = """
+rulesets:
+  wf-project-vi:
+    rules:
+      - name: GitMergeConflict
+        when:
+          - step.output.lines:
+              contains_string: "Automatic merge failed"
+"""
+
+
+class FakeRedis(dict):
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+
+    def get(self, key):
+        self.reads.append(key)
+        return super().get(key)
+
+    def set(self, key, value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        self[key] = value
+
+
+def test_subscriber_installs_the_artifact_published_before_it_started(tmp_path):
+    "RulesSubscriber.install_current() should install the artifact stored by the last publish only when it differs from the installed one"
+
+    rules_path = tmp_path.joinpath("rules.yml")
+    rules_path.write_text(RULES_YAML)
+    path, digest = compile_rules(rules_path, tmp_path.joinpath("build"))
+    redis = FakeRedis()
+    store_current_artifact(redis, path.read_bytes()).should.equal(digest)
+
+    config = Mock(
+        name="config",
+        rule_engine_rules_path=None,
+        rule_engine_cache_dir=str(tmp_path.joinpath("cache")),
+        worker_rules_check_interval=1,
+    )
+    try:
+        subscriber = RulesSubscriber("tcp://127.0.0.1:0", config, redis=redis)
+        subscriber.loader.rulesets.should.equal({})
+
+        subscriber.install_current().should.be.true
+        subscriber.loader.digest.should.equal(digest)
+        subscriber.loader.get().name.should.equal("wf-project-vi")
+
+        redis.reads.clear()
+        subscriber.install_current().should.be.false
+        redis.reads.should.equal([CURRENT_DIGEST_KEY])
+    finally:
+        RuleSetLoader.shared.clear()
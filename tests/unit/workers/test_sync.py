@@ -0,0 +1,86 @@
+from unittest.mock import Mock, patch
+
+from drone_ci_butler.drone_api import DroneAPIClient
+from drone_ci_butler.drone_api.models import Build
+from drone_ci_butler.sql.models.drone import DroneSyncState
+from drone_ci_butler.workers.sync import BuildSyncer
+
+
+def fake_page(numbers, running=(), updated=1000):
+    return Build.List(
+        [
+            Build(
+                number=number,
+                link=f"https://github.com/owner/repo/pull/{number}",
+                finished=0 if number in running else updated,
+                updated=updated + 10 if number in running else updated,
+            )
+            for number in numbers
+        ]
+    )
+
+
+@patch.object(DroneSyncState, "update_and_save")
+@patch.object(DroneSyncState, "get_for")
+@patch.object(DroneAPIClient, "fetch_builds_page")
+def test_sync_once_stops_at_the_first_page_already_synced(
+    fetch_builds_page, get_for, update_and_save
+):
+    "BuildSyncer.sync_once() should only enqueue new or updated builds and stop at the first page that was fully synced"
+
+    pages = [fake_page([12, 11]), fake_page([10, 9], running=[9]), fake_page([8, 7])]
+    fetch_builds_page.side_effect = lambda owner, repo, limit, page: pages[page]
+    state = DroneSyncState(
+        owner="owner",
+        repo="repo",
+        last_build_number=10,
+        last_build_updated=1000,
+    )
+    get_for.return_value = state
+    queue = Mock(name="queue")
+    client = DroneAPIClient(
+        "https://drone.dummy", "token", max_pages=100, prefetch_pages=1
+    )
+
+    enqueued = BuildSyncer(client, queue, "owner", "repo").sync_once()
+
+    enqueued.should.equal([12, 11, 9])
+    fetch_builds_page.call_count.should.equal(3)
+    update_and_save.call_args.kwargs["last_build_number"].should.equal(12)
+    update_and_save.call_args.kwargs["last_build_updated"].should.equal(1010)
+
+
+@patch.object(DroneSyncState, "update_and_save")
+@patch.object(DroneSyncState, "get_for")
+@patch.object(DroneAPIClient, "fetch_builds_page")
+def test_sync_once_leaves_non_pull_request_builds_to_the_job_filters(
+    fetch_builds_page, get_for, update_and_save
+):
+    "BuildSyncer.sync_once() should only skip builds that are not from a pull request when the filters are ignored"
+
+    page = fake_page([3, 2])
+    page[1] = Build(
+        number=2, link="https://github.com/owner/repo/commit/abc", updated=1000
+    )
+    fetch_builds_page.side_effect = lambda owner, repo, limit, page_number: (
+        page if page_number == 0 else Build.List([])
+    )
+    get_for.return_value = DroneSyncState(owner="owner", repo="repo")
+    client = DroneAPIClient(
+        "https://drone.dummy", "token", max_pages=100, prefetch_pages=1
+    )
+
+    queue = Mock(name="queue")
+    BuildSyncer(client, queue, "owner", "repo", ignore_filters=False).sync_once()
+    [c.args[0] for c in queue.send.call_args_list].should.equal(
+        [
+            {"build_id": 3, "ignore_filters": False},
+            {"build_id": 2, "ignore_filters": False},
+        ]
+    )
+
+    queue = Mock(name="queue")
+    BuildSyncer(client, queue, "owner", "repo", ignore_filters=True).sync_once()
+    [c.args[0] for c in queue.send.call_args_list].should.equal(
+        [{"build_id": 3, "ignore_filters": True}]
+    )